@@ -0,0 +1,452 @@
+"""
+src/build_logic_model.py
+Rules engine for the logic model (MPAT + criteria/endpoint YAML > per-parcel endpoint bitmasks).
+"""
+
+from __future__ import annotations
+
+import ast
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import yaml
+
+
+# ---------------------------------------------------------------------------
+# Config loading
+# ---------------------------------------------------------------------------
+
+CONFIG_FILES = {
+    "thresholds": "thresholds.yaml",
+    "criteria": "criteria.yaml",
+    "endpoints": "endpoint_rules.yaml",
+}
+
+
+def load_rules_config(config_dir: str | Path) -> dict[str, dict[str, Any]]:
+    """Read ``thresholds``, ``criteria`` and ``endpoints`` from a scenario config folder."""
+    config_dir = Path(config_dir)
+    out = {}
+    for key, filename in CONFIG_FILES.items():
+        doc = yaml.safe_load((config_dir / filename).read_text(encoding="utf-8"))
+        out[key] = doc[key]
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Derived-field expressions (mpat_derived)
+# ---------------------------------------------------------------------------
+
+# Whitelisted operations. Expressions compile to hashable nodes:
+#   ("col", name) | ("const", value) | ("neg", a)
+#   ("binop", op, a, b) | ("reduce", func, (a, b, ...)) | ("call", func, a)
+BINARY_OPS = {
+    ast.Add: ("add", np.add),
+    ast.Sub: ("sub", np.subtract),
+    ast.Mult: ("mul", np.multiply),
+    ast.Div: ("div", np.true_divide),
+    ast.Pow: ("pow", np.power),
+}
+BINARY_FUNCS = {name: func for name, func in BINARY_OPS.values()}
+
+# Row-wise reductions across columns; NaN-skipping like DataFrame.min(axis=1)
+REDUCE_FUNCS = ("min", "max", "mean", "sum")
+
+UNARY_FUNCS = {
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "log10": np.log10,
+    "exp": np.exp,
+}
+
+
+def _expr_error(expr: str, node: ast.AST) -> ValueError:
+    return ValueError(f"Unsupported element '{ast.dump(node)[:60]}' in derived expression: {expr!r}")
+
+
+def _column_list(expr: str, node: ast.AST) -> tuple:
+    """Column nodes from ``df['a']`` / ``df[['a', 'b']]`` subscripts."""
+    if not (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "df"):
+        raise _expr_error(expr, node)
+    key = node.slice
+    items = key.elts if isinstance(key, ast.List) else [key]
+    if not all(isinstance(k, ast.Constant) and isinstance(k.value, str) for k in items):
+        raise _expr_error(expr, node)
+    return tuple(("col", k.value) for k in items)
+
+
+def _compile_node(expr: str, node: ast.AST) -> tuple:
+    if isinstance(node, ast.Expression):
+        return _compile_node(expr, node.body)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return ("const", float(node.value))
+
+    if isinstance(node, ast.Name):
+        if node.id.startswith("_") or node.id == "df":
+            raise _expr_error(expr, node)
+        return ("col", node.id)
+
+    if isinstance(node, ast.Subscript):
+        cols = _column_list(expr, node)
+        if len(cols) != 1:
+            raise _expr_error(expr, node)
+        return cols[0]
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _compile_node(expr, node.operand)
+        return ("neg", operand) if isinstance(node.op, ast.USub) else operand
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+        name = BINARY_OPS[type(node.op)][0]
+        return ("binop", name, _compile_node(expr, node.left), _compile_node(expr, node.right))
+
+    if isinstance(node, ast.Call):
+        func = node.func
+        # df[['a', 'b']].min(axis=1)
+        if isinstance(func, ast.Attribute) and func.attr in REDUCE_FUNCS:
+            kwargs = {k.arg: k.value for k in node.keywords}
+            axis = kwargs.pop("axis", None)
+            if node.args or kwargs or not (isinstance(axis, ast.Constant) and axis.value == 1):
+                raise _expr_error(expr, node)
+            return ("reduce", func.attr, _column_list(expr, func.value))
+        # min(a, b) / abs(a)
+        if isinstance(func, ast.Name) and func.id in (*REDUCE_FUNCS, *UNARY_FUNCS) and not node.keywords:
+            args = tuple(_compile_node(expr, a) for a in node.args)
+            if func.id in REDUCE_FUNCS and len(args) >= 2:
+                return ("reduce", func.id, args)
+            if func.id in UNARY_FUNCS and len(args) == 1:
+                return ("call", func.id, args[0])
+
+    raise _expr_error(expr, node)
+
+
+def compile_expression(expr: str) -> tuple:
+    """Parse a derived-field expression into a hashable node of whitelisted operations.
+
+    Supports MPAT column names, numeric constants, ``+ - * / **``, unary
+    minus, ``min/max/mean/sum`` across columns (``min(a, b)`` or
+    ``df[['a', 'b']].min(axis=1)``) and ``abs/sqrt/log/log10/exp``.
+    Anything else (attribute access, other calls, builtins) raises
+    ValueError; nothing is ever passed to ``eval``. Equivalent spellings
+    compile to the same node, so they share one cached column.
+    """
+    try:
+        tree = ast.parse(str(expr).strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid derived expression {expr!r}: {e.msg}") from None
+    return _compile_node(expr, tree)
+
+
+def expression_columns(node: tuple) -> set[str]:
+    """MPAT columns a compiled expression reads."""
+    kind = node[0]
+    if kind == "col":
+        return {node[1]}
+    if kind == "const":
+        return set()
+    if kind == "reduce":
+        return set().union(*(expression_columns(a) for a in node[2]))
+    return set().union(*(expression_columns(a) for a in node[1:] if isinstance(a, tuple)))
+
+
+def evaluate_expression(df: pd.DataFrame, node: tuple, cache: dict[tuple, np.ndarray]) -> np.ndarray:
+    """Evaluate a compiled expression as float64, memoising every sub-expression in ``cache``."""
+    if node in cache:
+        return cache[node]
+
+    kind = node[0]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        if kind == "col":
+            if node[1] not in df.columns:
+                raise KeyError(f"Derived expression references missing MPAT column '{node[1]}'")
+            out = pd.to_numeric(df[node[1]], errors="coerce").to_numpy(dtype="float64")
+        elif kind == "const":
+            out = np.full(len(df), node[1], dtype="float64")
+        elif kind == "neg":
+            out = -evaluate_expression(df, node[1], cache)
+        elif kind == "binop":
+            a = evaluate_expression(df, node[2], cache)
+            b = evaluate_expression(df, node[3], cache)
+            out = BINARY_FUNCS[node[1]](a, b)
+        elif kind == "call":
+            out = UNARY_FUNCS[node[1]](evaluate_expression(df, node[2], cache))
+        elif kind == "reduce":
+            stacked = np.vstack([evaluate_expression(df, a, cache) for a in node[2]])
+            valid = ~np.isnan(stacked)
+            n_valid = valid.sum(axis=0)
+            if node[1] == "min":
+                out = np.fmin.reduce(stacked, axis=0)
+            elif node[1] == "max":
+                out = np.fmax.reduce(stacked, axis=0)
+            else:
+                total = np.where(valid, stacked, 0.0).sum(axis=0)
+                out = total / n_valid if node[1] == "mean" else total
+            if node[1] != "sum":
+                out = np.where(n_valid > 0, out, np.nan)
+        else:
+            raise ValueError(f"Unknown expression node: {node!r}")
+
+    cache[node] = out
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+
+OPERATORS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+    "==": np.equal,
+    "= =": np.equal,
+}
+
+# Equality criteria state a condition the parcel is in ("in the SFHA",
+# "inside the SMA"); the other operators state a requirement (a minimum
+# depth, a maximum slope). See ``compile_rules``.
+CONDITION_OPERATORS = {"==", "= ="}
+
+# Endpoint action lists, in the order they are stored as criterion bitmasks
+ENDPOINT_ACTIONS = ("excludes_when", "flags_when", "triggers_when", "prefers_when")
+
+# Bitmasks are stored as int64 so they survive CSV/GPKG export
+MAX_BITS = 63
+
+
+def _threshold_value(thresholds: dict[str, Any], threshold_id: str) -> Any:
+    """Numeric threshold value, a literal string (e.g. ``"T"``), or None when unresolved (VERIFY)."""
+    value = thresholds[threshold_id]["value"]
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    if value.upper().startswith("VERIFY"):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _bits(ids: list[str], index: dict[str, int]) -> int:
+    mask = 0
+    for cid in ids or []:
+        mask |= 1 << index[cid]
+    return mask
+
+
+def compile_rules(config: dict[str, dict[str, Any]]) -> dict[str, Any]:
+    """Compile thresholds/criteria/endpoints into flat arrays of column ops and bitmasks.
+
+    Each criterion becomes ``(field, derived expression, operator, value)``
+    with its threshold id kept, its value resolved once and its
+    ``mpat_derived`` expression compiled (``derived`` lists the distinct
+    expressions, after deduplication); criteria whose threshold is not
+    numeric yet (VERIFY) are listed in ``unresolved`` and always evaluate
+    as unknown. Each endpoint's action lists become one int64 bitmask per
+    action over the criterion bit positions.
+
+    The matrix words ``excludes_when``/``flags_when`` criteria two ways:
+    requirements (``depth_to_wt_ft >= gw_min_ft``) act when they are known
+    to fail, conditions (``sfha_tf == sfha_flag``, "in the SFHA") act when
+    they hold. Equality criteria are conditions (``CONDITION_OPERATORS``);
+    their bits are collected in ``conditions``.
+    """
+    thresholds = config["thresholds"]
+    criteria = config["criteria"]
+    endpoints = config["endpoints"]
+
+    criteria_ids = list(criteria)
+    endpoint_ids = list(endpoints)
+    if len(criteria_ids) > MAX_BITS or len(endpoint_ids) > MAX_BITS:
+        raise ValueError(f"At most {MAX_BITS} criteria and {MAX_BITS} endpoints fit in a bitmask")
+
+    compiled_criteria = []
+    unresolved = []
+    for cid in criteria_ids:
+        c = criteria[cid]
+        op = str(c["operator"]).strip()
+        if op not in OPERATORS:
+            raise ValueError(f"Criterion '{cid}' has unknown operator '{op}'")
+        if c["threshold"] not in thresholds:
+            raise KeyError(f"Criterion '{cid}' references unknown threshold '{c['threshold']}'")
+        value = _threshold_value(thresholds, c["threshold"])
+        if value is None:
+            unresolved.append(cid)
+        derived = c.get("mpat_derived")
+        compiled_criteria.append({
+            "id": cid,
+            "field": c["field"],
+            "threshold": c["threshold"],
+            "derived": None if derived is None else compile_expression(derived),
+            "op": op,
+            "value": value,
+            "condition": op in CONDITION_OPERATORS,
+        })
+
+    index = {cid: i for i, cid in enumerate(criteria_ids)}
+    masks = {action: np.zeros(len(endpoint_ids), dtype="int64") for action in ENDPOINT_ACTIONS}
+    last_resort = np.zeros(len(endpoint_ids), dtype=bool)
+    for e, eid in enumerate(endpoint_ids):
+        rules = endpoints[eid]
+        for action in ENDPOINT_ACTIONS:
+            unknown = [cid for cid in rules.get(action) or [] if cid not in index]
+            if unknown:
+                raise KeyError(f"Endpoint '{eid}' {action} references unknown criteria {unknown}")
+            masks[action][e] = _bits(rules.get(action), index)
+        last_resort[e] = rules.get("pass2_rule") == "last_resort"
+
+    return {
+        "criteria_ids": criteria_ids,
+        "criteria": compiled_criteria,
+        "derived": sorted({c["derived"] for c in compiled_criteria if c["derived"] is not None}, key=repr),
+        "unresolved": unresolved,
+        "conditions": _bits([c["id"] for c in compiled_criteria if c["condition"]], index),
+        "endpoint_ids": endpoint_ids,
+        "masks": masks,
+        "last_resort": last_resort,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Criterion evaluation
+# ---------------------------------------------------------------------------
+
+def field_values(
+    df: pd.DataFrame,
+    criterion: dict[str, Any],
+    cache: dict[Any, Any],
+) -> tuple[np.ndarray, np.ndarray]:
+    """``(values, valid)`` a criterion compares, computed once per field per run.
+
+    Values come from the MPAT column named by ``field`` or, failing that,
+    from the criterion's compiled ``mpat_derived`` expression; derived
+    columns are memoised in ``cache`` by expression, so every criterion
+    sharing one reuses it. Numeric comparisons get float64 values
+    (non-numeric entries become invalid).
+    """
+    numeric = isinstance(criterion["value"], float)
+    if criterion["field"] in df.columns:
+        source = ("col", criterion["field"])
+    elif criterion["derived"] is not None:
+        source = criterion["derived"]
+    else:
+        raise KeyError(f"Criterion '{criterion['id']}' field '{criterion['field']}' is not an MPAT column")
+
+    key = ("field", source, numeric)
+    if key not in cache:
+        if numeric:
+            values = evaluate_expression(df, source, cache)
+            valid = ~np.isnan(values)
+        else:
+            values = df[source[1]].to_numpy() if source[0] == "col" else evaluate_expression(df, source, cache)
+            valid = ~pd.isna(values)
+        cache[key] = (values, valid)
+    return cache[key]
+
+
+def evaluate_criteria(df: pd.DataFrame, compiled: dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+    """Evaluate every criterion against the whole MPAT as column-wise masks.
+
+    Returns ``(passed, known)`` packed as int64 bitmasks per parcel (bit i
+    = criterion i). A criterion is unknown where its input is missing or
+    its threshold is unresolved; unknown criteria never pass.
+    """
+    n = len(df)
+    passed = np.zeros(n, dtype="int64")
+    known = np.zeros(n, dtype="int64")
+    cache: dict[Any, Any] = {}
+
+    for i, c in enumerate(compiled["criteria"]):
+        if c["value"] is None:
+            continue
+        values, valid = field_values(df, c, cache)
+        with np.errstate(invalid="ignore"):
+            result = np.asarray(OPERATORS[c["op"]](values, c["value"]), dtype=bool) & valid
+        passed |= result.astype("int64") << i
+        known |= valid.astype("int64") << i
+
+    return passed, known
+
+
+# ---------------------------------------------------------------------------
+# Endpoint resolution
+# ---------------------------------------------------------------------------
+
+def resolve_endpoints(
+    passed: np.ndarray,
+    known: np.ndarray,
+    compiled: dict[str, Any],
+) -> dict[str, np.ndarray]:
+    """Pass 1 exclusions and Pass 2 trigger hiding for every endpoint.
+
+    A requirement acts where it is known to fail and a condition where it
+    holds (``compiled["conditions"]``); unknown criteria never act. Each
+    endpoint is a handful of bitwise ops over the packed criterion masks.
+    Per endpoint (bit e of each returned int64 mask):
+      - ``eligible``: no ``excludes_when`` criterion acts (Pass 1)
+      - ``shown``: eligible and every ``triggers_when`` criterion passes
+        (Pass 2); ``last_resort`` endpoints are shown only when no other
+        endpoint is
+      - ``flagged``: any ``flags_when`` criterion acts
+      - ``preferred``: any ``prefers_when`` criterion passes
+    """
+    masks = compiled["masks"]
+    conditions = compiled["conditions"]
+    acts = (known & ~passed & ~conditions) | (passed & conditions)
+    out = {k: np.zeros(passed.size, dtype="int64") for k in ("eligible", "shown", "flagged", "preferred")}
+
+    for e in range(len(compiled["endpoint_ids"])):
+        eligible = (acts & masks["excludes_when"][e]) == 0
+        triggered = (passed & masks["triggers_when"][e]) == masks["triggers_when"][e]
+        out["eligible"] |= eligible.astype("int64") << e
+        out["shown"] |= (eligible & triggered).astype("int64") << e
+        out["flagged"] |= ((acts & masks["flags_when"][e]) != 0).astype("int64") << e
+        out["preferred"] |= ((passed & masks["prefers_when"][e]) != 0).astype("int64") << e
+
+    last_resort_bits = int(sum(1 << e for e in np.flatnonzero(compiled["last_resort"])))
+    if last_resort_bits:
+        any_other = (out["shown"] & ~last_resort_bits) != 0
+        out["shown"] = np.where(any_other, out["shown"] & ~last_resort_bits, out["shown"])
+
+    return out
+
+
+def evaluate_rules(
+    df: pd.DataFrame,
+    compiled: dict[str, Any],
+    *,
+    tmk_field: str = "tmk",
+) -> pd.DataFrame:
+    """Run the compiled rules over the MPAT; one row per parcel of packed bitmasks.
+
+    Columns: ``tmk``, ``criteria_pass``, ``criteria_known`` (bit per
+    criterion, ``compiled["criteria_ids"]`` order) and ``endpoints_eligible``,
+    ``endpoints_shown``, ``endpoints_flagged``, ``endpoints_preferred`` (bit
+    per endpoint, ``compiled["endpoint_ids"]`` order).
+    """
+    passed, known = evaluate_criteria(df, compiled)
+    endpoints = resolve_endpoints(passed, known, compiled)
+    return pd.DataFrame({
+        tmk_field: df[tmk_field].to_numpy(),
+        "criteria_pass": passed,
+        "criteria_known": known,
+        **{f"endpoints_{k}": v for k, v in endpoints.items()},
+    })
+
+
+def decode_bits(masks: Any, names: list[str], *, sep: str = ";") -> pd.Series:
+    """Readable ``sep``-joined names for each set bit, e.g. ``"E01;E04"``."""
+    masks = np.asarray(masks, dtype="int64")
+    out = np.full(masks.size, "", dtype=object)
+    for j, name in enumerate(names):
+        has = (masks >> j) & 1 == 1
+        out[has] = out[has] + np.where(out[has] == "", name, sep + name)
+    return pd.Series(out, dtype="object")
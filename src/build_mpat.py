@@ -1,17 +1,161 @@
 from __future__ import annotations
+import re
 from pathlib import Path
-from typing import Optional
+from typing import Any
+import numpy as np
 import pandas as pd
-import arcpy
+import yaml
+
+from raster_sampling import check_raster_layout, ensure_sampling_layout, sample_band, sample_rasters
+from extents import points_extent
+from prepare_input_layers import arcpy_raster_env
+from terrain import slope_at_points, write_slope_raster
+
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
 
 try:
     from osgeo import gdal
 except ImportError:
     gdal = None
 
+
+def read_point_coords(
+    in_points: Any,
+    *,
+    tmk_field: str = "tmk",
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return ``(tmk, x, y)`` arrays for a set of analysis points.
+
+    ``in_points`` may be:
+      - a GeoDataFrame of point geometries with a ``tmk_field`` column
+      - a ``(tmk, x, y)`` tuple of array-likes
+      - a path to a point feature class/layer (read via ArcPy SearchCursor)
+
+    Only the ArcPy path needs an ArcPy licence; the other two read the
+    coordinates straight from memory with no disk round-trip.
+    """
+    if isinstance(in_points, tuple):
+        if len(in_points) != 3:
+            raise ValueError("Point arrays must be given as (tmk, x, y)")
+        tmks, xs, ys = in_points
+        tmks = np.asarray(tmks, dtype="object")
+        xs = np.asarray(xs, dtype="float64")
+        ys = np.asarray(ys, dtype="float64")
+        if not (tmks.shape == xs.shape == ys.shape):
+            raise ValueError("tmk, x and y arrays must have the same length")
+        return tmks, xs, ys
+
+    if hasattr(in_points, "geometry"):
+        geoms = in_points.geometry
+        return (
+            in_points[tmk_field].to_numpy(dtype="object"),
+            geoms.x.to_numpy(dtype="float64"),
+            geoms.y.to_numpy(dtype="float64"),
+        )
+
+    if arcpy is None:
+        raise ImportError(
+            "ArcPy is required to read points from a feature class path; "
+            "pass a GeoDataFrame or (tmk, x, y) arrays instead."
+        )
+
+    tmks, xs, ys = [], [], []
+    with arcpy.da.SearchCursor(str(in_points), [tmk_field, "SHAPE@XY"]) as cursor:
+        for tmk, (mx, my) in cursor:
+            tmks.append(tmk)
+            xs.append(mx)
+            ys.append(my)
+    return (
+        np.asarray(tmks, dtype="object"),
+        np.asarray(xs, dtype="float64"),
+        np.asarray(ys, dtype="float64"),
+    )
+
+
+def setback_radius_ft(thresholds_path: str | Path, mpat_field: str) -> float | None:
+    """Largest numeric threshold in ``thresholds.yaml`` that applies to an MPAT field.
+
+    A threshold applies when its ``mpat_field`` mentions ``mpat_field`` (so
+    ``dist_to_dom_well_ft`` picks up the ``min(dist_to_mun_well_ft,
+    dist_to_dom_well_ft)`` well setbacks). Non-numeric (VERIFY) values are
+    skipped. Returns None when nothing applies, meaning "search unbounded".
+    Pass the result as ``max_distance_ft`` to ``dist_to_nearest()`` to
+    screen setbacks quickly; the MPAT itself keeps exact distances.
+    """
+    config = yaml.safe_load(Path(thresholds_path).read_text(encoding="utf-8"))
+    values = [
+        float(t["value"])
+        for t in config["thresholds"].values()
+        if mpat_field in str(t.get("mpat_field", ""))
+        and isinstance(t.get("value"), (int, float))
+        and not isinstance(t.get("value"), bool)
+    ]
+    return max(values) if values else None
+
+
+def max_setback_ft(thresholds_path: str | Path, *, prefix: str = "dist_to_") -> float:
+    """Largest numeric distance threshold (ft) across all ``dist_to_*`` MPAT fields.
+
+    Used as the buffer around the analysis points when pre-filtering vector
+    layers: every feature within this distance of a point is still read, so
+    every setback criterion evaluates exactly as with the full layer.
+    """
+    config = yaml.safe_load(Path(thresholds_path).read_text(encoding="utf-8"))
+    fields = {
+        field
+        for t in config["thresholds"].values()
+        for field in re.findall(rf"\b{prefix}\w+", str(t.get("mpat_field", "")))
+    }
+    radii = [setback_radius_ft(thresholds_path, field) for field in sorted(fields)]
+    radii = [r for r in radii if r is not None]
+    return max(radii) if radii else 0.0
+
+
+def analysis_read_extent(
+    points_gdf: Any,
+    thresholds_path: str | Path,
+    *,
+    ft_to_m: float = 0.3048,
+) -> tuple[float, float, float, float] | None:
+    """Bbox (points CRS) for reading vector layers: analysis points + largest setback.
+
+    Distances up to the largest setback are exact against a layer read with
+    this bbox; larger distances are only guaranteed to exceed it.
+    """
+    return points_extent(points_gdf, buffer=max_setback_ft(thresholds_path) * ft_to_m)
+
+
+def unit_factor(
+    source_units: str,
+    output_units: str,
+    unit_conversions: dict[tuple[str, str], float] | None,
+) -> float:
+    """Look up the multiplier that converts raster values to output units.
+
+    If units are the same, no conversion is needed (supports unitless rasters
+    like slope_pct). Otherwise the factor comes from ``unit_conversions``.
+    """
+    if source_units == output_units:
+        return 1.0
+
+    if unit_conversions is None:
+        raise ValueError(
+            "unit_conversions must be provided when source_units != output_units"
+        )
+
+    conversion_key = (source_units, output_units)
+    if conversion_key not in unit_conversions:
+        raise ValueError(f"No conversion for {source_units} -> {output_units}")
+
+    return unit_conversions[conversion_key]
+
+
 def extract_rast_vals(
     in_raster: str,
-    in_points: str,
+    in_points: Any,
     col_name: str,
     *,
     tmk_field: str = "tmk",
@@ -20,11 +164,23 @@ def extract_rast_vals(
     nodata_threshold: float = -100,
     label: str | None = None,
     unit_conversions: dict[tuple[str, str], float] | None = None,
+    method: str = "nearest",
+    window: int = 3,
 ) -> pd.DataFrame:
     """Extract raster values at point locations using GDAL.
 
-    Reads point geometries via ArcPy SearchCursor, samples the raster
-    with GDAL, applies unit conversion, and returns a DataFrame.
+    Reads point coordinates (see ``read_point_coords`` for accepted inputs),
+    converts them to pixel indices in one pass, reads each raster block that
+    contains a point once, applies unit conversion, and returns a DataFrame.
+
+    ``method`` selects the sampling mode:
+      - "nearest": value of the cell containing the point (default)
+      - "bilinear": interpolated between the 4 nearest cell centres
+      - "min" / "max" / "mean": statistic over a ``window x window``
+        neighbourhood (e.g. max slope in the 3x3 around the point)
+
+    Non-nearest modes ignore nodata cells in the neighbourhood; a point is
+    counted as nodata only when no valid cell remains.
     """
     if gdal is None:
         raise ImportError("GDAL (osgeo) is required for raster extraction.")
@@ -32,57 +188,44 @@ def extract_rast_vals(
     if label:
         print(f"{label}:\n")
 
+    tmks, xs, ys = read_point_coords(in_points, tmk_field=tmk_field)
+
     raster_ds = gdal.Open(in_raster)
     if raster_ds is None:
         raise FileNotFoundError(f"Could not open raster: {in_raster}")
 
+    check_raster_layout(raster_ds, path=in_raster)
     band = raster_ds.GetRasterBand(1)
     gt = raster_ds.GetGeoTransform()
     nodata = band.GetNoDataValue()
 
-    results = []
-    n_total = n_nodata = n_oob = 0
-
-    with arcpy.da.SearchCursor(in_points, [tmk_field, "SHAPE@XY"]) as cursor:
-        for tmk, (mx, my) in cursor:
-            n_total += 1
-            px = int((mx - gt[0]) / gt[1])
-            py = int((my - gt[3]) / gt[5])
-
-            if not (0 <= px < raster_ds.RasterXSize and 0 <= py < raster_ds.RasterYSize):
-                n_oob += 1
-                continue
-
-            value = float(band.ReadAsArray(px, py, 1, 1)[0, 0])
-            if (nodata is not None and value == nodata) or value < nodata_threshold:
-                n_nodata += 1
-                continue
-
-            results.append({tmk_field: tmk, col_name: value})
+    values, in_bounds = sample_band(
+        band, gt, xs, ys,
+        method=method, window=window, nodata_threshold=nodata_threshold,
+    )
 
     band = None
     raster_ds = None
 
-    df = pd.DataFrame(results) if results else pd.DataFrame(columns=[tmk_field, col_name])
+    is_nodata = in_bounds & (values < nodata_threshold)
+    if nodata is not None:
+        is_nodata |= in_bounds & (values == nodata)
+    if method != "nearest":
+        is_nodata |= in_bounds & np.isnan(values)
+    keep = in_bounds & ~is_nodata
 
-    # Unit conversion
-    # - If units are the same, do nothing (supports unitless rasters like slope_pct)
-    # - Otherwise, look up factor in unit_conversions and apply it
-    if source_units == output_units:
-        factor = 1.0
-    else:
-        if unit_conversions is None:
-            raise ValueError(
-                "unit_conversions must be provided when source_units != output_units"
-            )
+    n_total = len(tmks)
+    n_oob = int((~in_bounds).sum())
+    n_nodata = int(is_nodata.sum())
 
-        conversion_key = (source_units, output_units)
-        if conversion_key not in unit_conversions:
-            raise ValueError(f"No conversion for {source_units} -> {output_units}")
+    df = pd.DataFrame({
+        tmk_field: tmks[keep],
+        col_name: values[keep],
+    }) if keep.any() else pd.DataFrame(columns=[tmk_field, col_name])
 
-        factor = unit_conversions[conversion_key]
-        if not df.empty and factor != 1.0:
-            df[col_name] = df[col_name] * factor
+    factor = unit_factor(source_units, output_units, unit_conversions)
+    if not df.empty and factor != 1.0:
+        df[col_name] = df[col_name] * factor
 
     # Summary
     print(f"  Sampled {n_total:,} points against '{Path(in_raster).name}'")
@@ -97,6 +240,80 @@ def extract_rast_vals(
 
     return df
 
+
+def extract_rast_stack(
+    rasters: dict[str, tuple[str, str, str]],
+    in_points: Any,
+    *,
+    tmk_field: str = "tmk",
+    nodata_threshold: float = -100,
+    label: str | None = None,
+    unit_conversions: dict[tuple[str, str], float] | None = None,
+    method: str | dict[str, str] = "nearest",
+    window: int = 3,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Extract several rasters at point locations in a single pass.
+
+    ``rasters`` maps output column name -> ``(raster_path, source_units,
+    output_units)``. Points are read once, pixel indices are computed once
+    per distinct geotransform, and all rasters are sampled concurrently.
+    ``method`` is a sampling mode for all rasters (see ``extract_rast_vals``)
+    or a ``{col_name: method}`` mapping; unlisted columns use "nearest".
+
+    Returns one row per analysis point (aligned with the input order) with
+    one column per raster. Out-of-bounds and nodata values are NaN instead
+    of being dropped, so the result can be merged once instead of per raster.
+    """
+    if label:
+        print(f"{label}:\n")
+
+    # Resolve unit factors up front so bad configs fail before any reads
+    factors = {
+        col_name: unit_factor(source_units, output_units, unit_conversions)
+        for col_name, (_, source_units, output_units) in rasters.items()
+    }
+
+    methods = method if isinstance(method, dict) else {col_name: method for col_name in rasters}
+
+    tmks, xs, ys = read_point_coords(in_points, tmk_field=tmk_field)
+    sampled = sample_rasters(
+        {col_name: spec[0] for col_name, spec in rasters.items()},
+        xs, ys,
+        methods=methods,
+        window=window,
+        nodata_threshold=nodata_threshold,
+        max_workers=max_workers,
+    )
+
+    columns = {tmk_field: tmks}
+    print(f"  Sampled {len(tmks):,} points against {len(rasters)} rasters")
+    for col_name, (values, in_bounds, nodata) in sampled.items():
+        raster_path, source_units, output_units = rasters[col_name]
+        is_nodata = in_bounds & (values < nodata_threshold)
+        if nodata is not None:
+            is_nodata |= in_bounds & (values == nodata)
+        if methods.get(col_name, "nearest") != "nearest":
+            is_nodata |= in_bounds & np.isnan(values)
+        keep = in_bounds & ~is_nodata
+
+        factor = factors[col_name]
+        columns[col_name] = np.where(keep, values * factor, np.nan)
+
+        n_oob = int((~in_bounds).sum())
+        n_nodata = int(is_nodata.sum())
+        print(f"  '{col_name}' <- '{Path(raster_path).name}': {int(keep.sum()):,} valid values")
+        if factor != 1.0:
+            print(f"    Converted {source_units} -> {output_units} (x{factor:.4f})")
+        if n_nodata > 0:
+            print(f"    Skipped {n_nodata:,} nodata values")
+        if n_oob > 0:
+            print(f"    Skipped {n_oob:,} out-of-bounds points")
+    print()
+
+    return pd.DataFrame(columns)
+
+
 def calculate_slope_percentages(
     *,
     in_dem_raster: str,
@@ -104,30 +321,48 @@ def calculate_slope_percentages(
     output_measurement: str = "PERCENT_RISE",
     method: str = "GEODESIC",
     z_unit: str = "METER",
+    engine: str = "numpy",
+    tile_size: int | None = None,
+    max_workers: int | None = 1,
+    max_worker_mb: float = 512,
     use_gpu_if_available: bool = True,
     overwrite: bool = True,
 ) -> str:
     """
-    Create a slope raster from a DEM using ArcPy Spatial Analyst.
+    Create a slope raster from a DEM.
 
     This helper ONLY creates the slope raster (percent rise).
     You can then use your existing `extract_rast_vals()` helper to
-    sample slope values at `analysis_fc`.
+    sample slope values at the analysis points. If you only need slope
+    at the points, `extract_slope_vals()` skips the raster entirely.
 
     Parameters
     ----------
     in_dem_raster : str
         Path to input DEM raster (e.g., 10m DEM) in your target CRS.
     out_slope_raster : str | Path
-        Output path for slope raster (GeoTIFF recommended).
+        Output path for slope raster (GeoTIFF recommended). Written as a
+        tiled, compressed GeoTIFF with overviews by either engine.
     output_measurement : str
         "PERCENT_RISE" (recommended) or "DEGREE" (if needed).
     method : str
         "GEODESIC" (as your supervisor requested) or "PLANAR".
     z_unit : str
         Vertical units of the DEM (your supervisor said meters -> "METER").
+    engine : str
+        "numpy" (default; GDAL + NumPy Horn kernel, no licence needed,
+        written tile by tile) or "arcpy" (Spatial Analyst Slope tool).
+    tile_size : int | None
+        Tile edge in pixels for the NumPy engine; None sizes tiles to fit
+        ``max_worker_mb``.
+    max_workers : int | None
+        Worker processes for the NumPy engine (None = all cores).
+    max_worker_mb : float
+        Memory budget per worker for the NumPy engine, used when
+        ``tile_size`` is None.
     use_gpu_if_available : bool
-        Try to use GPU processing when supported by ArcGIS/your install.
+        Try to use GPU processing when supported by ArcGIS/your install
+        (ArcPy engine only).
     overwrite : bool
         Overwrite the output if it already exists.
 
@@ -145,7 +380,27 @@ def calculate_slope_percentages(
     # Ensure output folder exists
     Path(out_slope_raster).parent.mkdir(parents=True, exist_ok=True)
 
+    if engine == "numpy":
+        if Path(out_slope_raster).exists():
+            if not overwrite:
+                return out_slope_raster
+            Path(out_slope_raster).unlink()
+        return write_slope_raster(
+            in_dem_raster,
+            out_slope_raster,
+            output_measurement=output_measurement,
+            method=method,
+            z_unit=z_unit,
+            tile_size=tile_size,
+            max_workers=max_workers,
+            max_worker_mb=max_worker_mb,
+        )
+    if engine != "arcpy":
+        raise ValueError(f"Unknown slope engine '{engine}' (expected 'numpy' or 'arcpy')")
+
     # Spatial Analyst required
+    if arcpy is None:
+        raise ImportError("ArcPy (Spatial Analyst) is required to create a slope raster.")
     arcpy.CheckOutExtension("Spatial")
     arcpy.env.overwriteOutput = overwrite
 
@@ -168,12 +423,65 @@ def calculate_slope_percentages(
     # --- Run Slope tool ---
     from arcpy.sa import Slope  # import inside to keep helper lightweight
 
-    slope_ras = Slope(
-        in_raster=in_dem_raster,
-        output_measurement=output_measurement,  # "PERCENT_RISE"
-        method=method,                          # "GEODESIC"
-        z_unit=z_unit,                          # "METER"
-    )
-    slope_ras.save(out_slope_raster)
+    with arcpy.EnvManager(**arcpy_raster_env("BILINEAR")):
+        slope_ras = Slope(
+            in_raster=in_dem_raster,
+            output_measurement=output_measurement,  # "PERCENT_RISE"
+            method=method,                          # "GEODESIC"
+            z_unit=z_unit,                          # "METER"
+        )
+        slope_ras.save(out_slope_raster)
+
+    # Same tiled/compressed/overview layout as the NumPy engine
+    if gdal is not None:
+        ensure_sampling_layout(out_slope_raster, resampling="AVERAGE")
 
     return out_slope_raster
+
+
+def extract_slope_vals(
+    in_dem_raster: str,
+    in_points: Any,
+    col_name: str = "slope_pct",
+    *,
+    tmk_field: str = "tmk",
+    output_measurement: str = "PERCENT_RISE",
+    method: str = "GEODESIC",
+    z_unit: str = "METER",
+    label: str | None = None,
+) -> pd.DataFrame:
+    """Compute slope at point locations directly from the DEM.
+
+    Point-only alternative to `calculate_slope_percentages()` +
+    `extract_rast_vals()`: slope is computed from the 3x3 DEM neighbourhood
+    around each point's cell, so no statewide slope raster is written.
+    Returns the same shape of DataFrame as `extract_rast_vals()`.
+    """
+    if label:
+        print(f"{label}:\n")
+
+    tmks, xs, ys = read_point_coords(in_points, tmk_field=tmk_field)
+    values, in_bounds = slope_at_points(
+        in_dem_raster, xs, ys,
+        output_measurement=output_measurement,
+        method=method,
+        z_unit=z_unit,
+    )
+    keep = in_bounds & ~np.isnan(values)
+
+    df = pd.DataFrame({
+        tmk_field: tmks[keep],
+        col_name: values[keep],
+    }) if keep.any() else pd.DataFrame(columns=[tmk_field, col_name])
+
+    n_oob = int((~in_bounds).sum())
+    n_nodata = int((in_bounds & ~keep).sum())
+    print(f"  Computed {output_measurement.lower()} slope ({method.lower()}) at {len(tmks):,} points from '{Path(in_dem_raster).name}'")
+    print(f"  Extracted {len(df):,} valid values for '{col_name}'")
+    if n_nodata > 0:
+        print(f"  Skipped {n_nodata:,} nodata values")
+    if n_oob > 0:
+        print(f"  Skipped {n_oob:,} out-of-bounds points")
+    print()
+
+    return df
@@ -2,11 +2,16 @@ import plotly.io as pio
 import plotly.graph_objects as go
 import geopandas as gpd
 
-def load_gdf(entry: dict, drop_cols: list = None, maui_only: bool = False) -> gpd.GeoDataFrame:
-    """Load a GeoDataFrame from an inputs entry dict, reproject to WGS84, and optionally drop columns."""
+from extents import island_extent
+
+def load_gdf(entry: dict, drop_cols: list = None, islands: list = None) -> gpd.GeoDataFrame:
+    """Load a GeoDataFrame from an inputs entry dict, reproject to WGS84, and optionally drop columns.
+
+    ``islands`` limits the read to the registered extent(s) of those islands (EPSG:32604 layers).
+    """
     path  = entry["path"]
     layer = entry.get("layer")
-    bbox  = (724000, 2263000, 806000, 2334000) if maui_only else None  # Maui bbox EPSG:32604
+    bbox  = island_extent(islands)
     gdf   = gpd.read_file(path, layer=layer, bbox=bbox).to_crs(epsg=4326)
     if drop_cols:
         gdf = gdf.drop(columns=drop_cols, errors="ignore")
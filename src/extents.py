@@ -0,0 +1,103 @@
+"""
+src/extents.py
+Shared island-extent registry and extent helpers used to pre-filter vector reads.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+import numpy as np
+
+
+# Island bounding boxes (minx, miny, maxx, maxy) in EPSG:32604 (UTM 4N, metres),
+# rounded outward to the nearest km. Keys match the cesspool `island` values.
+ISLAND_EXTENTS_32604: dict[str, tuple[float, float, float, float]] = {
+    "Niihau":    (369000, 2405000, 393000, 2438000),
+    "Kauai":     (416000, 2416000, 473000, 2461000),
+    "Oahu":      (572000, 2347000, 643000, 2404000),
+    "Molokai":   (672000, 2326000, 741000, 2351000),
+    "Lanai":     (698000, 2291000, 731000, 2321000),
+    "Kahoolawe": (738000, 2267000, 759000, 2283000),
+    "Maui":      (739000, 2276000, 816000, 2330000),
+    "Hawaii":    (804000, 2091000, 944000, 2250000),
+}
+
+Bbox = tuple[float, float, float, float]
+
+
+def union_bbox(bboxes: Iterable[Bbox]) -> Bbox:
+    """Smallest bbox covering all ``bboxes``."""
+    arr = np.asarray(list(bboxes), dtype="float64").reshape(-1, 4)
+    if arr.size == 0:
+        raise ValueError("Cannot take the union of zero bounding boxes")
+    return (
+        float(arr[:, 0].min()), float(arr[:, 1].min()),
+        float(arr[:, 2].max()), float(arr[:, 3].max()),
+    )
+
+
+def buffer_bbox(bbox: Bbox, distance: float) -> Bbox:
+    """Expand a bbox by ``distance`` on every side."""
+    minx, miny, maxx, maxy = bbox
+    return (minx - distance, miny - distance, maxx + distance, maxy + distance)
+
+
+def island_extent(islands: str | Iterable[str] | None, *, buffer: float = 0.0) -> Bbox | None:
+    """Bbox (EPSG:32604) covering one or more islands, optionally buffered.
+
+    Returns None for ``islands=None`` (all islands, no filter).
+    """
+    if islands is None:
+        return None
+    if isinstance(islands, str):
+        islands = [islands]
+    unknown = [i for i in islands if i not in ISLAND_EXTENTS_32604]
+    if unknown:
+        raise KeyError(f"No extent registered for island(s): {unknown}")
+    return buffer_bbox(union_bbox(ISLAND_EXTENTS_32604[i] for i in islands), buffer)
+
+
+def statewide_extent(points: Any = None, *, buffer: float = 0.0) -> Bbox:
+    """Bbox covering every registered island, and any of ``points`` outside them, optionally buffered.
+
+    Unlike ``points_extent`` it does not move as points are added or moved
+    on the islands, so reads keyed on it stay valid across builds.
+    """
+    bboxes = list(ISLAND_EXTENTS_32604.values())
+    if points is not None:
+        geoms = points.geometry if hasattr(points, "geometry") else points
+        outside = points_extent(geoms[np.equal(island_of_points(geoms), None)])
+        if outside is not None:
+            bboxes.append(outside)
+    return buffer_bbox(union_bbox(bboxes), buffer)
+
+
+def points_extent(points: Any, *, buffer: float = 0.0) -> Bbox | None:
+    """Bbox of a point GeoDataFrame/GeoSeries, expanded by ``buffer`` (CRS units).
+
+    Any feature within ``buffer`` of a point intersects the result, so a
+    bbox-filtered read still finds every feature inside that distance.
+    Returns None when there are no points.
+    """
+    geoms = points.geometry if hasattr(points, "geometry") else points
+    if len(geoms) == 0:
+        return None
+    return buffer_bbox(tuple(float(v) for v in geoms.total_bounds), buffer)
+
+
+def island_of_points(points: Any) -> np.ndarray:
+    """Island name for each point (EPSG:32604) from ``ISLAND_EXTENTS_32604``, None outside them all.
+
+    Where island boxes overlap (e.g. Maui / Kahoolawe) the smallest box
+    containing the point wins.
+    """
+    geoms = points.geometry if hasattr(points, "geometry") else points
+    x = geoms.x.to_numpy(dtype="float64")
+    y = geoms.y.to_numpy(dtype="float64")
+    out = np.full(x.size, None, dtype=object)
+    by_area = sorted(ISLAND_EXTENTS_32604.items(), key=lambda kv: (kv[1][2] - kv[1][0]) * (kv[1][3] - kv[1][1]))
+    for name, (minx, miny, maxx, maxy) in reversed(by_area):
+        inside = (x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)
+        out[inside] = name
+    return out
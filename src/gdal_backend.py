@@ -0,0 +1,246 @@
+"""
+src/gdal_backend.py
+GDAL/OGR backend for prepare_input_layers.py (pass ``arcpy=gdal_backend``; no ArcGIS licence needed).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+from prepare_input_layers import (
+    OVERVIEW_RESAMPLING,
+    build_vrt_mosaic,
+    ensure_dir,
+    gpkg_layer_path,
+    raster_outpath_in_subfolder,
+    warp_to_target,
+)
+from raster_sampling import cog_creation_options, ensure_sampling_layout, gtiff_creation_options
+
+try:
+    from osgeo import gdal, osr
+except ImportError:
+    gdal = None
+    osr = None
+
+
+# prepare_input_layers.is_gdal_backend() looks for this marker
+BACKEND = "gdal"
+
+# GDAL errors raise RuntimeError inside ``with gdal.ExceptionMgr():`` blocks
+# only, so other callers' ``if ds is None`` checks (raster_sampling,
+# prepare_input_layers) keep GDAL's default error behaviour.
+
+# Minimum ``FindMatches`` confidence (0-100) to treat a CRS as an EPSG code;
+# 90+ means the definitions are equivalent and at most their names differ
+EPSG_MATCH_CONFIDENCE = 90
+
+
+def _require_gdal() -> None:
+    if gdal is None:
+        raise ImportError("GDAL (osgeo) is required for the GDAL backend.")
+
+
+# ---------------------------------------------------------------------------
+# CRS lookup
+# ---------------------------------------------------------------------------
+
+def _open_vector_layer(dataset: str) -> tuple[Any, Any]:
+    """(datasource, layer) for a vector file or a ``<file.gpkg>/<layer>`` / ``<x.gdb>/<layer>`` path."""
+    path = Path(dataset)
+    container = path.parent.is_file() or path.parent.suffix.lower() == ".gdb"
+    if not path.exists() and container:
+        ds = gdal.OpenEx(str(path.parent), gdal.OF_VECTOR)
+        return ds, ds.GetLayerByName(path.name)
+    ds = gdal.OpenEx(str(path), gdal.OF_VECTOR)
+    return ds, ds.GetLayer(0)
+
+
+def dataset_srs(dataset: str) -> Any:
+    """Spatial reference of a raster or vector dataset (a copy), or None when it has no CRS."""
+    _require_gdal()
+    with gdal.ExceptionMgr():
+        try:
+            ds = gdal.OpenEx(str(dataset), gdal.OF_RASTER)
+        except RuntimeError:
+            ds = None
+        if ds is not None:
+            srs = ds.GetSpatialRef()
+        else:
+            ds, layer = _open_vector_layer(dataset)
+            srs = layer.GetSpatialRef() if layer is not None else None
+        # Clone while the dataset is open: the layer owns its reference
+        return None if srs is None else srs.Clone()
+
+
+def epsg_of_srs(srs: Any) -> int | None:
+    """EPSG code of a spatial reference, or None when it matches no EPSG definition.
+
+    Definitions without an authority code (ESRI ``.prj`` files) are
+    matched against the EPSG database with ``FindMatches``.
+    """
+    if srs is None:
+        return None
+    srs = srs.Clone()
+    try:
+        srs.AutoIdentifyEPSG()
+    except RuntimeError:
+        pass  # raised (with exceptions enabled) when nothing is recognised
+    if srs.GetAuthorityName(None) == "EPSG" and srs.GetAuthorityCode(None):
+        return int(srs.GetAuthorityCode(None))
+    for match, confidence in srs.FindMatches() or []:
+        if confidence >= EPSG_MATCH_CONFIDENCE and match.GetAuthorityName(None) == "EPSG":
+            return int(match.GetAuthorityCode(None))
+    return None
+
+
+def srs_matches_epsg(srs: Any, epsg: int) -> bool:
+    """True when ``srs`` is the CRS ``EPSG:<epsg>`` (axis-order differences ignored)."""
+    if srs is None:
+        return False
+    target = osr.SpatialReference()
+    target.ImportFromEPSG(int(epsg))
+    if srs.IsSame(target, ["IGNORE_DATA_AXIS_TO_SRS_AXIS_MAPPING=YES"]):
+        return True
+    return epsg_of_srs(srs) == int(epsg)
+
+
+def epsg_of_dataset(dataset: str) -> int | None:
+    """EPSG code of a raster or vector dataset, or None when it has no identifiable CRS."""
+    return epsg_of_srs(dataset_srs(dataset))
+
+
+# ---------------------------------------------------------------------------
+# Vector prep
+# ---------------------------------------------------------------------------
+
+def prep_vector_to_gpkg(
+    *,
+    src_fc: str,
+    out_gpkg: str,
+    out_layer: str,
+    target_epsg: int,
+    temp_dir: str | Path,
+    overwrite: bool = True,
+) -> str:
+    """Reproject (if needed) and write a vector layer into a GeoPackage in one ogr2ogr pass."""
+    _require_gdal()
+    ensure_dir(Path(out_gpkg).parent)
+    if dataset_srs(src_fc) is None:
+        raise ValueError(f"Vector has no readable CRS: {src_fc}")
+
+    gpkg_exists = Path(out_gpkg).exists()
+    with gdal.ExceptionMgr():
+        if gpkg_exists and not overwrite:
+            ds = gdal.OpenEx(str(out_gpkg), gdal.OF_VECTOR)
+            if ds.GetLayerByName(out_layer) is not None:
+                raise FileExistsError(f"Layer already exists: {gpkg_layer_path(out_gpkg, out_layer)}")
+
+        options = gdal.VectorTranslateOptions(
+            format="GPKG",
+            dstSRS=f"EPSG:{target_epsg}",
+            reproject=True,
+            layerName=out_layer,
+            accessMode="overwrite" if gpkg_exists else None,
+            layerCreationOptions=["SPATIAL_INDEX=YES"],
+        )
+        gdal.VectorTranslate(str(out_gpkg), str(src_fc), options=options).Close()  # flush to disk
+    return gpkg_layer_path(out_gpkg, out_layer)
+
+
+# ---------------------------------------------------------------------------
+# Raster prep
+# ---------------------------------------------------------------------------
+
+def define_projection_if_missing(
+    *,
+    raster_path: str,
+    assumed_epsg: int,
+    temp_dir: str | Path,
+    overwrite: bool = True,
+) -> str:
+    """Return ``raster_path``, or a small VRT that assigns ``assumed_epsg`` when it has no CRS."""
+    _require_gdal()
+    ensure_dir(temp_dir)
+    if dataset_srs(raster_path) is not None:
+        return raster_path
+    tmp = str(Path(temp_dir) / f"{Path(raster_path).stem}_defined.vrt")
+    if overwrite and Path(tmp).exists():
+        Path(tmp).unlink()
+    with gdal.ExceptionMgr():
+        gdal.Translate(tmp, str(raster_path), format="VRT", outputSRS=f"EPSG:{assumed_epsg}").Close()
+    return tmp
+
+
+def prep_raster_to_target(
+    *,
+    src_raster: str,
+    prepared_tif: str,
+    target_epsg: int,
+    temp_dir: str | Path,
+    resampling: str = "BILINEAR",
+    assume_src_epsg_if_missing: int | None = None,
+    overwrite: bool = True,
+) -> str:
+    """Project a raster into the prepared subfolder with a multithreaded GDAL warp.
+
+    Rasters already in ``target_epsg`` are copied unchanged (no resampling).
+    Either way the output is a tiled, compressed COG with overviews.
+    """
+    _require_gdal()
+    ensure_dir(temp_dir)
+    src_srs = dataset_srs(src_raster)
+    if src_srs is None and assume_src_epsg_if_missing is None:
+        raise ValueError(f"Raster has no readable CRS: {src_raster}")
+
+    if srs_matches_epsg(src_srs, target_epsg):
+        out_raster = raster_outpath_in_subfolder(Path(prepared_tif).parent, Path(prepared_tif).stem)
+        if overwrite and Path(out_raster).exists():
+            Path(out_raster).unlink()
+        overview_resampling = OVERVIEW_RESAMPLING[resampling.upper()]
+        with gdal.ExceptionMgr():
+            gdal.Translate(
+                out_raster, str(src_raster),
+                format="COG",
+                creationOptions=cog_creation_options(overview_resampling),
+            ).Close()
+        return ensure_sampling_layout(out_raster, resampling=overview_resampling)
+
+    return warp_to_target(
+        src_raster=src_raster,
+        prepared_tif=prepared_tif,
+        target_epsg=target_epsg,
+        resampling=resampling,
+        assume_src_epsg_if_missing=assume_src_epsg_if_missing,
+        overwrite=overwrite,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Mosaic helper
+# ---------------------------------------------------------------------------
+
+def mosaic_dir_to_raster(
+    *,
+    raster_dir: str,
+    out_mosaic: str,
+    overwrite: bool = True,
+) -> str:
+    """Mosaic every .tif in a folder into one float32 GeoTIFF (first tile wins on overlap)."""
+    _require_gdal()
+    ensure_dir(Path(out_mosaic).parent)
+    if overwrite and Path(out_mosaic).exists():
+        Path(out_mosaic).unlink()
+    vrt = build_vrt_mosaic(
+        raster_dir=raster_dir,
+        out_vrt=str(Path(out_mosaic).with_suffix(".vrt")),
+        overwrite=True,
+    )
+    with gdal.ExceptionMgr():
+        gdal.Translate(
+            str(out_mosaic), vrt,
+            outputType=gdal.GDT_Float32,
+            creationOptions=gtiff_creation_options(floating=True),
+        ).Close()
+    return str(out_mosaic)
@@ -0,0 +1,371 @@
+"""
+src/incremental_build.py
+Incremental MPAT rebuilds (input + analysis-point fingerprints > recompute changed families/points only).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from layer_cache import source_hash
+from point_attributes import (
+    POINT_FAMILIES,
+    compute_point_family,
+    family_settings,
+    point_attribute_columns,
+    with_nearest_read_extent,
+)
+from spatial_index import point_coords
+
+
+# Bump when the state layout changes so the next build starts from scratch
+STATE_VERSION = 1
+
+# Analysis points that moved less than this (CRS units) count as unchanged
+POINT_TOLERANCE = 1e-3
+
+
+# ---------------------------------------------------------------------------
+# Fingerprints
+# ---------------------------------------------------------------------------
+
+def family_fingerprints(
+    inputs: dict[str, str],
+    ctx: dict[str, Any],
+    *,
+    families: list[str] | None = None,
+    hash_dir: str | Path,
+) -> dict[str, str]:
+    """One fingerprint per family from the content hashes of its inputs and its settings.
+
+    Files named in ``ctx`` (``ctx_inputs``, e.g. a prepared slope raster)
+    are hashed like inputs; unset ones count as absent. Hashes are
+    memoised on (size, mtime) in ``hash_dir`` (see
+    ``layer_cache.source_hash``), so unchanged files cost a ``stat``.
+    """
+    settings = family_settings(ctx)
+    hashes: dict[str, str] = {}
+    ctx_hashes: dict[str, str | None] = {}
+    out = {}
+    for family in (list(POINT_FAMILIES) if families is None else families):
+        spec = POINT_FAMILIES[family]
+        for key in spec["inputs"]:
+            if key not in hashes:
+                hashes[key] = source_hash(inputs[key], hash_dir)
+        for key in spec.get("ctx_inputs", []):
+            if key not in ctx_hashes:
+                ctx_hashes[key] = source_hash(ctx[key], hash_dir) if ctx.get(key) else None
+        doc = json.dumps({
+            "family": family,
+            "inputs": {key: hashes[key] for key in spec["inputs"]},
+            "ctx_inputs": {key: ctx_hashes[key] for key in spec.get("ctx_inputs", [])},
+            "settings": {key: settings[key] for key in spec["settings"]},
+        }, sort_keys=True)
+        out[family] = hashlib.sha256(doc.encode()).hexdigest()[:16]
+    return out
+
+
+def point_fingerprints(points_gdf: Any, *, tmk_field: str = "tmk") -> pd.DataFrame:
+    """``tmk``, ``x``, ``y`` of every analysis point (the per-TMK point fingerprint)."""
+    x, y = point_coords(points_gdf)
+    return pd.DataFrame({tmk_field: points_gdf[tmk_field].to_numpy(), "x": x, "y": y})
+
+
+# ---------------------------------------------------------------------------
+# Build state (previous MPAT point attributes + fingerprints)
+# ---------------------------------------------------------------------------
+
+def load_build_state(state_dir: str | Path) -> dict[str, Any] | None:
+    """State written by the last build, or None when there is none (or it is outdated)."""
+    state_dir = Path(state_dir)
+    if not (state_dir / "state.json").exists():
+        return None
+    meta = json.loads((state_dir / "state.json").read_text())
+    if meta.get("version") != STATE_VERSION:
+        return None
+    return {
+        **meta,
+        "points": pd.read_pickle(state_dir / "points.pkl"),
+        "attributes": pd.read_pickle(state_dir / "attributes.pkl"),
+    }
+
+
+def save_build_state(
+    state_dir: str | Path,
+    fingerprints: dict[str, str],
+    points: pd.DataFrame,
+    attributes: pd.DataFrame,
+) -> None:
+    """Write fingerprints, point coordinates and point attributes for the next incremental build.
+
+    Written to a temporary folder and moved into place, so an interrupted
+    write leaves the previous state intact. The source-hash memo
+    (``layer_cache.source_hash``) is carried over.
+    """
+    state_dir = Path(state_dir)
+    tmp_dir = state_dir.with_name(state_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    memo_path = state_dir / "source_hashes.json"
+    if memo_path.exists():
+        shutil.copy2(memo_path, tmp_dir / memo_path.name)
+    points.to_pickle(tmp_dir / "points.pkl")
+    attributes.to_pickle(tmp_dir / "attributes.pkl")
+    (tmp_dir / "state.json").write_text(json.dumps({
+        "version": STATE_VERSION,
+        "built": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "families": fingerprints,
+        "n_points": len(points),
+    }, indent=2))
+
+    if state_dir.exists():
+        shutil.rmtree(state_dir)
+    tmp_dir.rename(state_dir)
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+def plan_incremental_build(
+    points_gdf: Any,
+    fingerprints: dict[str, str],
+    state: dict[str, Any] | None,
+    *,
+    tmk_field: str = "tmk",
+    tolerance: float = POINT_TOLERANCE,
+) -> dict[str, Any]:
+    """Decide which families to recompute, and for which TMKs.
+
+    A family whose fingerprint differs from the stored one (or that has
+    no stored values) is recomputed for every point. Every other family is
+    recomputed only for TMKs whose analysis point is new or moved more
+    than ``tolerance``. Returns ``points`` (current fingerprints),
+    ``new``/``moved``/``removed`` TMK arrays, ``stale`` families and
+    ``recompute`` (family > TMKs to compute).
+    """
+    points = point_fingerprints(points_gdf, tmk_field=tmk_field)
+    tmks = points[tmk_field].to_numpy()
+
+    if state is None:
+        return {
+            "points": points,
+            "new": tmks,
+            "moved": np.array([], dtype=object),
+            "removed": np.array([], dtype=object),
+            "stale": list(fingerprints),
+            "recompute": {family: tmks for family in fingerprints},
+        }
+
+    prev = state["points"].set_index(tmk_field)
+    pos = prev.index.get_indexer(tmks)
+    is_new = pos < 0
+    dx = points["x"].to_numpy() - prev["x"].to_numpy()[np.clip(pos, 0, None)]
+    dy = points["y"].to_numpy() - prev["y"].to_numpy()[np.clip(pos, 0, None)]
+    is_moved = ~is_new & (np.hypot(dx, dy) > tolerance)
+    removed = prev.index.difference(pd.Index(tmks)).to_numpy(dtype=object)
+
+    stored = state["attributes"].columns
+    stale = [
+        family for family, fp in fingerprints.items()
+        if state["families"].get(family) != fp
+        or not set(POINT_FAMILIES[family]["columns"]) <= set(stored)
+    ]
+    changed = tmks[is_new | is_moved]
+    return {
+        "points": points,
+        "new": tmks[is_new],
+        "moved": tmks[is_moved],
+        "removed": removed,
+        "stale": stale,
+        "recompute": {family: tmks if family in stale else changed for family in fingerprints},
+    }
+
+
+# ---------------------------------------------------------------------------
+# Merge + change log
+# ---------------------------------------------------------------------------
+
+def _values_differ(old: pd.Series, new: pd.Series) -> np.ndarray:
+    both_na = old.isna().to_numpy() & new.isna().to_numpy()
+    equal = old.to_numpy(dtype=object) == new.to_numpy(dtype=object)
+    return ~(both_na | equal)
+
+
+def _assign_rows(column: pd.Series, rows: np.ndarray, values: pd.Series) -> np.ndarray:
+    """``column`` with ``rows`` replaced by ``values`` (float64 when both are numeric, else object)."""
+    if pd.api.types.is_numeric_dtype(column) and pd.api.types.is_numeric_dtype(values):
+        out = column.to_numpy(dtype="float64", na_value=np.nan).copy()
+        out[rows] = values.to_numpy(dtype="float64", na_value=np.nan)
+    else:
+        out = column.to_numpy(dtype=object).copy()
+        out[rows] = values.to_numpy(dtype=object)
+    return out
+
+
+def _carried_families(plan: dict[str, Any], state: dict[str, Any] | None) -> list[str]:
+    """Stored families that ``plan`` does not recompute (kept as they are by a subset build)."""
+    if state is None:
+        return []
+    stored = set(state["attributes"].columns)
+    return [
+        family for family in POINT_FAMILIES
+        if family not in plan["recompute"] and set(POINT_FAMILIES[family]["columns"]) <= stored
+    ]
+
+
+def merge_incremental(
+    plan: dict[str, Any],
+    state: dict[str, Any] | None,
+    results: dict[str, pd.DataFrame],
+    *,
+    tmk_field: str = "tmk",
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Merge recomputed family values into the previous point attributes.
+
+    Returns ``(attributes, change_log)``: ``attributes`` has one row per
+    current analysis point (previous values where nothing was recomputed).
+    Stored columns of families outside ``plan["recompute"]`` are carried
+    over unchanged (missing for new points), so a build of a subset of
+    families keeps the others' values.
+    ``change_log`` has one row per TMK and family whose values were
+    recomputed, with the ``reason`` (``new_point``, ``moved_point`` or
+    ``input_changed``) and the ``changed_columns`` whose values differ from
+    the previous build, plus one ``removed_point`` row per dropped TMK.
+    """
+    tmks = plan["points"][tmk_field].to_numpy()
+    families = list(plan["recompute"])
+    columns = point_attribute_columns(
+        [family for family in POINT_FAMILIES if family in families or family in _carried_families(plan, state)]
+    )
+
+    if state is None:
+        out = pd.DataFrame({tmk_field: tmks})
+    else:
+        out = state["attributes"].set_index(tmk_field).reindex(tmks).rename_axis(tmk_field).reset_index()
+    for col in columns:
+        if col not in out.columns:
+            out[col] = np.nan
+
+    reason = pd.Series("input_changed", index=tmks, dtype="object")
+    reason[pd.Index(tmks).isin(plan["moved"])] = "moved_point"
+    reason[pd.Index(tmks).isin(plan["new"])] = "new_point"
+
+    logs = []
+    row_of = pd.Index(tmks)
+    for family in families:
+        fresh = results.get(family)
+        if fresh is None or fresh.empty:
+            continue
+        fresh = fresh.set_index(tmk_field)
+        rows = row_of.get_indexer(fresh.index)
+        keep = rows >= 0
+        fresh, rows = fresh.loc[keep], rows[keep]
+
+        diff_cols = []
+        for col in POINT_FAMILIES[family]["columns"]:
+            old = out[col].iloc[rows].reset_index(drop=True)
+            new = fresh[col].reset_index(drop=True)
+            diff_cols.append(np.where(_values_differ(old, new), col, ""))
+            out[col] = _assign_rows(out[col], rows, new)
+
+        logs.append(pd.DataFrame({
+            tmk_field: fresh.index.to_numpy(),
+            "family": family,
+            "reason": reason.to_numpy()[rows],
+            "changed_columns": [";".join(c for c in cols if c) for cols in zip(*diff_cols)],
+        }))
+
+    if len(plan["removed"]):
+        logs.append(pd.DataFrame({
+            tmk_field: plan["removed"],
+            "family": "",
+            "reason": "removed_point",
+            "changed_columns": "",
+        }))
+
+    change_log = (
+        pd.concat(logs, ignore_index=True) if logs
+        else pd.DataFrame(columns=[tmk_field, "family", "reason", "changed_columns"])
+    )
+    return out.loc[:, [tmk_field] + columns], change_log
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def run_incremental_build(
+    points_gdf: Any,
+    inputs: dict[str, str],
+    ctx: dict[str, Any],
+    state_dir: str | Path,
+    *,
+    families: list[str] | None = None,
+    tmk_field: str = "tmk",
+    save: bool = True,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Point attributes for ``points_gdf``, recomputing only what changed since the last build.
+
+    Fingerprints every family's inputs and settings and every analysis
+    point, recomputes stale families for all points and the rest only for
+    new/moved points (see ``plan_incremental_build``), merges the results
+    into the previous build's values and, with ``save``, records the new
+    state in ``state_dir``. The first build (no state) computes everything.
+
+    Nearest-feature families read layers with the statewide extent
+    (``nearest_read_extent``, see ``with_nearest_read_extent``), not just
+    the points being recomputed, so the result equals a full build. That
+    extent is part of their fingerprint but does not grow as parcels are
+    added on the islands, so new points do not make those families stale.
+    Source hashes are memoised in ``state_dir``.
+
+    With ``families``, only those families are planned and recomputed;
+    the stored values and fingerprints of the others are kept.
+
+    Returns ``(attributes, change_log)`` as from ``merge_incremental``;
+    ``attributes`` merges on ``tmk`` like the per-family frames in
+    02_build_mpat.ipynb.
+    """
+    state_dir = Path(state_dir)
+    ctx = with_nearest_read_extent(points_gdf, ctx)
+    fingerprints = family_fingerprints(inputs, ctx, families=families, hash_dir=state_dir)
+    state = load_build_state(state_dir)
+    plan = plan_incremental_build(points_gdf, fingerprints, state, tmk_field=tmk_field)
+
+    print(f"  {len(plan['new']):,} new, {len(plan['moved']):,} moved, {len(plan['removed']):,} removed points")
+    results = {}
+    tmk_values = points_gdf[tmk_field].to_numpy()
+    for family, todo in plan["recompute"].items():
+        if len(todo) == 0:
+            print(f"  {family}: up to date")
+            continue
+        if state is None:
+            why = "no previous build"
+        else:
+            why = "inputs changed" if family in plan["stale"] else "new/moved points"
+        print(f"  {family}: recomputing {len(todo):,} points ({why})")
+        subset = points_gdf[np.isin(tmk_values, todo)]
+        results[family] = compute_point_family(family, subset, inputs, ctx, tmk_field=tmk_field)
+
+    attributes, change_log = merge_incremental(plan, state, results, tmk_field=tmk_field)
+    if save:
+        # Families outside a subset build keep their stored fingerprints,
+        # unless points were added or moved: their carried values are then
+        # missing or stale for those TMKs, so the next build recomputes them.
+        carried = _carried_families(plan, state)
+        if carried and not (len(plan["new"]) or len(plan["moved"])):
+            fingerprints = {**{family: state["families"][family] for family in carried
+                               if family in state["families"]}, **fingerprints}
+        save_build_state(state_dir, fingerprints, plan["points"], attributes)
+    return attributes, change_log
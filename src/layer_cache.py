@@ -0,0 +1,242 @@
+"""
+src/layer_cache.py
+On-disk cache of validated prepared vector layers for the MPAT build (prepared GPKG > cached arrays).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import shapely
+
+try:
+    import geopandas as gpd
+except ImportError:
+    gpd = None
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+
+# Bump when the on-disk layout changes so old entries are rebuilt
+CACHE_VERSION = 3
+
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+# ---------------------------------------------------------------------------
+# Source fingerprints
+# ---------------------------------------------------------------------------
+
+def file_sha256(path: str | Path, *, chunk_size: int = HASH_CHUNK_BYTES) -> str:
+    """SHA-256 of a file's contents, streamed in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_hash(path: str | Path, cache_dir: str | Path) -> str:
+    """Content hash of a prepared file, memoised on (size, mtime).
+
+    The file is only re-read when its size or modification time differs
+    from the last recorded hash, so unchanged GPKGs cost a ``stat`` call.
+    """
+    path = Path(path).resolve()
+    memo_path = Path(cache_dir) / "source_hashes.json"
+    memo = json.loads(memo_path.read_text()) if memo_path.exists() else {}
+
+    st = path.stat()
+    entry = memo.get(str(path))
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = file_sha256(path)
+    memo[str(path)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+    memo_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename so an interrupted write never leaves truncated JSON
+    tmp_path = memo_path.with_name(f"{memo_path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(memo, indent=2))
+    os.replace(tmp_path, memo_path)
+    return digest
+
+
+def cache_key(
+    digest: str,
+    layer: str,
+    columns: list[str] | None,
+    lowercase: bool,
+    bbox: tuple[float, float, float, float] | None = None,
+) -> str:
+    """Cache key for one (file contents, layer, column subset, bbox) combination."""
+    bbox = None if bbox is None else [float(v) for v in bbox]
+    spec = json.dumps([CACHE_VERSION, digest, layer, columns, lowercase, bbox])
+    return hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+
+# ---------------------------------------------------------------------------
+# Read / write cache entries
+# ---------------------------------------------------------------------------
+
+def write_cache_entry(
+    gdf: Any,
+    entry_dir: str | Path,
+    *,
+    source: str | Path | None = None,
+    source_sha256: str | None = None,
+) -> None:
+    """Write a validated layer as a WKB array (.npy) and attributes (.pkl).
+
+    ``source``/``source_sha256`` record which file contents the entry was
+    built from, so entries for older contents can be evicted. The entry is
+    written to a temporary directory and moved into place, so an
+    interrupted write never leaves a half-written entry behind.
+    """
+    entry_dir = Path(entry_dir)
+    tmp_dir = entry_dir.with_name(entry_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    wkb = shapely.to_wkb(np.asarray(gdf.geometry.values, dtype=object))
+    np.save(tmp_dir / "geometry_wkb.npy", wkb, allow_pickle=True)
+    pd.DataFrame(gdf.drop(columns=gdf.geometry.name)).to_pickle(tmp_dir / "attributes.pkl")
+    (tmp_dir / "meta.json").write_text(json.dumps({
+        "version": CACHE_VERSION,
+        "source": None if source is None else str(Path(source).resolve()),
+        "source_sha256": source_sha256,
+        "crs": gdf.crs.to_wkt() if gdf.crs is not None else None,
+        "geometry_name": gdf.geometry.name,
+        "columns": list(gdf.columns),
+        "n_features": len(gdf),
+    }, indent=2))
+
+    if entry_dir.exists():
+        shutil.rmtree(entry_dir)
+    tmp_dir.rename(entry_dir)
+
+
+def read_cache_entry(entry_dir: str | Path) -> Any:
+    """Rebuild a GeoDataFrame from a cache entry (one vectorized WKB decode)."""
+    entry_dir = Path(entry_dir)
+    meta = json.loads((entry_dir / "meta.json").read_text())
+
+    wkb = np.load(entry_dir / "geometry_wkb.npy", allow_pickle=True)
+    attrs = pd.read_pickle(entry_dir / "attributes.pkl")
+
+    gdf = gpd.GeoDataFrame(
+        attrs,
+        geometry=gpd.GeoSeries(shapely.from_wkb(wkb), index=attrs.index, crs=meta["crs"]),
+    )
+    if meta["geometry_name"] != "geometry":
+        gdf = gdf.rename_geometry(meta["geometry_name"])
+    return gdf[meta["columns"]]
+
+
+def _drop_stale_entries(cache_dir: Path, prefix: str, source: str | Path, digest: str) -> None:
+    """Remove entries built from an older version of ``source``.
+
+    Entries for the same contents with another column subset or bbox are
+    kept, as are entries for other files that share the name prefix.
+    Entries from an older cache layout (no recorded source) are removed.
+    """
+    source = str(Path(source).resolve())
+    for old in cache_dir.glob(f"{prefix}.*"):
+        if not old.is_dir() or old.name.endswith(".tmp"):
+            continue
+        try:
+            meta = json.loads((old / "meta.json").read_text())
+        except (OSError, ValueError):
+            continue
+        if meta.get("source") is None or (meta["source"] == source and meta.get("source_sha256") != digest):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Cached prepared-layer reader
+# ---------------------------------------------------------------------------
+
+def source_columns(
+    path: str | Path,
+    layer: str,
+    columns: list[str] | None,
+    *,
+    lowercase: bool = False,
+) -> list[str] | None:
+    """Attribute fields to request from the file for a ``columns`` subset.
+
+    Matches case-insensitively when ``lowercase`` is set (the subset is
+    given in lowercase). Returns None (read everything) when the schema
+    cannot be inspected.
+    """
+    if columns is None or pyogrio is None:
+        return None
+    wanted = set(columns)
+    fields = pyogrio.read_info(path, layer=layer)["fields"]
+    return [f for f in fields if (f.lower() if lowercase else f) in wanted]
+
+
+def read_prepared_layer(
+    path: str | Path,
+    layer: str,
+    *,
+    columns: list[str] | None = None,
+    lowercase: bool = False,
+    bbox: tuple[float, float, float, float] | None = None,
+    cache_dir: str | Path | None = None,
+) -> Any:
+    """Read a prepared vector layer with valid geometries, cached on disk.
+
+    Equivalent to ``gpd.read_file(path, layer=layer)`` followed by optional
+    lowercasing of column names, a ``columns`` subset (include
+    ``"geometry"`` to keep it) and ``make_valid()``. The column subset and
+    ``bbox`` (layer CRS; features intersecting it are kept whole) are
+    pushed down to the reader, so only those fields and features are read.
+
+    With ``cache_dir`` the result is stored under a key derived from the
+    GPKG's content hash, layer, column subset and bbox. Later calls decode
+    the stored WKB array in one call and skip both the GPKG read and
+    geometry validation; any change to the GPKG changes its hash, so the
+    stale entry is rebuilt automatically and entries for the old contents
+    are removed. The spatial index is not stored: ``gdf.sindex``
+    bulk-loads from the cached geometries on first use.
+    """
+    if gpd is None:
+        raise ImportError("geopandas is required to read prepared layers.")
+
+    entry_dir = None
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        digest = source_hash(path, cache_dir)
+        key = cache_key(digest, layer, columns, lowercase, bbox)
+        prefix = f"{Path(path).stem}.{layer}"
+        entry_dir = cache_dir / f"{prefix}.{key}"
+        if (entry_dir / "meta.json").exists():
+            return read_cache_entry(entry_dir)
+
+    gdf = gpd.read_file(
+        path,
+        layer=layer,
+        bbox=bbox,
+        columns=source_columns(path, layer, columns, lowercase=lowercase),
+    )
+    if lowercase:
+        gdf = gdf.rename(columns=lambda col: col.lower())
+    if columns is not None:
+        gdf = gdf.loc[:, columns]
+    gdf = gdf.assign(**{gdf.geometry.name: gdf.geometry.make_valid()})
+
+    if entry_dir is not None:
+        write_cache_entry(gdf, entry_dir, source=path, source_sha256=digest)
+        _drop_stale_entries(cache_dir, prefix, path, digest)
+    return gdf
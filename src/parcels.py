@@ -0,0 +1,242 @@
+"""
+src/parcels.py
+Parcel loading and building-footprint aggregation for the MPAT build (parcels > analysis points).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from layer_cache import source_columns
+
+try:
+    import geopandas as gpd
+except ImportError:
+    gpd = None
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+
+SQM_TO_SQFT = 3.28084 ** 2
+
+PARCEL_CHUNK_FEATURES = 50_000
+
+
+# ---------------------------------------------------------------------------
+# Streaming parcel loader
+# ---------------------------------------------------------------------------
+
+def iter_layer_chunks(
+    path: str | Path,
+    layer: str,
+    *,
+    columns: list[str] | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+    chunk_size: int = PARCEL_CHUNK_FEATURES,
+) -> Iterable[Any]:
+    """Yield a vector layer as GeoDataFrames of at most ``chunk_size`` features.
+
+    ``columns`` are source field names. ``bbox`` is applied by the reader
+    before chunking, so chunks only hold features intersecting it. The
+    layer is read once, front to back, as Arrow record batches from a
+    single open reader (no re-scan of earlier rows per chunk).
+    """
+    if gpd is None or pyogrio is None:
+        raise ImportError("geopandas and pyogrio (with pyarrow) are required to stream vector layers.")
+    with pyogrio.open_arrow(
+        path,
+        layer=layer,
+        columns=columns,
+        bbox=bbox,
+        batch_size=chunk_size,
+        use_pyarrow=True,
+    ) as (meta, reader):
+        geometry_name = meta["geometry_name"] or "wkb_geometry"
+        for batch in reader:
+            if batch.num_rows == 0:
+                continue
+            attrs = batch.drop_columns([geometry_name]).to_pandas()
+            wkb = batch.column(geometry_name).to_numpy(zero_copy_only=False)
+            yield gpd.GeoDataFrame(
+                attrs,
+                geometry=gpd.GeoSeries(shapely.from_wkb(wkb), index=attrs.index, crs=meta["crs"]),
+            )
+
+
+def read_parcels(
+    path: str | Path,
+    layer: str,
+    tmks: Iterable[str],
+    *,
+    tmk_field: str = "tmk_txt",
+    bbox: tuple[float, float, float, float] | None = None,
+    chunk_size: int = PARCEL_CHUNK_FEATURES,
+    sqm_to_sqft: float = SQM_TO_SQFT,
+) -> Any:
+    """Read one valid polygon per TMK for a set of TMKs, streaming the parcel layer.
+
+    The layer is read ``chunk_size`` features at a time (only the TMK field
+    and geometry) and each chunk is filtered to ``tmks`` straight away, so
+    the full statewide layer is never held in memory. Only TMKs that have
+    more than one part are dissolved; single-part TMKs pass through as-is.
+
+    Returns a GeoDataFrame sorted by ``tmk`` with ``tmk``,
+    ``parcel_area_sqm``, ``parcel_area_sqft`` and ``geometry`` (the same
+    result as read > filter > ``make_valid()`` > ``dissolve(by="tmk")``).
+    ``tmk_field`` is matched case-insensitively against the source fields.
+    """
+    wanted = pd.Index(pd.unique(pd.Series(list(tmks), dtype="object").dropna()))
+    fields = source_columns(path, layer, [tmk_field], lowercase=True) or None
+
+    parts = []
+    crs = None
+    for chunk in iter_layer_chunks(path, layer, columns=fields, bbox=bbox, chunk_size=chunk_size):
+        crs = chunk.crs
+        chunk = chunk.rename(columns=lambda col: col.lower())
+        keep = chunk[tmk_field].isin(wanted)
+        if keep.any():
+            parts.append(
+                chunk.loc[keep, [tmk_field, "geometry"]].rename(columns={tmk_field: "tmk"})
+            )
+
+    if parts:
+        matched = pd.concat(parts, ignore_index=True)
+    else:
+        matched = gpd.GeoDataFrame({"tmk": pd.Series(dtype="object")}, geometry=[], crs=crs)
+
+    # Fix invalid geometries before the dissolve (GEOS unions fail on invalid input)
+    matched = matched.assign(geometry=lambda d: d.geometry.make_valid())
+
+    # Dissolve only TMKs split across several features
+    multi = matched["tmk"].duplicated(keep=False)
+    parcels_gdf = pd.concat(
+        [matched.loc[~multi], matched.loc[multi].dissolve(by="tmk", as_index=False)],
+        ignore_index=True,
+    )
+
+    return (
+        gpd.GeoDataFrame(parcels_gdf, geometry="geometry", crs=crs)
+        .assign(
+            parcel_area_sqm=lambda d: d.geometry.area,
+            parcel_area_sqft=lambda d: d.geometry.area * sqm_to_sqft,
+        )
+        .sort_values("tmk", kind="stable")
+        .reset_index(drop=True)
+        .loc[:, ["tmk", "parcel_area_sqm", "parcel_area_sqft", "geometry"]]
+    )
+
+
+# ---------------------------------------------------------------------------
+# Building-footprint aggregation and analysis points
+# ---------------------------------------------------------------------------
+
+FOOTPRINT_POINT_SOURCE = "building_fp_largest_centroid"
+PARCEL_POINT_SOURCE = "parcel_centroid"
+
+
+def summarize_footprints(tmk: np.ndarray, area: np.ndarray) -> dict[str, np.ndarray]:
+    """Per-TMK footprint statistics from one sort and one segment pass.
+
+    Footprints are sorted by (tmk, area descending), so each TMK is a
+    contiguous segment whose first row is its largest footprint (ties keep
+    the earlier footprint, like a stable sort + ``drop_duplicates``).
+
+    Returns arrays aligned with the sorted unique TMKs: ``tmk``, ``qty``,
+    ``total_area``, ``max_area``, ``min_area`` and ``largest_idx`` (the row
+    position of each TMK's largest footprint in the input). Footprints with
+    no TMK are left out.
+    """
+    codes, uniques = pd.factorize(pd.Series(tmk, dtype="object"), sort=True)
+    rows = np.flatnonzero(codes >= 0)
+    codes = codes[rows]
+    area = np.asarray(area, dtype="float64")[rows]
+    if area.size == 0:
+        empty = np.array([], dtype="float64")
+        return {
+            "tmk": np.array([], dtype="object"),
+            "qty": np.array([], dtype="int64"),
+            "total_area": empty,
+            "max_area": empty,
+            "min_area": empty,
+            "largest_idx": np.array([], dtype="int64"),
+        }
+
+    order = np.lexsort((-area, codes))
+    sorted_codes = codes[order]
+    sorted_area = area[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+    return {
+        "tmk": np.asarray(uniques, dtype="object"),
+        "qty": np.diff(np.r_[starts, order.size]),
+        "total_area": np.add.reduceat(sorted_area, starts),
+        "max_area": sorted_area[starts],
+        "min_area": np.minimum.reduceat(sorted_area, starts),
+        "largest_idx": rows[order[starts]],
+    }
+
+
+def build_analysis_points(
+    parcels_gdf: Any,
+    building_fps_gdf: Any,
+    *,
+    area_field: str = "building_fp_area_sqft",
+    tmk_field: str = "tmk",
+) -> Any:
+    """Footprint summary and analysis point for every parcel in one pass.
+
+    Returns a GeoDataFrame aligned with ``parcels_gdf`` (point geometry in
+    the parcels' CRS) with:
+      - ``building_fp_qty`` (Int64), ``building_fp_total_area_sqft``,
+        ``building_fp_largest_area_sqft``, ``building_fp_smallest_area_sqft``
+        and ``building_fp_multi_flag`` (NA/NaN where a parcel has no footprint)
+      - ``analysis_point_source``: ``building_fp_largest_centroid`` where the
+        parcel has a footprint, else ``parcel_centroid``
+      - ``geometry``: the centroid of the largest footprint, else the
+        parcel centroid
+
+    Centroids are only computed for the largest footprint of each parcel
+    and for parcels without footprints.
+    """
+    stats = summarize_footprints(
+        building_fps_gdf[tmk_field].to_numpy(dtype="object"),
+        building_fps_gdf[area_field].to_numpy(dtype="float64"),
+    )
+
+    parcel_tmk = parcels_gdf[tmk_field].to_numpy(dtype="object")
+    pos = pd.Index(stats["tmk"]).get_indexer(parcel_tmk)
+    has_fp = pos >= 0
+    fp = pos[has_fp]
+
+    def _per_parcel(values: np.ndarray) -> np.ndarray:
+        out = np.full(parcel_tmk.size, np.nan, dtype="float64")
+        out[has_fp] = values[fp]
+        return out
+
+    largest_geoms = building_fps_gdf.geometry.values[stats["largest_idx"][fp]]
+    points = np.empty(parcel_tmk.size, dtype=object)
+    points[has_fp] = np.asarray(largest_geoms.centroid, dtype=object)
+    points[~has_fp] = np.asarray(parcels_gdf.geometry.values[~has_fp].centroid, dtype=object)
+
+    qty = pd.array(_per_parcel(stats["qty"]), dtype="Int64")
+    return gpd.GeoDataFrame(
+        {
+            tmk_field: parcel_tmk,
+            "building_fp_qty": qty,
+            "building_fp_total_area_sqft": _per_parcel(stats["total_area"]),
+            "building_fp_largest_area_sqft": _per_parcel(stats["max_area"]),
+            "building_fp_smallest_area_sqft": _per_parcel(stats["min_area"]),
+            "building_fp_multi_flag": pd.array(qty > 1, dtype="Int64"),
+            "analysis_point_source": np.where(has_fp, FOOTPRINT_POINT_SOURCE, PARCEL_POINT_SOURCE),
+        },
+        geometry=gpd.GeoSeries(points, crs=parcels_gdf.crs),
+        crs=parcels_gdf.crs,
+    )
@@ -0,0 +1,455 @@
+"""
+src/point_attributes.py
+Attribute families sampled at the analysis points for the MPAT build (prepared inputs + analysis points > MPAT columns).
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from build_mpat import analysis_read_extent, extract_rast_stack, extract_rast_vals, extract_slope_vals, max_setback_ft
+from extents import ISLAND_EXTENTS_32604, buffer_bbox, island_of_points, statewide_extent
+from layer_cache import read_prepared_layer
+from spatial_index import dist_to_coast, dist_to_nearest, polygon_values_at_points
+from workers import ensure_importable
+
+
+# ---------------------------------------------------------------------------
+# Family builders (same steps as the 02_build_mpat.ipynb cells)
+# ---------------------------------------------------------------------------
+#
+# Each builder takes the analysis points to compute, the ``inputs`` path dict
+# from the notebook and a settings dict (``ctx``) with:
+#   thresholds_path, ft_to_m, unit_conversions, layer_cache_dir,
+#   coast_index_path, coast_spacing and optionally slope_raster,
+#   slope_method, slope_measurement, nearest_read_extent and nearest_max_ft
+# and returns one row per point it could compute (``tmk`` + family columns).
+#
+# ``nearest_read_extent`` is the bbox nearest-feature families (SMA, coast,
+# streams, wells) read instead of their own points + the largest setback:
+# the statewide extent in an incremental build, so computing only the new
+# points finds the same nearest features as computing all of them, and
+# adding points does not change the families' fingerprints.
+#
+# ``nearest_max_ft`` (opt-in, default None) caps those families' distances:
+# features are searched within that radius only and points with none get
+# the cap itself. Capped columns are only fit for setback screening at
+# thresholds up to the cap (criteria compare distances with ``>=`` / ``<``,
+# which treat the cap like any larger distance); the MPAT default is exact
+# distances.
+
+def _read_extent(points_gdf: Any, ctx: dict[str, Any]) -> Any:
+    return analysis_read_extent(points_gdf, ctx["thresholds_path"], ft_to_m=ctx["ft_to_m"])
+
+
+def _nearest_read_extent(points_gdf: Any, ctx: dict[str, Any]) -> Any:
+    if ctx.get("nearest_read_extent") is not None:
+        return tuple(ctx["nearest_read_extent"])
+    return _read_extent(points_gdf, ctx)
+
+
+def with_nearest_read_extent(points_gdf: Any, ctx: dict[str, Any]) -> dict[str, Any]:
+    """``ctx`` with ``nearest_read_extent`` set to the statewide extent plus the largest setback, unless already set.
+
+    The extent covers every island box (and any of ``points_gdf`` outside
+    them; see ``extents.statewide_extent``), so it stays the same as points
+    are added or moved on the islands.
+    """
+    if ctx.get("nearest_read_extent") is not None:
+        return ctx
+    buffer = max_setback_ft(ctx["thresholds_path"]) * ctx["ft_to_m"]
+    return {**ctx, "nearest_read_extent": [float(v) for v in statewide_extent(points_gdf, buffer=buffer)]}
+
+
+def _nearest_dist_ft(points_gdf: Any, features_gdf: Any, name: str, ctx: dict[str, Any]) -> np.ndarray:
+    cap = ctx.get("nearest_max_ft")
+    dist = dist_to_nearest(
+        points_gdf, features_gdf, name, ft_to_m=ctx["ft_to_m"], max_distance_ft=cap
+    )[f"dist_to_{name}_ft"].to_numpy()
+    return dist if cap is None else np.minimum(dist, cap)
+
+
+def _build_sma(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+    sma_gdf = read_prepared_layer(
+        inputs["sma"], "sma", columns=["geometry"],
+        bbox=_nearest_read_extent(points_gdf, ctx), cache_dir=ctx.get("layer_cache_dir"),
+    )
+    return pd.DataFrame({
+        "tmk": points_gdf["tmk"].to_numpy(),
+        "dist_to_sma_ft": _nearest_dist_ft(points_gdf, sma_gdf, "sma", ctx),
+    })
+
+
+def _build_flood(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+    flood_zones_gdf = read_prepared_layer(
+        inputs["flood_zones"], "flood_zones", columns=["sfha_tf", "geometry"],
+        bbox=_read_extent(points_gdf, ctx), cache_dir=ctx.get("layer_cache_dir"),
+    ).query("sfha_tf == 'T'")
+    return (
+        polygon_values_at_points(points_gdf, flood_zones_gdf, ["sfha_tf"], predicate="intersects")
+        .assign(sfha_tf=lambda d: d["sfha_tf"].fillna("F"))
+    )
+
+
+def _build_soils(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+    soils_gdf = read_prepared_layer(
+        inputs["soils"], "soils", columns=["ksat_h", "ksat_l", "ksat_r", "geometry"],
+        lowercase=True, bbox=_read_extent(points_gdf, ctx), cache_dir=ctx.get("layer_cache_dir"),
+    )
+    soils_gdf = soils_gdf.assign(**{
+        col: pd.to_numeric(soils_gdf[col], errors="coerce") for col in ("ksat_h", "ksat_l", "ksat_r")
+    })
+    return polygon_values_at_points(points_gdf, soils_gdf, ["ksat_h", "ksat_l", "ksat_r"], predicate="within")
+
+
+def _build_coast(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+    coastline_gdf = read_prepared_layer(
+        inputs["coastline"], "coastline", columns=["geometry"],
+        bbox=_nearest_read_extent(points_gdf, ctx), cache_dir=ctx.get("layer_cache_dir"),
+    ).assign(geometry=lambda d: d.geometry.boundary)
+    out = dist_to_coast(
+        points_gdf,
+        coastline_gdf,
+        spacing=ctx.get("coast_spacing", 25.0),
+        cache_path=ctx.get("coast_index_path"),
+        ft_to_m=ctx["ft_to_m"],
+    )[["tmk", "dist_to_coast_ft"]]
+    if ctx.get("nearest_max_ft") is not None:
+        out["dist_to_coast_ft"] = np.minimum(out["dist_to_coast_ft"].to_numpy(), ctx["nearest_max_ft"])
+    return out
+
+
+def _build_streams(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+    streams_gdf = read_prepared_layer(
+        inputs["streams"], "streams", columns=["geometry"],
+        bbox=_nearest_read_extent(points_gdf, ctx), cache_dir=ctx.get("layer_cache_dir"),
+    )
+    return pd.DataFrame({
+        "tmk": points_gdf["tmk"].to_numpy(),
+        "dist_to_streams_ft": _nearest_dist_ft(points_gdf, streams_gdf, "streams", ctx),
+    })
+
+
+def _build_wells(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+    bbox = _nearest_read_extent(points_gdf, ctx)
+    out = points_gdf[["tmk"]].reset_index(drop=True)
+    for key, name in (("wells_dom", "dom_well"), ("wells_mun", "mun_well")):
+        wells_gdf = read_prepared_layer(
+            inputs[key], key, columns=["geometry"], bbox=bbox, cache_dir=ctx.get("layer_cache_dir")
+        )
+        out[f"dist_to_{name}_ft"] = _nearest_dist_ft(points_gdf, wells_gdf, name, ctx)
+    return out
+
+
+def _raster_builder(key: str, col_name: str, source_units: str, output_units: str) -> Callable[..., pd.DataFrame]:
+    def build(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+        return extract_rast_stack(
+            {col_name: (inputs[key], source_units, output_units)},
+            points_gdf,
+            tmk_field="tmk",
+            unit_conversions=ctx.get("unit_conversions"),
+        )
+    return build
+
+
+def _build_slope(points_gdf: Any, inputs: dict[str, str], ctx: dict[str, Any]) -> pd.DataFrame:
+    # Sample a prepared slope raster when given, else compute slope at the points from the DEM
+    if ctx.get("slope_raster"):
+        return extract_rast_vals(
+            in_raster=str(ctx["slope_raster"]),
+            in_points=points_gdf,
+            col_name="slope_pct",
+            source_units="pct",
+            output_units="pct",
+        )
+    return extract_slope_vals(
+        inputs["dem"], points_gdf, "slope_pct",
+        method=ctx.get("slope_method", "GEODESIC"),
+        output_measurement=ctx.get("slope_measurement", "PERCENT_RISE"),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Family registry
+# ---------------------------------------------------------------------------
+
+# Family > the ``inputs`` keys it reads, the ``ctx`` settings that change its
+# values, the ``ctx`` keys naming other files it reads (``ctx_inputs``), the
+# MPAT columns it produces and its builder. Raster families also name the
+# ``(inputs key, source units, output units)`` they sample (``raster``), so
+# ``compute_point_attributes`` can sample them all in one pass.
+POINT_FAMILIES: dict[str, dict[str, Any]] = {
+    "sma": {
+        "inputs": ["sma"],
+        "settings": ["max_setback_ft", "ft_to_m", "nearest_read_extent", "nearest_max_ft"],
+        "columns": ["dist_to_sma_ft"],
+        "build": _build_sma,
+    },
+    "flood": {
+        "inputs": ["flood_zones"],
+        "settings": [],
+        "columns": ["sfha_tf"],
+        "build": _build_flood,
+    },
+    "soils": {
+        "inputs": ["soils"],
+        "settings": [],
+        "columns": ["ksat_h", "ksat_l", "ksat_r"],
+        "build": _build_soils,
+    },
+    "coast": {
+        "inputs": ["coastline"],
+        "settings": ["max_setback_ft", "ft_to_m", "nearest_read_extent", "nearest_max_ft", "coast_spacing"],
+        "columns": ["dist_to_coast_ft"],
+        "build": _build_coast,
+    },
+    "streams": {
+        "inputs": ["streams"],
+        "settings": ["max_setback_ft", "ft_to_m", "nearest_read_extent", "nearest_max_ft"],
+        "columns": ["dist_to_streams_ft"],
+        "build": _build_streams,
+    },
+    "wells": {
+        "inputs": ["wells_dom", "wells_mun"],
+        "settings": ["max_setback_ft", "ft_to_m", "nearest_read_extent", "nearest_max_ft"],
+        "columns": ["dist_to_dom_well_ft", "dist_to_mun_well_ft"],
+        "build": _build_wells,
+    },
+    "rainfall": {
+        "inputs": ["rainfall"],
+        "settings": [],
+        "columns": ["avg_rainfall_in"],
+        "raster": ("rainfall", "in", "in"),
+        "build": _raster_builder("rainfall", "avg_rainfall_in", "in", "in"),
+    },
+    "dem": {
+        "inputs": ["dem"],
+        "settings": ["unit_conversions"],
+        "columns": ["land_surface_elev_ft"],
+        "raster": ("dem", "m", "ft"),
+        "build": _raster_builder("dem", "land_surface_elev_ft", "m", "ft"),
+    },
+    "watertable": {
+        "inputs": ["watertable"],
+        "settings": ["unit_conversions"],
+        "columns": ["wt_elev_ft"],
+        "raster": ("watertable", "m", "ft"),
+        "build": _raster_builder("watertable", "wt_elev_ft", "m", "ft"),
+    },
+    "slope": {
+        "inputs": ["dem"],
+        "ctx_inputs": ["slope_raster"],
+        "settings": ["slope_method", "slope_measurement"],
+        "columns": ["slope_pct"],
+        "build": _build_slope,
+    },
+}
+
+
+def family_settings(ctx: dict[str, Any]) -> dict[str, Any]:
+    """JSON-serialisable values of every setting a family can depend on (see ``POINT_FAMILIES``)."""
+    conversions = ctx.get("unit_conversions") or {}
+    return {
+        "max_setback_ft": max_setback_ft(ctx["thresholds_path"]),
+        "ft_to_m": ctx["ft_to_m"],
+        "coast_spacing": ctx.get("coast_spacing", 25.0),
+        "unit_conversions": {f"{a}>{b}": v for (a, b), v in sorted(conversions.items())},
+        "nearest_read_extent": ctx.get("nearest_read_extent"),
+        "nearest_max_ft": ctx.get("nearest_max_ft"),
+        "slope_method": ctx.get("slope_method", "GEODESIC"),
+        "slope_measurement": ctx.get("slope_measurement", "PERCENT_RISE"),
+    }
+
+
+def point_attribute_columns(families: list[str] | None = None) -> list[str]:
+    """MPAT columns produced by ``families`` (default: all), in registry order."""
+    names = list(POINT_FAMILIES) if families is None else families
+    return [col for name in names for col in POINT_FAMILIES[name]["columns"]]
+
+
+def compute_point_family(
+    family: str,
+    points_gdf: Any,
+    inputs: dict[str, str],
+    ctx: dict[str, Any],
+    *,
+    tmk_field: str = "tmk",
+) -> pd.DataFrame:
+    """One family's columns for every point, aligned with ``points_gdf`` (NaN where not computed)."""
+    spec = POINT_FAMILIES[family]
+    tmks = points_gdf[tmk_field].to_numpy()
+    if len(points_gdf) == 0:
+        return pd.DataFrame({tmk_field: tmks, **{c: np.array([], dtype="float64") for c in spec["columns"]}})
+    result = spec["build"](points_gdf.rename(columns={tmk_field: "tmk"}), inputs, ctx)
+    return (
+        result.rename(columns={"tmk": tmk_field})
+        .drop_duplicates(subset=[tmk_field])
+        .set_index(tmk_field)
+        .reindex(tmks)
+        .loc[:, spec["columns"]]
+        .rename_axis(tmk_field)
+        .reset_index()
+    )
+
+
+def _raster_spec(family: str, inputs: dict[str, str], ctx: dict[str, Any]) -> tuple[str, str, str] | None:
+    """``(raster_path, source_units, output_units)`` a family samples, or None when it is not a raster lookup."""
+    spec = POINT_FAMILIES[family]
+    if "raster" in spec:
+        key, source_units, output_units = spec["raster"]
+        return inputs[key], source_units, output_units
+    if family == "slope" and ctx.get("slope_raster"):
+        return str(ctx["slope_raster"]), "pct", "pct"
+    return None
+
+
+def compute_point_attributes(
+    points_gdf: Any,
+    inputs: dict[str, str],
+    ctx: dict[str, Any],
+    *,
+    families: list[str] | None = None,
+    tmk_field: str = "tmk",
+) -> pd.DataFrame:
+    """All (or ``families``) point-attribute columns, one row per analysis point in input order.
+
+    Raster families (rainfall, DEM, water table, and slope when
+    ``slope_raster`` is set) are sampled together with one
+    ``extract_rast_stack`` call.
+    """
+    names = list(POINT_FAMILIES) if families is None else families
+    rasters = {}
+    for family in names:
+        spec = _raster_spec(family, inputs, ctx)
+        if spec is not None:
+            rasters[POINT_FAMILIES[family]["columns"][0]] = spec
+    stacked = None
+    if len(rasters) > 1 and len(points_gdf):
+        stacked = extract_rast_stack(
+            rasters, points_gdf, tmk_field=tmk_field, unit_conversions=ctx.get("unit_conversions")
+        )
+
+    out = points_gdf[[tmk_field]].reset_index(drop=True)
+    for family in names:
+        col = POINT_FAMILIES[family]["columns"][0]
+        if stacked is not None and col in rasters:
+            out[col] = stacked[col].to_numpy()
+            continue
+        values = compute_point_family(family, points_gdf, inputs, ctx, tmk_field=tmk_field)
+        for col in POINT_FAMILIES[family]["columns"]:
+            out[col] = values[col].to_numpy()
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Island-partitioned build
+# ---------------------------------------------------------------------------
+
+def partition_ctx(ctx: dict[str, Any], name: str, points_gdf: Any, *, by: str = "island") -> dict[str, Any]:
+    """Settings for one partition: its nearest-feature read extent and coastline index file.
+
+    Nearest-feature families read the partition's island box, buffered by
+    ``nearest_max_ft`` when a cap is set. Partitions that are not an island
+    (points outside every island box, or ``by`` another column) read
+    statewide (``extents.statewide_extent``), since their nearest features
+    can lie anywhere. Layer-cache entries are keyed by bbox, so partitions
+    share ``layer_cache_dir``; the coastline segment index is built from
+    each partition's own coastline and gets its own file.
+    """
+    out = dict(ctx)
+    extent = ISLAND_EXTENTS_32604.get(name) if by == "island" else None
+    if extent is None:
+        extent = statewide_extent(points_gdf)
+    radius = (ctx.get("nearest_max_ft") or 0.0) * ctx["ft_to_m"]
+    out["nearest_read_extent"] = [float(v) for v in buffer_bbox(extent, radius)]
+    if ctx.get("coast_index_path"):
+        path = Path(ctx["coast_index_path"])
+        out["coast_index_path"] = path.with_name(f"{path.stem}_{name}{path.suffix}")
+    return out
+
+
+def _run_partition(
+    name: str,
+    points_gdf: Any,
+    inputs: dict[str, str],
+    ctx: dict[str, Any],
+    families: list[str] | None,
+    tmk_field: str,
+    by: str,
+) -> pd.DataFrame:
+    print(f"{name}: {len(points_gdf):,} points")
+    return compute_point_attributes(
+        points_gdf, inputs, partition_ctx(ctx, name, points_gdf, by=by), families=families, tmk_field=tmk_field
+    )
+
+
+def compute_point_attributes_partitioned(
+    points_gdf: Any,
+    inputs: dict[str, str],
+    ctx: dict[str, Any],
+    *,
+    by: str = "island",
+    families: list[str] | None = None,
+    tmk_field: str = "tmk",
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """``compute_point_attributes`` run per ``by`` partition (island) in parallel processes.
+
+    With ``by="island"`` and no ``island`` column, each point's island is
+    taken from ``extents.ISLAND_EXTENTS_32604`` (points outside every
+    island box form an "unassigned" partition).
+
+    Every partition reads only its own island: point-in-polygon families
+    (flood zones, soils) read the partition's points plus the largest
+    setback, rasters are sampled only at the partition's blocks, and
+    nearest-feature families (SMA, coast, streams, wells) read the island
+    box (see ``partition_ctx``; the "unassigned" partition reads statewide).
+    Distances are exact to the nearest feature on the point's island;
+    points whose island has no such feature get NaN.
+    Set ``nearest_max_ft`` in ``ctx`` to opt into capped distances (read
+    extent buffered by the cap, distances capped at it). Partitions are
+    submitted largest first and results are concatenated back into
+    ``points_gdf`` order. ``max_workers=1`` runs in-process.
+    """
+    if by in points_gdf.columns:
+        labels = points_gdf[by].astype("object").to_numpy()
+    elif by == "island":
+        labels = island_of_points(points_gdf)
+    else:
+        raise KeyError(f"Analysis points have no '{by}' column to partition by")
+    labels = pd.Series(labels, dtype="object").fillna("unassigned").to_numpy()
+    names = pd.Series(labels).value_counts().index.tolist()
+    parts = {name: points_gdf[labels == name] for name in names}
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(names)) or 1
+    results = []
+    if max_workers == 1:
+        for name in names:
+            results.append(_run_partition(name, parts[name], inputs, ctx, families, tmk_field, by))
+    else:
+        ensure_importable()
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_run_partition, name, parts[name], inputs, ctx, families, tmk_field, by)
+                for name in names
+            ]
+            for fut in as_completed(futures):
+                results.append(fut.result())
+
+    columns = [tmk_field] + point_attribute_columns(families)
+    if not results:
+        return pd.DataFrame(columns=columns)
+    return (
+        pd.concat(results, ignore_index=True)
+        .set_index(tmk_field)
+        .reindex(points_gdf[tmk_field].to_numpy())
+        .rename_axis(tmk_field)
+        .reset_index()
+        .loc[:, columns]
+    )
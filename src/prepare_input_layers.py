@@ -6,10 +6,23 @@ Preparation helper functions for MPAT input layers (source inputs > prepared inp
 from __future__ import annotations
 
 import datetime as _dt
+import hashlib
+import importlib
+import json
+import os
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 from typing import Any
 
+from raster_sampling import LAYOUT_COMPRESSION, SAMPLING_BLOCK_SIZE, cog_creation_options, ensure_sampling_layout, gdal_num_threads
+from workers import ensure_importable
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
 
 # ---------------------------------------------------------------------------
 # Logging
@@ -36,6 +49,7 @@ def fmt_elapsed(seconds: float) -> str:
 # Path helpers
 # ---------------------------------------------------------------------------
 
+# Prepared outputs that are rasters (see ``migrate_nested_raster``)
 RASTER_KEYS = {"dem", "watertable", "rainfall", "slope"}
 
 
@@ -48,11 +62,15 @@ def ensure_dir(p: str | Path) -> None:
 
 
 def raster_subfolder_path(prepared_tif_path: str) -> str:
-    """Resolve the .tif path inside its named subfolder.
+    """Resolve the .tif path inside a subfolder named after it.
 
     Example:
       prepared/dem_hi_pacioos_mosaic_32604.tif
       -> prepared/dem_hi_pacioos_mosaic_32604/dem_hi_pacioos_mosaic_32604.tif
+
+    Prepared raster paths already include that subfolder, so for them this
+    gives the doubly nested path older runs wrote to (see
+    ``migrate_nested_raster``).
     """
     p = Path(prepared_tif_path)
     folder = p.with_suffix("")
@@ -66,17 +84,60 @@ def raster_outpath_in_subfolder(prepared_folder: str | Path, raster_name: str) -
 
 
 def prepared_exists(key: str, path: str) -> bool:
-    """Check if a prepared output exists (accounts for raster subfolder layout)."""
-    if key in RASTER_KEYS:
-        return Path(raster_subfolder_path(path)).exists()
+    """Check if a prepared output exists.
+
+    Raster paths already point inside their named subfolder (see
+    ``raster_outpath_in_subfolder``), so every key is checked as given;
+    rasters still in the older doubly nested layout are moved into place
+    first by ``migrate_nested_raster``.
+    """
     return Path(path).exists()
 
 
+def migrate_nested_raster(key: str, path: str) -> bool:
+    """Move a prepared raster from the older doubly nested layout to ``path``.
+
+    Earlier runs wrote rasters one folder too deep, e.g.
+      prepared/dem_32604/dem_32604/dem_32604.tif
+    (see the logged output in 01_prepare_input_layers.ipynb). When ``path``
+    is missing and that copy exists, the .tif and its sidecars (.ovr,
+    .aux.xml, .tfw) are moved up next to ``path`` and the emptied folder is
+    removed. Moved rasters have no manifest yet, so they are rebuilt once
+    (``prepared_status`` reports ``no manifest`` rather than ``missing``).
+    Returns True when a raster was moved.
+    """
+    if key not in RASTER_KEYS or Path(path).exists():
+        return False
+    nested = Path(raster_subfolder_path(path))
+    if not nested.exists():
+        return False
+    for f in sorted(nested.parent.glob(f"{nested.stem}.*")):
+        if f.is_file():
+            os.replace(f, Path(path).parent / f.name)
+    try:
+        nested.parent.rmdir()
+    except OSError:
+        pass  # other files left behind; keep the folder
+    log_step(f"{key}: moved {nested} -> {path} (older nested layout)")
+    return True
+
+
 # ---------------------------------------------------------------------------
 # ArcPy helpers
 # ---------------------------------------------------------------------------
+#
+# The prep functions below take the geoprocessing backend as ``arcpy``:
+# either ArcPy itself or the ``gdal_backend`` module, which implements the
+# same functions with GDAL/OGR (runs on Linux, no ArcGIS licence).
+
+def is_gdal_backend(arcpy: Any) -> bool:
+    """True when ``arcpy`` is the GDAL/OGR backend module (``gdal_backend``) rather than ArcPy."""
+    return getattr(arcpy, "BACKEND", None) == "gdal"
+
 
 def epsg_of_dataset(dataset: str, *, arcpy: Any) -> int | None:
+    if is_gdal_backend(arcpy):
+        return arcpy.epsg_of_dataset(dataset)
     sr = arcpy.Describe(dataset).spatialReference
     if sr is None:
         return None
@@ -99,7 +160,11 @@ def ensure_scratch_gdb(
     arcpy: Any,
     name: str = "scratch_vectors.gdb",
 ) -> str:
-    """Create a scratch FileGDB for temp vector outputs."""
+    """Create a scratch FileGDB for temp vector outputs.
+
+    Jobs that run concurrently must pass their own ``name``: FileGDBs do not
+    support writes from several processes at once.
+    """
     temp_dir = Path(temp_dir)
     ensure_dir(temp_dir)
     gdb_path = str(temp_dir / name)
@@ -178,6 +243,11 @@ def prep_vector_to_gpkg(
     arcpy: Any,
     overwrite: bool = True,
 ) -> str:
+    if is_gdal_backend(arcpy):
+        return arcpy.prep_vector_to_gpkg(
+            src_fc=src_fc, out_gpkg=out_gpkg, out_layer=out_layer,
+            target_epsg=target_epsg, temp_dir=temp_dir, overwrite=overwrite,
+        )
     arcpy.env.overwriteOutput = overwrite
     ensure_dir(Path(out_gpkg).parent)
 
@@ -189,7 +259,8 @@ def prep_vector_to_gpkg(
         raise ValueError(f"Vector has no readable CRS: {src_fc}")
 
     if src_epsg != target_epsg:
-        scratch_gdb = ensure_scratch_gdb(temp_dir, arcpy=arcpy)
+        # One scratch GDB per layer, so parallel vector jobs never share one
+        scratch_gdb = ensure_scratch_gdb(temp_dir, arcpy=arcpy, name=f"scratch_{out_layer}.gdb")
         tmp_fc = str(Path(scratch_gdb) / f"{out_layer}_tmp_{target_epsg}")
         if overwrite and arcpy.Exists(tmp_fc):
             arcpy.management.Delete(tmp_fc)
@@ -226,6 +297,10 @@ def define_projection_if_missing(
     arcpy: Any,
     overwrite: bool = True,
 ) -> str:
+    if is_gdal_backend(arcpy):
+        return arcpy.define_projection_if_missing(
+            raster_path=raster_path, assumed_epsg=assumed_epsg, temp_dir=temp_dir, overwrite=overwrite,
+        )
     arcpy.env.overwriteOutput = overwrite
     ensure_dir(temp_dir)
     if epsg_of_dataset(raster_path, arcpy=arcpy) is not None:
@@ -238,6 +313,16 @@ def define_projection_if_missing(
     return tmp
 
 
+def arcpy_raster_env(resampling: str = "BILINEAR") -> dict[str, str]:
+    """ArcPy environment for prepared rasters: tiled, LZ77 (deflate) compressed, with pyramids."""
+    pyramid_resampling = "NEAREST" if resampling.upper() in ("NEAREST", "MAJORITY") else "BILINEAR"
+    return {
+        "tileSize": f"{SAMPLING_BLOCK_SIZE} {SAMPLING_BLOCK_SIZE}",
+        "compression": "LZ77",
+        "pyramid": f"PYRAMIDS -1 {pyramid_resampling} LZ77 75 NO_SKIP",
+    }
+
+
 def prep_raster_to_target(
     *,
     src_raster: str,
@@ -249,9 +334,15 @@ def prep_raster_to_target(
     assume_src_epsg_if_missing: int | None = None,
     overwrite: bool = True,
 ) -> str:
+    if is_gdal_backend(arcpy):
+        return arcpy.prep_raster_to_target(
+            src_raster=src_raster, prepared_tif=prepared_tif, target_epsg=target_epsg,
+            temp_dir=temp_dir, resampling=resampling,
+            assume_src_epsg_if_missing=assume_src_epsg_if_missing, overwrite=overwrite,
+        )
     arcpy.env.overwriteOutput = overwrite
     ensure_dir(temp_dir)
-    out_raster = raster_outpath_in_subfolder(prepared_tif)
+    out_raster = raster_outpath_in_subfolder(Path(prepared_tif).parent, Path(prepared_tif).stem)
 
     raster_for_projection = src_raster
     if assume_src_epsg_if_missing is not None:
@@ -267,15 +358,19 @@ def prep_raster_to_target(
     if src_epsg is None:
         raise ValueError(f"Raster has no readable CRS: {src_raster}")
 
-    if src_epsg != target_epsg:
-        arcpy.management.ProjectRaster(
-            in_raster=raster_for_projection,
-            out_raster=out_raster,
-            out_coor_system=arcpy.SpatialReference(target_epsg),
-            resampling_type=resampling,
-        )
-    else:
-        arcpy.management.CopyRaster(raster_for_projection, out_raster)
+    with arcpy.EnvManager(**arcpy_raster_env(resampling)):
+        if src_epsg != target_epsg:
+            arcpy.management.ProjectRaster(
+                in_raster=raster_for_projection,
+                out_raster=out_raster,
+                out_coor_system=arcpy.SpatialReference(target_epsg),
+                resampling_type=resampling,
+            )
+        else:
+            arcpy.management.CopyRaster(raster_for_projection, out_raster)
+    if gdal is not None:
+        # Rewrites the raster only if ArcPy did not honour the tiling/compression
+        ensure_sampling_layout(out_raster, resampling=OVERVIEW_RESAMPLING[resampling.upper()])
     return out_raster
 
 
@@ -290,6 +385,8 @@ def mosaic_dir_to_raster(
     arcpy: Any,
     overwrite: bool = True,
 ) -> str:
+    if is_gdal_backend(arcpy):
+        return arcpy.mosaic_dir_to_raster(raster_dir=raster_dir, out_mosaic=out_mosaic, overwrite=overwrite)
     arcpy.env.overwriteOutput = overwrite
     tif_paths = sorted([str(p) for p in Path(raster_dir).glob("*.tif")])
     if not tif_paths:
@@ -314,10 +411,615 @@ def mosaic_dir_to_raster(
     return out_mosaic
 
 
+# ---------------------------------------------------------------------------
+# Virtual mosaics (GDAL)
+# ---------------------------------------------------------------------------
+
+# ArcPy resampling keywords > GDAL warp resampling names
+GDAL_RESAMPLING = {
+    "NEAREST": "near",
+    "BILINEAR": "bilinear",
+    "CUBIC": "cubic",
+    "MAJORITY": "mode",
+}
+
+# ArcPy resampling keywords > overview resampling for the prepared raster
+OVERVIEW_RESAMPLING = {
+    "NEAREST": "NEAREST",
+    "BILINEAR": "AVERAGE",
+    "CUBIC": "AVERAGE",
+    "MAJORITY": "MODE",
+}
+
+# Layout every prepared raster is written in (recorded in its manifest)
+PREPARED_RASTER_LAYOUT = f"tiled {SAMPLING_BLOCK_SIZE}px {LAYOUT_COMPRESSION} + overviews"
+
+
+def build_vrt_mosaic(
+    *,
+    raster_dir: str,
+    out_vrt: str,
+    overwrite: bool = True,
+) -> str:
+    """Virtual mosaic (.vrt) over every .tif in a folder; no pixels are copied.
+
+    Matches ``mosaic_dir_to_raster`` (MosaicToNewRaster, ``FIRST``): where
+    tiles overlap, the first tile in name order wins. A VRT draws later
+    sources on top, so the tiles are listed in reverse.
+    """
+    if gdal is None:
+        raise ImportError("GDAL (osgeo) is required to build a virtual mosaic.")
+    tif_paths = sorted([str(p) for p in Path(raster_dir).glob("*.tif")])
+    if not tif_paths:
+        raise FileNotFoundError(f"No .tif rasters found in: {raster_dir}")
+
+    ensure_dir(Path(out_vrt).parent)
+    if overwrite and Path(out_vrt).exists():
+        Path(out_vrt).unlink()
+
+    vrt = gdal.BuildVRT(str(out_vrt), tif_paths[::-1])
+    if vrt is None:
+        raise RuntimeError(f"Could not build virtual mosaic: {out_vrt}")
+    vrt = None  # flush to disk
+    return str(out_vrt)
+
+
+def warp_to_target(
+    *,
+    src_raster: str,
+    prepared_tif: str,
+    target_epsg: int,
+    resampling: str = "BILINEAR",
+    assume_src_epsg_if_missing: int | None = None,
+    output_type: str = "Float32",
+    warp_memory_mb: int = 512,
+    overwrite: bool = True,
+) -> str:
+    """Reproject a raster or virtual mosaic into the prepared raster in one warp.
+
+    GDAL's warper reads the source tiles under each output chunk (bounded by
+    ``warp_memory_mb``) and writes the chunk straight into the prepared
+    GeoTIFF, using every core (``gdal_num_threads``). A missing source CRS
+    is assumed on the fly (``assume_src_epsg_if_missing``) instead of
+    copying the raster to define it, so a VRT mosaic is never materialised
+    on disk.
+    """
+    if gdal is None:
+        raise ImportError("GDAL (osgeo) is required to warp rasters.")
+    out_raster = raster_outpath_in_subfolder(Path(prepared_tif).parent, Path(prepared_tif).stem)
+
+    src = gdal.Open(str(src_raster))
+    if src is None:
+        raise FileNotFoundError(f"Could not open raster: {src_raster}")
+    src_srs = None
+    if src.GetSpatialRef() is None:
+        if assume_src_epsg_if_missing is None:
+            raise ValueError(f"Raster has no readable CRS: {src_raster}")
+        src_srs = f"EPSG:{assume_src_epsg_if_missing}"
+
+    if overwrite and Path(out_raster).exists():
+        Path(out_raster).unlink()
+
+    options = gdal.WarpOptions(
+        format="COG",
+        srcSRS=src_srs,
+        dstSRS=f"EPSG:{target_epsg}",
+        resampleAlg=GDAL_RESAMPLING[resampling.upper()],
+        outputType=gdal.GetDataTypeByName(output_type),
+        multithread=True,
+        warpMemoryLimit=warp_memory_mb,
+        warpOptions=[f"NUM_THREADS={gdal_num_threads()}"],
+        creationOptions=cog_creation_options(OVERVIEW_RESAMPLING[resampling.upper()]),
+    )
+    out = gdal.Warp(out_raster, src, options=options)
+    if out is None:
+        raise RuntimeError(f"Warp failed: {src_raster} -> {out_raster}")
+    out = None
+    src = None
+    return ensure_sampling_layout(out_raster, resampling=OVERVIEW_RESAMPLING[resampling.upper()])
+
+
+# ---------------------------------------------------------------------------
+# Job graph scheduler
+# ---------------------------------------------------------------------------
+#
+# A job is a dict:
+#   func        name of a function in this module (called with ``arcpy=``)
+#   kwargs      keyword arguments
+#   input_from  {kwarg: job name}, filled with that job's return value
+#   after       job names that must finish first (ordering only)
+#   label       short name for log lines
+#   backend     False for jobs that do not take ``arcpy=`` (GDAL-only helpers)
+# Jobs without a path between them run concurrently.
+
+def job_dependencies(jobs: dict[str, dict[str, Any]]) -> dict[str, set[str]]:
+    """Upstream job names of every job (from its ``input_from`` and ``after``)."""
+    deps = {
+        name: set(job.get("input_from", {}).values()) | set(job.get("after", []))
+        for name, job in jobs.items()
+    }
+    for name, upstream in deps.items():
+        unknown = upstream - set(jobs)
+        if unknown:
+            raise KeyError(f"Job '{name}' depends on unknown job(s): {sorted(unknown)}")
+    return deps
+
+
+def job_levels(jobs: dict[str, dict[str, Any]]) -> list[list[str]]:
+    """Jobs grouped by depth: every job's dependencies are in earlier levels."""
+    deps = job_dependencies(jobs)
+    levels = []
+    done: set[str] = set()
+    remaining = list(jobs)
+    while remaining:
+        ready = [name for name in remaining if deps[name] <= done]
+        if not ready:
+            raise ValueError(f"Job graph has a cycle among: {remaining}")
+        levels.append(ready)
+        done |= set(ready)
+        remaining = [name for name in remaining if name not in done]
+    return levels
+
+
+def print_job_plan(jobs: dict[str, dict[str, Any]]) -> None:
+    """Print the job graph level by level (what a run would do, without running it)."""
+    deps = job_dependencies(jobs)
+    for i, level in enumerate(job_levels(jobs)):
+        print(f"Stage {i + 1} ({len(level)} job(s) in parallel):")
+        for name in level:
+            job = jobs[name]
+            after = f"  [after {', '.join(sorted(deps[name]))}]" if deps[name] else ""
+            print(f"  - {name}: {job['func']}(){after}")
+
+
+def _call_job(func_name: str, kwargs: dict[str, Any], backend: Any) -> Any:
+    if backend is None:
+        return globals()[func_name](**kwargs)
+    return globals()[func_name](**kwargs, arcpy=backend)
+
+
+def _run_job(func_name: str, kwargs: dict[str, Any], backend_name: str | None) -> tuple[Any, float]:
+    """Worker entry point: import the backend and run one job."""
+    backend = None if backend_name is None else importlib.import_module(backend_name)
+    t0 = time.time()
+    result = _call_job(func_name, kwargs, backend)
+    return result, time.time() - t0
+
+
+def threads_per_job(max_workers: int | None) -> int:
+    """GDAL threads for each of ``max_workers`` concurrent jobs (the cores split evenly)."""
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // (max_workers or cpus))
+
+
+def _init_worker(num_threads: int) -> None:
+    """Worker initializer: cap GDAL's threads unless the user already set ``GDAL_NUM_THREADS``."""
+    os.environ.setdefault("GDAL_NUM_THREADS", str(num_threads))
+
+
+def _job_kwargs(job: dict[str, Any], results: dict[str, Any]) -> dict[str, Any]:
+    return {
+        **job.get("kwargs", {}),
+        **{kwarg: results[upstream] for kwarg, upstream in job.get("input_from", {}).items()},
+    }
+
+
+def run_jobs(
+    jobs: dict[str, dict[str, Any]],
+    *,
+    arcpy: Any,
+    max_workers: int | None = None,
+) -> dict[str, Any]:
+    """Run a job graph, each job as soon as its dependencies finish.
+
+    Up to ``max_workers`` jobs run at once in worker processes (each worker
+    imports the backend module ``arcpy`` was loaded from);
+    ``max_workers=1`` runs everything in this process in dependency order.
+    Each worker caps GDAL at ``threads_per_job(max_workers)`` threads, so
+    parallel warps and COG writes do not oversubscribe the cores.
+    Every job is timed with ``log_step``/``fmt_elapsed``. If a job fails,
+    no new jobs start, running jobs finish, and the error is re-raised.
+    Returns each job's return value by name.
+    """
+    deps = job_dependencies(jobs)
+    levels = job_levels(jobs)
+    results: dict[str, Any] = {}
+
+    if max_workers == 1:
+        for name in (n for level in levels for n in level):
+            job = jobs[name]
+            log_step(f"{job['label']}: starting {job['func']}")
+            t0 = time.time()
+            backend = arcpy if job.get("backend", True) else None
+            results[name] = _call_job(job["func"], _job_kwargs(job, results), backend)
+            log_step(f"{job['label']}: {job['func']} complete ({fmt_elapsed(time.time() - t0)})")
+        return results
+
+    ensure_importable()
+    import prepare_input_layers as module  # resolvable by name in worker processes
+
+    backend_name = arcpy.__name__
+    pending = dict(jobs)
+    running = {}
+    error = None
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=module._init_worker,
+        initargs=(threads_per_job(max_workers),),
+    ) as pool:
+        while pending or running:
+            if error is None:
+                ready = [name for name in pending if deps[name] <= set(results)]
+                for name in ready:
+                    job = pending.pop(name)
+                    log_step(f"{job['label']}: starting {job['func']}")
+                    fut = pool.submit(
+                        module._run_job,
+                        job["func"],
+                        _job_kwargs(job, results),
+                        backend_name if job.get("backend", True) else None,
+                    )
+                    running[fut] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                job = jobs[name]
+                try:
+                    results[name], elapsed = fut.result()
+                except Exception as e:
+                    log_step(f"{job['label']}: {job['func']} FAILED: {e}")
+                    error = error or e
+                    continue
+                log_step(f"{job['label']}: {job['func']} complete ({fmt_elapsed(elapsed)})")
+
+    if error is not None:
+        raise error
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Prepared-output manifests
+# ---------------------------------------------------------------------------
+#
+# Each prepared output gets a ``<output>.manifest.json`` recording the recipe
+# that built it (target EPSG, resampling, ...) and the size, mtime and
+# SHA-256 of every source file. An output is rebuilt only when it is
+# missing, has no manifest, or its recipe or source files changed.
+
+# Bump when the manifest layout changes so every output is rebuilt once
+MANIFEST_VERSION = 1
+
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+# Sidecars GDAL writes next to a raster when it is opened or overviews are
+# built; they do not change the pixels, so they are not source files
+DERIVED_SIDECAR_SUFFIXES = (".aux.xml", ".ovr")
+
+
+def manifest_path(output: str | Path) -> Path:
+    return Path(f"{output}.manifest.json")
+
+
+def _file_sha256(path: Path) -> str:
+    # Same as layer_cache.file_sha256; not imported so this module keeps
+    # running in the ArcGIS Pro environment (no shapely)
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_files(source: str | Path) -> list[Path]:
+    """Files a source input is read from.
+
+    A folder of tiles is its ``*.tif`` files (as ``mosaic_dir_to_raster``
+    reads them); a file is every sibling sharing its stem (.shp/.dbf/.shx/
+    .prj, .tif/.tfw, ...) except GDAL's own ``.aux.xml``/``.ovr`` sidecars;
+    a layer inside a FileGDB or GPKG is every file of its container.
+    """
+    source = Path(source)
+    if source.is_dir():
+        if source.suffix.lower() == ".gdb":
+            return sorted(p for p in source.rglob("*") if p.is_file())
+        return sorted(source.glob("*.tif"))
+    if not source.exists() and source.parent.exists():
+        return source_files(source.parent)
+    return sorted(
+        p for p in source.parent.glob(f"{source.stem}.*")
+        if p.is_file() and not p.name.lower().endswith(DERIVED_SIDECAR_SUFFIXES)
+    )
+
+
+def source_fingerprints(
+    source: str | Path,
+    previous: list[dict[str, Any]] | None = None,
+) -> list[dict[str, Any]]:
+    """``path``, ``size``, ``mtime_ns`` and ``sha256`` of every file of ``source``.
+
+    Hashes from ``previous`` are reused for files whose size and mtime are
+    unchanged, so only new or touched files are read.
+    """
+    known = {e["path"]: e for e in previous or []}
+    out = []
+    for path in source_files(source):
+        st = path.stat()
+        entry = known.get(str(path))
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            sha = entry["sha256"]
+        else:
+            sha = _file_sha256(path)
+        out.append({"path": str(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha})
+    return out
+
+
+def output_recipe(
+    key: str,
+    *,
+    source_inputs: dict[str, str],
+    target_epsg: int,
+    engine: str,
+    virtual_mosaic: bool = False,
+) -> dict[str, Any]:
+    """Source and parameters that determine the prepared output for ``key``."""
+    if key in MOSAIC_RASTERS:
+        src_key, resampling, assumed_epsg = MOSAIC_RASTERS[key]
+        return {
+            "source": str(Path(source_inputs[src_key]).resolve()),
+            "target_epsg": target_epsg,
+            "resampling": resampling,
+            "assume_src_epsg_if_missing": assumed_epsg,
+            "engine": "gdal_vrt" if virtual_mosaic else engine,
+            "layout": PREPARED_RASTER_LAYOUT,
+        }
+    if key in SINGLE_RASTERS:
+        return {
+            "source": str(Path(source_inputs[key]).resolve()),
+            "target_epsg": target_epsg,
+            "resampling": SINGLE_RASTERS[key],
+            "engine": engine,
+            "layout": PREPARED_RASTER_LAYOUT,
+        }
+    if key in VECTOR_LAYERS:
+        return {
+            "source": str(Path(source_inputs[key]).resolve()),
+            "target_epsg": target_epsg,
+            "out_layer": VECTOR_LAYERS[key],
+            "engine": engine,
+        }
+    raise KeyError(f"No preparation recipe for '{key}'")
+
+
+def read_manifest(output: str | Path) -> dict[str, Any] | None:
+    path = manifest_path(output)
+    if not path.exists():
+        return None
+    manifest = json.loads(path.read_text())
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def _save_manifest(output: str | Path, manifest: dict[str, Any]) -> str:
+    # Write-then-rename so an interrupted write never leaves truncated JSON
+    path = manifest_path(output)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+    return str(path)
+
+
+def write_manifest(*, output: str, recipe: dict[str, Any]) -> str:
+    """Fingerprint the recipe's source files and record them next to ``output``.
+
+    Runs as the last job of each output's chain, so a failed build leaves
+    no manifest and is retried on the next run.
+    """
+    previous = read_manifest(output)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "built": _dt.datetime.now(_dt.timezone.utc).isoformat(timespec="seconds"),
+        "recipe": recipe,
+        "sources": source_fingerprints(recipe["source"], previous["sources"] if previous else None),
+    }
+    return _save_manifest(output, manifest)
+
+
+def prepared_status(key: str, output: str, recipe: dict[str, Any]) -> str:
+    """Why ``output`` needs rebuilding, or ``"fresh"`` when it does not.
+
+    One of ``missing``, ``no manifest``, ``recipe changed``,
+    ``inputs changed`` or ``fresh``. Source files are compared by size and
+    mtime first; a touched file only counts as changed when its content
+    hash differs. When only mtimes moved, the manifest is updated with them
+    so those files are not hashed again on the next run.
+    """
+    migrate_nested_raster(key, output)
+    if not prepared_exists(key, output):
+        return "missing"
+    manifest = read_manifest(output)
+    if manifest is None:
+        return "no manifest"
+    if manifest["recipe"] != recipe:
+        return "recipe changed"
+    recorded = {e["path"]: e for e in manifest["sources"]}
+    current = source_files(recipe["source"])
+    if {str(p) for p in current} != set(recorded):
+        return "inputs changed"
+    touched = False
+    for path in current:
+        st = path.stat()
+        entry = recorded[str(path)]
+        if entry["size"] != st.st_size:
+            return "inputs changed"
+        if entry["mtime_ns"] != st.st_mtime_ns:
+            if entry["sha256"] != _file_sha256(path):
+                return "inputs changed"
+            entry["mtime_ns"] = st.st_mtime_ns
+            touched = True
+    if touched:
+        _save_manifest(output, manifest)
+    return "fresh"
+
+
+def manifest_jobs(
+    recipes: dict[str, dict[str, Any]],
+    prepared_outputs: dict[str, str],
+) -> dict[str, dict[str, Any]]:
+    """One ``write_manifest`` job per output in ``recipes``, after the job that writes it."""
+    return {
+        f"{key}_manifest": {
+            "func": "write_manifest",
+            "kwargs": {"output": prepared_outputs[key], "recipe": recipe},
+            "after": [key],
+            "label": key,
+            "backend": False,
+        }
+        for key, recipe in recipes.items()
+    }
+
+
 # ---------------------------------------------------------------------------
 # Main preprocessing pipeline
 # ---------------------------------------------------------------------------
 
+# Multi-tile rasters: key > (source dir key, resampling, EPSG assumed when the mosaic has none)
+MOSAIC_RASTERS = {
+    "dem":        ("dem_dir", "BILINEAR", 4326),
+    "watertable": ("watertable_dir", "NEAREST", None),
+    "slope":      ("slope_dir", "BILINEAR", 4326),
+}
+
+# Single rasters: key > resampling
+SINGLE_RASTERS = {
+    "rainfall": "BILINEAR",
+}
+
+# Vectors: key > output layer name
+VECTOR_LAYERS = {
+    "parcels":      "parcels",
+    "cesspools":    "cesspools",
+    "coastline":    "coastline",
+    "sma":          "sma",
+    "streams":      "streams",
+    "wells_dom":    "wells_dom",
+    "wells_mun":    "wells_mun",
+    "building_fps": "building_fps",
+    "soils":        "soils",
+    "flood_zones":  "flood_zones",
+}
+
+
+def prepare_jobs(
+    *,
+    source_inputs: dict[str, str],
+    prepared_outputs: dict[str, str],
+    tempspace: str | Path,
+    target_epsg: int,
+    keys: list[str],
+    overwrite: bool = True,
+    virtual_mosaic: bool = False,
+) -> dict[str, dict[str, Any]]:
+    """Job graph that prepares ``keys``.
+
+    Mosaicked rasters are a chain: mosaic > define projection (when the
+    source CRS may be missing) > project. With ``virtual_mosaic`` the chain
+    is a VRT over the source tiles > one GDAL warp into the prepared
+    raster, so no full-size mosaic is written to ``tempspace``. Single
+    rasters and vectors are one job each.
+    """
+    tempspace = Path(tempspace)
+    jobs: dict[str, dict[str, Any]] = {}
+    for key in keys:
+        if key in MOSAIC_RASTERS and virtual_mosaic:
+            src_key, resampling, assumed_epsg = MOSAIC_RASTERS[key]
+            jobs[f"{key}_vrt"] = {
+                "func": "build_vrt_mosaic",
+                "kwargs": {
+                    "raster_dir": source_inputs[src_key],
+                    "out_vrt": str(tempspace / f"{key}_mosaic.vrt"),
+                    "overwrite": overwrite,
+                },
+                "label": key,
+                "backend": False,
+            }
+            jobs[key] = {
+                "func": "warp_to_target",
+                "kwargs": {
+                    "prepared_tif": prepared_outputs[key],
+                    "target_epsg": target_epsg,
+                    "resampling": resampling,
+                    "assume_src_epsg_if_missing": assumed_epsg,
+                    "overwrite": overwrite,
+                },
+                "input_from": {"src_raster": f"{key}_vrt"},
+                "label": key,
+                "backend": False,
+            }
+        elif key in MOSAIC_RASTERS:
+            src_key, resampling, assumed_epsg = MOSAIC_RASTERS[key]
+            jobs[f"{key}_mosaic"] = {
+                "func": "mosaic_dir_to_raster",
+                "kwargs": {
+                    "raster_dir": source_inputs[src_key],
+                    "out_mosaic": str(tempspace / f"{key}_mosaic_tmp.tif"),
+                    "overwrite": overwrite,
+                },
+                "label": key,
+            }
+            src_job = f"{key}_mosaic"
+            if assumed_epsg is not None:
+                jobs[f"{key}_define"] = {
+                    "func": "define_projection_if_missing",
+                    "kwargs": {"assumed_epsg": assumed_epsg, "temp_dir": str(tempspace), "overwrite": overwrite},
+                    "input_from": {"raster_path": src_job},
+                    "label": key,
+                }
+                src_job = f"{key}_define"
+            jobs[key] = {
+                "func": "prep_raster_to_target",
+                "kwargs": {
+                    "prepared_tif": prepared_outputs[key],
+                    "target_epsg": target_epsg,
+                    "temp_dir": str(tempspace),
+                    "resampling": resampling,
+                    "overwrite": overwrite,
+                },
+                "input_from": {"src_raster": src_job},
+                "label": key,
+            }
+        elif key in SINGLE_RASTERS:
+            jobs[key] = {
+                "func": "prep_raster_to_target",
+                "kwargs": {
+                    "src_raster": source_inputs[key],
+                    "prepared_tif": prepared_outputs[key],
+                    "target_epsg": target_epsg,
+                    "temp_dir": str(tempspace),
+                    "resampling": SINGLE_RASTERS[key],
+                    "overwrite": overwrite,
+                },
+                "label": key,
+            }
+        elif key in VECTOR_LAYERS:
+            jobs[key] = {
+                "func": "prep_vector_to_gpkg",
+                "kwargs": {
+                    "src_fc": source_inputs[key],
+                    "out_gpkg": prepared_outputs[key],
+                    "out_layer": VECTOR_LAYERS[key],
+                    "target_epsg": target_epsg,
+                    "temp_dir": str(tempspace),
+                    "overwrite": overwrite,
+                },
+                "label": key,
+            }
+        else:
+            raise KeyError(f"No preparation recipe for '{key}'")
+    return jobs
+
+
 def prepare_source_inputs(
     *,
     source_inputs: dict[str, str],
@@ -326,159 +1028,79 @@ def prepare_source_inputs(
     target_epsg: int,
     arcpy: Any,
     overwrite: bool = True,
+    max_workers: int | None = None,
+    dry_run: bool = False,
+    virtual_mosaic: bool = False,
 ) -> dict[str, str]:
+    """Prepare every missing or stale output, running independent jobs in parallel.
+
+    An output is rebuilt when it is missing or its manifest shows a
+    different recipe or changed source files (see ``prepared_status``);
+    fresh outputs are kept, so a source update only redoes the outputs it
+    feeds. Builds the job graph for those outputs (see ``prepare_jobs``),
+    with a ``write_manifest`` job after each, and
+    runs it with up to ``max_workers`` worker processes (default: one per
+    independent job, capped at the CPU count; ``1`` runs serially in this
+    process). A cold run takes roughly as long as the longest chain
+    (e.g. DEM mosaic > define > project) rather than the sum of all jobs.
+    With ``dry_run`` the plan is printed and nothing runs. With
+    ``virtual_mosaic`` the DEM, water table and slope tiles are warped
+    straight from a VRT (needs GDAL) instead of a mosaic written to
+    ``tempspace``.
+    """
     t0_all = time.time()
     tempspace = Path(tempspace)
     ensure_dir(tempspace)
 
-    missing_items = [(k, p) for k, p in prepared_outputs.items() if not prepared_exists(k, p)]
     log_step("Starting prepare_source_inputs()")
     log_step(f"Target CRS: EPSG:{target_epsg}")
-    log_step(f"Missing prepared outputs (current total prepared input layers should be 14): {len(missing_items)}")
 
-    if not missing_items:
-        log_step("All prepared inputs already exist -> skipping preprocessing")
+    engine = "gdal" if is_gdal_backend(arcpy) else "arcpy"
+    recipes = {
+        k: output_recipe(
+            k, source_inputs=source_inputs, target_epsg=target_epsg,
+            engine=engine, virtual_mosaic=virtual_mosaic,
+        )
+        for k in prepared_outputs
+    }
+    stale = {}
+    for k, p in prepared_outputs.items():
+        status = prepared_status(k, p, recipes[k])
+        if status != "fresh":
+            stale[k] = status
+    log_step(f"Outputs to (re)build: {len(stale)} of {len(prepared_outputs)}")
+    for k, status in stale.items():
+        print(f"  - {k}: {status}")
+
+    if not stale:
+        log_step("All prepared inputs are up to date -> skipping preprocessing")
         log_step(f"Total time: {fmt_elapsed(time.time() - t0_all)}\n")
         return prepared_outputs
 
-    # -- Rasters --
-    print("\n" + "-" * 60)
-    log_step("Preparing raster inputs")
-    print("-" * 60)
-
-    # DEM (dir -> mosaic -> define EPSG:4326 if missing -> project)
-    if prepared_exists("dem", prepared_outputs["dem"]):
-        log_step("DEM: prepared file exists -> skipping")
-    else:
-        t0 = time.time()
-        dem_tifs = list(Path(source_inputs["dem_dir"]).glob("*.tif"))
-        log_step(f"DEM: found {len(dem_tifs)} rasters to mosaic")
-        log_step("DEM: mosaicking rasters")
-        dem_mosaic = mosaic_dir_to_raster(
-            raster_dir=source_inputs["dem_dir"],
-            out_mosaic=str(tempspace / "dem_mosaic_tmp.tif"),
-            arcpy=arcpy,
-            overwrite=overwrite,
-        )
-        log_step("DEM: projecting to target CRS")
-        dem_out = prep_raster_to_target(
-            src_raster=dem_mosaic,
-            prepared_tif=prepared_outputs["dem"],
-            target_epsg=target_epsg,
-            temp_dir=tempspace,
-            arcpy=arcpy,
-            resampling="BILINEAR",
-            assume_src_epsg_if_missing=4326,
-            overwrite=overwrite,
-        )
-        log_step(f"DEM: export complete -> {dem_out} ({fmt_elapsed(time.time() - t0)})")
-
-    # Water table (dir -> mosaic -> project)
-    if prepared_exists("watertable", prepared_outputs["watertable"]):
-        log_step("Water table: prepared file exists -> skipping")
-    else:
-        t0 = time.time()
-        wt_tifs = list(Path(source_inputs["watertable_dir"]).glob("*.tif"))
-        log_step(f"Water table: found {len(wt_tifs)} rasters to mosaic")
-        log_step("Water table: mosaicking rasters")
-        wt_mosaic = mosaic_dir_to_raster(
-            raster_dir=source_inputs["watertable_dir"],
-            out_mosaic=str(tempspace / "watertable_mosaic_tmp.tif"),
-            arcpy=arcpy,
-            overwrite=overwrite,
-        )
-        log_step("Water table: projecting to target CRS")
-        wt_out = prep_raster_to_target(
-            src_raster=wt_mosaic,
-            prepared_tif=prepared_outputs["watertable"],
-            target_epsg=target_epsg,
-            temp_dir=tempspace,
-            arcpy=arcpy,
-            resampling="NEAREST",
-            overwrite=overwrite,
-        )
-        log_step(f"Water table: export complete -> {wt_out} ({fmt_elapsed(time.time() - t0)})")
-
-    # Slope (dir -> mosaic -> define EPSG:4326 if missing -> project)
-    if prepared_exists("slope", prepared_outputs["slope"]):
-        log_step("Slope: prepared file exists -> skipping")
-    else:
-        t0 = time.time()
-        slope_tifs = list(Path(source_inputs["slope_dir"]).glob("*.tif"))
-        log_step(f"Slope: found {len(slope_tifs)} rasters to mosaic")
-        log_step("Slope: mosaicking rasters")
-        slope_mosaic = mosaic_dir_to_raster(
-            raster_dir=source_inputs["slope_dir"],
-            out_mosaic=str(tempspace / "slope_mosaic_tmp.tif"),
-            arcpy=arcpy,
-            overwrite=overwrite,
-        )
-        log_step("Slope: projecting to target CRS")
-        slope_out = prep_raster_to_target(
-            src_raster=slope_mosaic,
-            prepared_tif=prepared_outputs["slope"],
-            target_epsg=target_epsg,
-            temp_dir=tempspace,
-            arcpy=arcpy,
-            resampling="BILINEAR",
-            assume_src_epsg_if_missing=4326,
-            overwrite=overwrite,
-        )
-        log_step(f"Slope: export complete -> {slope_out} ({fmt_elapsed(time.time() - t0)})")
-
-    # Rainfall (single raster -> project)
-    if prepared_exists("rainfall", prepared_outputs["rainfall"]):
-        log_step("Rainfall: prepared file exists -> skipping")
-    else:
-        t0 = time.time()
-        log_step("Rainfall: projecting to target CRS")
-        rain_out = prep_raster_to_target(
-            src_raster=source_inputs["rainfall"],
-            prepared_tif=prepared_outputs["rainfall"],
-            target_epsg=target_epsg,
-            temp_dir=tempspace,
-            arcpy=arcpy,
-            resampling="BILINEAR",
-            overwrite=overwrite,
-        )
-        log_step(f"Rainfall: export complete -> {rain_out} ({fmt_elapsed(time.time() - t0)})")
+    jobs = prepare_jobs(
+        source_inputs=source_inputs,
+        prepared_outputs=prepared_outputs,
+        tempspace=tempspace,
+        target_epsg=target_epsg,
+        keys=list(stale),
+        overwrite=overwrite,
+        virtual_mosaic=virtual_mosaic,
+    )
+    jobs.update(manifest_jobs({k: recipes[k] for k in stale}, prepared_outputs))
 
-    # -- Vectors --
     print("\n" + "-" * 60)
-    log_step("Preparing vector inputs")
-    print("-" * 60)
+    if dry_run:
+        log_step(f"Dry run: {len(jobs)} job(s) planned")
+        print("-" * 60)
+        print_job_plan(jobs)
+        return prepared_outputs
 
-    vector_jobs = [
-        ("parcels",      "parcels"),
-        ("cesspools",    "cesspools"),
-        ("coastline",    "coastline"),
-        ("sma",          "sma"),
-        ("streams",      "streams"),
-        ("wells_dom",    "wells_dom"),
-        ("wells_mun",    "wells_mun"),
-        ("buildings_fps","buildings_fps"),
-        ("soils",        "soils"),
-        ("flood_zones",  "flood_zones"),
-    ]
-
-    for key, layer_name in vector_jobs:
-        out_gpkg = prepared_outputs[key]
-        if path_exists(out_gpkg):
-            log_step(f"{key}: prepared file exists -> skipping")
-            continue
-        t0 = time.time()
-        log_step(f"{key}: projecting to target CRS (if needed)")
-        prep_vector_to_gpkg(
-            src_fc=source_inputs[key],
-            out_gpkg=out_gpkg,
-            out_layer=layer_name,
-            target_epsg=target_epsg,
-            temp_dir=tempspace,
-            arcpy=arcpy,
-            overwrite=overwrite,
-        )
-        log_step(f"{key}: export complete ({fmt_elapsed(time.time() - t0)})")
+    if max_workers is None:
+        max_workers = min(len(job_levels(jobs)[0]), os.cpu_count() or 1)
+    log_step(f"Running {len(jobs)} job(s) with up to {max_workers} worker(s)")
+    print("-" * 60)
+    run_jobs(jobs, arcpy=arcpy, max_workers=max_workers)
 
     log_step("Done. Prepared inputs are ready.")
     log_step(f"Total time: {fmt_elapsed(time.time() - t0_all)}\n")
-    return prepared_outputs
\ No newline at end of file
+    return prepared_outputs
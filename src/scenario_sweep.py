@@ -0,0 +1,341 @@
+"""
+src/scenario_sweep.py
+Scenario sweeps for the logic model (one MPAT + N scenario configs > per-scenario endpoint summaries).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from build_logic_model import (
+    compile_rules,
+    decode_bits,
+    evaluate_rules,
+    expression_columns,
+    load_rules_config,
+)
+from workers import ensure_importable
+
+try:
+    import geopandas as gpd
+except ImportError:
+    gpd = None
+
+
+BASELINE_SCENARIO = "baseline"
+
+
+# ---------------------------------------------------------------------------
+# Scenario discovery and MPAT loading
+# ---------------------------------------------------------------------------
+
+def find_scenarios(config_root: str | Path) -> dict[str, Path]:
+    """Scenario config folders under ``config_root``, keyed by folder name.
+
+    Picks up ``config_root/baseline`` and every ``config_root/scenarios/*``
+    folder holding a ``criteria.yaml`` (the layout ``export_config.py``
+    writes), baseline first and the rest sorted by name.
+    """
+    config_root = Path(config_root)
+    out = {}
+    baseline = config_root / BASELINE_SCENARIO
+    if (baseline / "criteria.yaml").exists():
+        out[BASELINE_SCENARIO] = baseline
+    for d in sorted((config_root / "scenarios").glob("*/")):
+        if (d / "criteria.yaml").exists():
+            out[d.name] = d
+    return out
+
+
+def rule_columns(compiled: dict[str, Any], available: list[str]) -> set[str]:
+    """MPAT columns a compiled rule set reads (criterion fields and derived-expression inputs)."""
+    available = set(available)
+    out = set()
+    for c in compiled["criteria"]:
+        if c["field"] in available:
+            out.add(c["field"])
+        elif c["derived"] is not None:
+            out |= expression_columns(c["derived"]) & available
+    return out
+
+
+def read_mpat_table(path: str | Path, columns: list[str] | None = None, *, tmk_field: str = "tmk") -> pd.DataFrame:
+    """Read the MPAT attributes (CSV or GPKG, no geometry), optionally only ``columns``."""
+    path = Path(path)
+    wanted = None if columns is None else set(columns) | {tmk_field}
+    if path.suffix.lower() == ".csv":
+        return pd.read_csv(
+            path,
+            usecols=None if wanted is None else (lambda col: col in wanted),
+            dtype={tmk_field: str},
+            low_memory=False,
+        )
+    if gpd is None:
+        raise ImportError("geopandas is required to read a GPKG MPAT.")
+    df = pd.DataFrame(gpd.read_file(
+        path,
+        columns=None if wanted is None else sorted(wanted),
+        ignore_geometry=True,
+    ))
+    df[tmk_field] = df[tmk_field].astype(str)
+    return df
+
+
+# ---------------------------------------------------------------------------
+# Shared-memory MPAT columns
+# ---------------------------------------------------------------------------
+
+def share_columns(df: pd.DataFrame, columns: list[str]) -> tuple[list[Any], dict[str, Any]]:
+    """Copy MPAT columns into shared memory once for every worker process.
+
+    Numeric and boolean columns go into one shared block each (nullable
+    integer/boolean columns become float64 with NaN); object/string columns
+    are small enough to travel in the spec itself. Returns the shared
+    memory handles (the caller closes and unlinks them) and a picklable
+    spec for ``attach_columns``.
+    """
+    handles = []
+    spec = {"n": len(df), "shared": [], "objects": {}}
+    for col in columns:
+        s = df[col]
+        if pd.api.types.is_extension_array_dtype(s.dtype) and s.dtype.kind in "iub":
+            arr = s.to_numpy(dtype="float64", na_value=np.nan)
+        elif s.dtype.kind in "iufb":
+            arr = s.to_numpy()
+        else:
+            spec["objects"][col] = s.to_numpy(dtype="object")
+            continue
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        handles.append(shm)
+        spec["shared"].append((col, shm.name, arr.dtype.str))
+    return handles, spec
+
+
+def attach_columns(spec: dict[str, Any]) -> tuple[pd.DataFrame, list[Any]]:
+    """Zero-copy DataFrame over the shared blocks described by ``spec``.
+
+    Returns the frame and the attached handles, which must stay referenced
+    for as long as the frame is used.
+    """
+    handles = []
+    data = {}
+    for col, name, dtype in spec["shared"]:
+        shm = shared_memory.SharedMemory(name=name)
+        handles.append(shm)
+        data[col] = np.ndarray((spec["n"],), dtype=np.dtype(dtype), buffer=shm.buf)
+    data.update(spec["objects"])
+    return pd.DataFrame(data, copy=False), handles
+
+
+# ---------------------------------------------------------------------------
+# Per-scenario evaluation
+# ---------------------------------------------------------------------------
+
+def summarize_scenario(
+    name: str,
+    result: pd.DataFrame,
+    compiled: dict[str, Any],
+    baseline_shown: np.ndarray,
+    baseline_ids: list[str],
+) -> dict[str, Any]:
+    """One summary row: endpoint availability counts and changes versus the baseline.
+
+    ``shown_<E>`` counts parcels where endpoint E is shown; ``gained_<E>`` /
+    ``lost_<E>`` count parcels where E is shown now but not in the baseline
+    and vice versa. Endpoints are matched to the baseline by id, so a
+    scenario that adds or drops endpoints still compares cleanly.
+    """
+    shown = result["endpoints_shown"].to_numpy()
+    ids = compiled["endpoint_ids"]
+    base_bit = {eid: j for j, eid in enumerate(baseline_ids)}
+    bit = {eid: j for j, eid in enumerate(ids)}
+
+    row = {
+        "scenario": name,
+        "parcels": len(result),
+        "unresolved_criteria": len(compiled["unresolved"]),
+        "parcels_no_endpoint": int((shown == 0).sum()),
+    }
+    changed = np.zeros(shown.size, dtype=bool)
+    counts = {}
+    for eid in ids + [e for e in baseline_ids if e not in bit]:
+        now = (shown >> bit[eid]) & 1 == 1 if eid in bit else np.zeros(shown.size, dtype=bool)
+        before = (
+            (baseline_shown >> base_bit[eid]) & 1 == 1 if eid in base_bit
+            else np.zeros(shown.size, dtype=bool)
+        )
+        changed |= now != before
+        counts[f"shown_{eid}"] = int(now.sum())
+        counts[f"gained_{eid}"] = int((now & ~before).sum())
+        counts[f"lost_{eid}"] = int((before & ~now).sum())
+    row["parcels_changed"] = int(changed.sum())
+    row.update(counts)
+    return row
+
+
+def write_scenario_parcels(
+    name: str,
+    result: pd.DataFrame,
+    compiled: dict[str, Any],
+    out_dir: str | Path,
+) -> Path:
+    """Write one scenario's per-parcel endpoint masks (plus readable shown/flagged ids) to CSV."""
+    out_path = Path(out_dir) / f"{name}_logic.csv"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    ids = compiled["endpoint_ids"]
+    result.assign(
+        endpoints_shown_ids=decode_bits(result["endpoints_shown"], ids).to_numpy(),
+        endpoints_flagged_ids=decode_bits(result["endpoints_flagged"], ids).to_numpy(),
+    ).to_csv(out_path, index=False)
+    return out_path
+
+
+_WORKER: dict[str, Any] = {}
+
+
+def _init_sweep_worker(
+    spec: dict[str, Any],
+    baseline_shown: np.ndarray,
+    baseline_ids: list[str],
+    tmk_field: str,
+) -> None:
+    df, handles = attach_columns(spec)
+    _WORKER.update(
+        df=df,
+        handles=handles,
+        baseline_shown=baseline_shown,
+        baseline_ids=baseline_ids,
+        tmk_field=tmk_field,
+    )
+
+
+def _run_scenario(name: str, compiled: dict[str, Any], per_parcel_dir: str | None) -> dict[str, Any]:
+    result = evaluate_rules(_WORKER["df"], compiled, tmk_field=_WORKER["tmk_field"])
+    if per_parcel_dir is not None:
+        write_scenario_parcels(name, result, compiled, per_parcel_dir)
+    return summarize_scenario(name, result, compiled, _WORKER["baseline_shown"], _WORKER["baseline_ids"])
+
+
+# ---------------------------------------------------------------------------
+# Sweep runner
+# ---------------------------------------------------------------------------
+
+def run_scenario_sweep(
+    mpat_df: pd.DataFrame,
+    scenarios: dict[str, str | Path],
+    *,
+    baseline: str = BASELINE_SCENARIO,
+    tmk_field: str = "tmk",
+    max_workers: int | None = None,
+    per_parcel_dir: str | Path | None = None,
+) -> pd.DataFrame:
+    """Evaluate many scenario configs against one MPAT; one summary row per scenario.
+
+    Every config is loaded and compiled up front (so a broken scenario fails
+    before any work starts), then only the MPAT columns the rules read are
+    copied into shared memory once and the scenarios are evaluated in a
+    process pool of ``max_workers`` (default: CPU count; ``1`` runs
+    in-process). Each worker attaches to the shared columns instead of
+    receiving its own copy of the MPAT.
+
+    ``baseline`` names the scenario the ``gained_*``/``lost_*``/
+    ``parcels_changed`` columns compare against (see ``summarize_scenario``).
+    With ``per_parcel_dir`` each scenario's per-parcel masks are also written
+    to ``<per_parcel_dir>/<scenario>_logic.csv``. Rows come back in
+    ``scenarios`` order.
+    """
+    if baseline not in scenarios:
+        raise KeyError(f"Baseline scenario '{baseline}' is not in the sweep")
+
+    compiled = {name: compile_rules(load_rules_config(d)) for name, d in scenarios.items()}
+    columns = sorted(set().union(*(rule_columns(c, list(mpat_df.columns)) for c in compiled.values())))
+    columns = [tmk_field] + [c for c in columns if c != tmk_field]
+    out_dir = None if per_parcel_dir is None else str(per_parcel_dir)
+
+    base = evaluate_rules(mpat_df, compiled[baseline], tmk_field=tmk_field)
+    baseline_shown = base["endpoints_shown"].to_numpy()
+    baseline_ids = compiled[baseline]["endpoint_ids"]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    rows = {}
+    if max_workers == 1 or len(scenarios) == 1:
+        _init_sweep_worker(
+            {"n": len(mpat_df), "shared": [], "objects": {c: mpat_df[c].to_numpy() for c in columns}},
+            baseline_shown, baseline_ids, tmk_field,
+        )
+        try:
+            for name in scenarios:
+                rows[name] = _run_scenario(name, compiled[name], out_dir)
+        finally:
+            _WORKER.clear()
+    else:
+        ensure_importable()
+        handles, spec = share_columns(mpat_df, columns)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(max_workers, len(scenarios)),
+                initializer=_init_sweep_worker,
+                initargs=(spec, baseline_shown, baseline_ids, tmk_field),
+            ) as pool:
+                futures = {pool.submit(_run_scenario, name, compiled[name], out_dir): name for name in scenarios}
+                for fut in as_completed(futures):
+                    rows[futures[fut]] = fut.result()
+        finally:
+            for shm in handles:
+                shm.close()
+                shm.unlink()
+
+    summary = pd.DataFrame([rows[name] for name in scenarios])
+    counts = summary.columns.drop("scenario")
+    summary[counts] = summary[counts].fillna(0).astype("int64")
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Evaluate every scenario config against one MPAT and summarise endpoint availability."
+    )
+    parser.add_argument("--mpat", required=True, help="MPAT CSV or GPKG")
+    parser.add_argument("--config-root", default="config", help="Folder holding baseline/ and scenarios/")
+    parser.add_argument("--output", required=True, help="Summary CSV to write")
+    parser.add_argument("--per-parcel-dir", default=None, help="Also write per-parcel masks per scenario here")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    scenarios = find_scenarios(args.config_root)
+    if BASELINE_SCENARIO not in scenarios:
+        sys.exit(f"No {BASELINE_SCENARIO}/ config found under {args.config_root}")
+
+    # Read only the columns some scenario's rules need
+    columns = None
+    if args.mpat.lower().endswith(".csv"):
+        available = list(pd.read_csv(args.mpat, nrows=0).columns)
+        compiled = [compile_rules(load_rules_config(d)) for d in scenarios.values()]
+        columns = sorted(set().union(*(rule_columns(c, available) for c in compiled)))
+
+    summary = run_scenario_sweep(
+        read_mpat_table(args.mpat, columns),
+        scenarios,
+        max_workers=args.workers,
+        per_parcel_dir=args.per_parcel_dir,
+    )
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    summary.to_csv(args.output, index=False)
+    print(f"Wrote {len(summary)} scenario summaries to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+src/spatial_index.py
+Spatial-index helpers for the MPAT build (analysis points > nearest features).
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import shapely
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+FT_TO_M = 0.3048
+
+# Distance returned for points with no feature inside a bounded search radius.
+# +inf keeps ">= setback" comparisons passing and "< threshold" ones failing.
+BEYOND_RADIUS = np.inf
+
+# query_nearest needs a strictly positive radius; a 0 ft setback (inside SMA)
+# only cares about points on/inside a feature
+_MIN_RADIUS = 1e-9
+
+
+# ---------------------------------------------------------------------------
+# Input helpers
+# ---------------------------------------------------------------------------
+
+def point_coords(points: Any) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(x, y)`` float arrays for a GeoDataFrame/GeoSeries of points or an ``(x, y)`` tuple."""
+    if isinstance(points, tuple):
+        x, y = points
+        return np.asarray(x, dtype="float64"), np.asarray(y, dtype="float64")
+    geoms = points.geometry if hasattr(points, "geometry") else points
+    return geoms.x.to_numpy(dtype="float64"), geoms.y.to_numpy(dtype="float64")
+
+
+def feature_geometries(features: Any) -> tuple[np.ndarray, np.ndarray]:
+    """Non-empty feature geometries plus their row positions in ``features``."""
+    geoms = np.asarray(
+        features.geometry.values if hasattr(features, "geometry") else features,
+        dtype=object,
+    )
+    keep = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+    return geoms[keep], np.flatnonzero(keep)
+
+
+def is_point_layer(geoms: np.ndarray) -> bool:
+    return geoms.size > 0 and set(shapely.get_type_id(geoms).tolist()) <= {0, 4}
+
+
+# ---------------------------------------------------------------------------
+# Nearest-feature engines
+# ---------------------------------------------------------------------------
+
+def nearest_point_kdtree(
+    x: np.ndarray,
+    y: np.ndarray,
+    feature_geoms: np.ndarray,
+    *,
+    max_distance: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Nearest point feature via a KD-tree over (exploded) feature coordinates.
+
+    Returns ``(distance, feature_pos)`` where ``feature_pos`` indexes into
+    ``feature_geoms``. With ``max_distance``, the tree search is pruned to
+    that radius (inclusive) and points with nothing inside it get
+    ``BEYOND_RADIUS`` and position -1.
+    """
+    parts, owner = shapely.get_parts(feature_geoms, return_index=True)
+
+    if cKDTree is None:
+        dist, idx = nearest_geometry_strtree(x, y, parts, max_distance=max_distance)
+    else:
+        tree = cKDTree(shapely.get_coordinates(parts))
+        bound = np.inf if max_distance is None else np.nextafter(max_distance, np.inf)
+        dist, idx = tree.query(np.column_stack([x, y]), k=1, distance_upper_bound=bound)
+        idx = np.where(np.isfinite(dist), idx, -1)
+    return dist, np.where(idx >= 0, owner[np.clip(idx, 0, None)], -1)
+
+
+def nearest_geometry_strtree(
+    x: np.ndarray,
+    y: np.ndarray,
+    feature_geoms: np.ndarray,
+    *,
+    max_distance: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Nearest line/polygon feature via ``STRtree.query_nearest``.
+
+    Points inside a polygon get distance 0, matching ``distance(union)``.
+    Returns ``(distance, feature_pos)``. With ``max_distance``, candidates
+    are pruned to that radius and points with nothing inside it get
+    ``BEYOND_RADIUS`` and position -1.
+    """
+    tree = shapely.STRtree(feature_geoms)
+    (input_idx, tree_idx), dist = tree.query_nearest(
+        shapely.points(x, y),
+        max_distance=None if max_distance is None else max(max_distance, _MIN_RADIUS),
+        return_distance=True,
+        all_matches=False,
+    )
+    out_dist = np.full(x.size, np.nan if max_distance is None else BEYOND_RADIUS, dtype="float64")
+    out_pos = np.full(x.size, -1, dtype="int64")
+    out_dist[input_idx] = dist
+    out_pos[input_idx] = tree_idx
+    return out_dist, out_pos
+
+
+def nearest_feature(
+    points: Any,
+    features: Any,
+    *,
+    max_distance: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Distance to, and row position of, the nearest feature for each point.
+
+    Uses a KD-tree for point layers (wells) and an STRtree for line/polygon
+    layers (coast, streams, SMA); no union of the feature layer is built.
+    Distances are in CRS units (metres for EPSG:32604). Positions are -1
+    and distances NaN when the feature layer is empty.
+
+    ``max_distance`` bounds the search radius (CRS units, inclusive): points
+    with no feature within it get ``BEYOND_RADIUS`` instead of an exact
+    distance, which skips most of the nearest-neighbour work for setback
+    criteria that only care about features inside the largest threshold.
+    """
+    x, y = point_coords(points)
+    geoms, rows = feature_geometries(features)
+
+    dist = np.full(x.size, np.nan, dtype="float64")
+    pos = np.full(x.size, -1, dtype="int64")
+    ok = np.isfinite(x) & np.isfinite(y)
+    if geoms.size == 0 or not ok.any():
+        if max_distance is not None:
+            dist[ok] = BEYOND_RADIUS
+        return dist, pos
+
+    engine = nearest_point_kdtree if is_point_layer(geoms) else nearest_geometry_strtree
+    dist[ok], found = engine(x[ok], y[ok], geoms, max_distance=max_distance)
+    pos[ok] = np.where(found >= 0, rows[np.clip(found, 0, None)], -1)
+    return dist, pos
+
+
+def dist_to_nearest(
+    points_gdf: Any,
+    features_gdf: Any,
+    name: str,
+    *,
+    tmk_field: str = "tmk",
+    id_field: str | None = None,
+    ft_to_m: float = FT_TO_M,
+    max_distance_ft: float | None = None,
+) -> pd.DataFrame:
+    """Distance from each analysis point to the nearest feature of a layer.
+
+    Returns a DataFrame with ``tmk``, ``dist_to_{name}_m``,
+    ``dist_to_{name}_ft`` and ``nearest_{name}_id`` (the feature's
+    ``id_field`` value, or its row index when ``id_field`` is None).
+
+    With ``max_distance_ft`` (e.g. the largest setback threshold for the
+    layer), points with no feature within that radius get ``BEYOND_RADIUS``
+    (+inf) distances and no nearest ID. That mode is for quick setback
+    screening only; the MPAT stores exact (unbounded) distances.
+    """
+    max_distance = None if max_distance_ft is None else max_distance_ft * ft_to_m
+    dist, pos = nearest_feature(points_gdf, features_gdf, max_distance=max_distance)
+
+    ids = features_gdf[id_field].to_numpy() if id_field else features_gdf.index.to_numpy()
+    nearest_id = pd.Series(ids[np.clip(pos, 0, None)] if ids.size else pos, dtype="object")
+    nearest_id[pos < 0] = None
+
+    return pd.DataFrame({
+        tmk_field: points_gdf[tmk_field].to_numpy(),
+        f"dist_to_{name}_m": dist,
+        f"dist_to_{name}_ft": dist / ft_to_m,
+        f"nearest_{name}_id": nearest_id.to_numpy(),
+    })
+
+
+# ---------------------------------------------------------------------------
+# Point-in-polygon engine
+# ---------------------------------------------------------------------------
+
+PIP_PREDICATES = ("within", "intersects")
+
+
+def polygon_index(polygons: Any) -> tuple[Any, np.ndarray]:
+    """STRtree over prepared, non-empty polygons plus their row positions.
+
+    Build once per layer and pass as ``index`` to ``point_in_polygon`` to
+    reuse it across point sets.
+    """
+    geoms, rows = feature_geometries(polygons)
+    shapely.prepare(geoms)
+    return shapely.STRtree(geoms), rows
+
+
+def point_in_polygon(
+    points: Any,
+    polygons: Any,
+    *,
+    predicate: str = "within",
+    priority: np.ndarray | None = None,
+    index: tuple[Any, np.ndarray] | None = None,
+) -> np.ndarray:
+    """Row position of the one polygon each point falls in, or -1.
+
+    ``within`` excludes points on a polygon boundary (as ``sjoin`` does);
+    ``intersects`` includes them. When polygons overlap, the match with the
+    lowest ``priority`` value (aligned with ``polygons`` rows) wins, then
+    the lowest row position, so the result never depends on tree order and
+    there is no fan-out to collapse afterwards.
+    """
+    if predicate not in PIP_PREDICATES:
+        raise ValueError(f"Unknown predicate '{predicate}'; expected one of {PIP_PREDICATES}")
+
+    x, y = point_coords(points)
+    tree, rows = index if index is not None else polygon_index(polygons)
+    out = np.full(x.size, -1, dtype="int64")
+    ok = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if rows.size == 0 or ok.size == 0:
+        return out
+
+    # Predicates are evaluated as ``point.<predicate>(polygon)`` on the
+    # bounding-box candidates only
+    pt_idx, poly_idx = tree.query(shapely.points(x[ok], y[ok]), predicate=predicate)
+    if pt_idx.size == 0:
+        return out
+
+    match_rows = rows[poly_idx]
+    keys = [match_rows]
+    if priority is not None:
+        keys.append(np.asarray(priority)[match_rows])
+    keys.append(pt_idx)
+    order = np.lexsort(keys)
+
+    pt_sorted = pt_idx[order]
+    first = np.r_[True, pt_sorted[1:] != pt_sorted[:-1]]
+    out[ok[pt_sorted[first]]] = match_rows[order][first]
+    return out
+
+
+def polygon_values_at_points(
+    points_gdf: Any,
+    polygons_gdf: Any,
+    columns: list[str],
+    *,
+    predicate: str = "within",
+    tmk_field: str = "tmk",
+    priority_field: str | None = None,
+    ascending: bool = True,
+) -> pd.DataFrame:
+    """Attributes of the polygon each analysis point falls in, one row per point.
+
+    Returns ``tmk`` plus ``columns`` (NA where no polygon matches).
+    Overlaps are resolved by ``priority_field`` (lowest first, or highest
+    with ``ascending=False``), then by polygon row order.
+    """
+    priority = None
+    if priority_field is not None:
+        ranks = polygons_gdf[priority_field].rank(method="dense", ascending=ascending, na_option="bottom")
+        priority = ranks.to_numpy(dtype="float64")
+
+    pos = point_in_polygon(points_gdf, polygons_gdf, predicate=predicate, priority=priority)
+
+    # Reindexing by row position maps unmatched points (-1) to NA
+    out = pd.DataFrame({tmk_field: points_gdf[tmk_field].to_numpy()})
+    for col in columns:
+        out[col] = polygons_gdf[col].reset_index(drop=True).reindex(pos).to_numpy()
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Densified line index (coastline)
+# ---------------------------------------------------------------------------
+
+def geometry_fingerprint(geoms: np.ndarray) -> str:
+    """Content hash of a geometry array (WKB), used to validate persisted indexes."""
+    h = hashlib.sha1()
+    for wkb in shapely.to_wkb(geoms, output_dimension=2):
+        h.update(wkb)
+    return h.hexdigest()
+
+
+def _line_segments(geoms: np.ndarray, spacing: float) -> tuple[np.ndarray, np.ndarray]:
+    """Densify lines to ``spacing`` and return segment start/end coordinate arrays."""
+    polys = np.isin(shapely.get_type_id(geoms), [3, 6])
+    geoms = np.where(polys, shapely.boundary(geoms), geoms)
+
+    lines = shapely.get_parts(shapely.get_parts(geoms))
+    lines = lines[np.isin(shapely.get_type_id(lines), [1, 2])]
+    lines = shapely.segmentize(lines, spacing)
+
+    coords, owner = shapely.get_coordinates(lines, return_index=True)
+    same_line = owner[1:] == owner[:-1]
+    return coords[:-1][same_line], coords[1:][same_line]
+
+
+def build_segment_index(lines: Any, *, spacing: float = 25.0) -> dict[str, Any]:
+    """Build a KD-tree index over densified line segments.
+
+    Lines (or polygon boundaries) are densified so no segment is longer than
+    ``spacing`` (CRS units), and the segment midpoints go into a KD-tree.
+    Densifying only adds collinear vertices, so distances stay exact.
+    """
+    if cKDTree is None:
+        raise ImportError("scipy is required for the densified segment index.")
+
+    geoms, _ = feature_geometries(lines)
+    start, end = _line_segments(geoms, spacing)
+    return {
+        "start": start,
+        "end": end,
+        "spacing": float(spacing),
+        "fingerprint": geometry_fingerprint(geoms),
+        "tree": cKDTree((start + end) / 2.0),
+    }
+
+
+def save_segment_index(index: dict[str, Any], path: str | Path) -> None:
+    """Persist a segment index (arrays only; the KD-tree is rebuilt on load)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        path,
+        start=index["start"],
+        end=index["end"],
+        spacing=index["spacing"],
+        fingerprint=index["fingerprint"],
+    )
+
+
+def load_or_build_segment_index(
+    lines: Any,
+    cache_path: str | Path,
+    *,
+    spacing: float = 25.0,
+) -> dict[str, Any]:
+    """Load a persisted segment index if it matches ``lines`` and ``spacing``; else build and save one."""
+    cache_path = Path(cache_path)
+    geoms, _ = feature_geometries(lines)
+    fingerprint = geometry_fingerprint(geoms)
+
+    if cache_path.exists():
+        with np.load(cache_path) as cached:
+            if str(cached["fingerprint"]) == fingerprint and float(cached["spacing"]) == spacing:
+                start, end = cached["start"], cached["end"]
+                return {
+                    "start": start,
+                    "end": end,
+                    "spacing": float(spacing),
+                    "fingerprint": fingerprint,
+                    "tree": cKDTree((start + end) / 2.0),
+                }
+
+    index = build_segment_index(geoms, spacing=spacing)
+    save_segment_index(index, cache_path)
+    return index
+
+
+def _point_segment_distance(
+    px: np.ndarray,
+    py: np.ndarray,
+    start: np.ndarray,
+    end: np.ndarray,
+) -> np.ndarray:
+    """Exact point-to-segment distances (broadcasts over leading dimensions)."""
+    ax, ay = start[..., 0], start[..., 1]
+    vx, vy = end[..., 0] - ax, end[..., 1] - ay
+    len2 = vx * vx + vy * vy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(len2 > 0, ((px - ax) * vx + (py - ay) * vy) / len2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - (ax + t * vx), py - (ay + t * vy))
+
+
+def segment_index_distance(
+    index: dict[str, Any],
+    x: np.ndarray,
+    y: np.ndarray,
+    *,
+    k: int = 8,
+) -> np.ndarray:
+    """Exact distance from points to the nearest indexed segment.
+
+    The ``k`` nearest segment midpoints are refined with exact point-segment
+    distances. Every segment is at most ``spacing`` long, so any segment not
+    examined is at least ``(k-th midpoint distance) - spacing / 2`` away; the
+    best refined distance is certified exact when it is within that bound.
+    Points that cannot be certified are re-queried with a larger ``k``.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    out = np.full(x.size, np.nan, dtype="float64")
+    n_segments = index["start"].shape[0]
+    if n_segments == 0:
+        return out
+
+    half = index["spacing"] / 2.0
+    todo = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    while todo.size:
+        kk = min(k, n_segments)
+        mid_dist, idx = index["tree"].query(np.column_stack([x[todo], y[todo]]), k=kk)
+        mid_dist = mid_dist.reshape(todo.size, kk)
+        idx = idx.reshape(todo.size, kk)
+
+        exact = _point_segment_distance(
+            x[todo, None], y[todo, None], index["start"][idx], index["end"][idx],
+        ).min(axis=1)
+
+        certified = (exact <= mid_dist[:, -1] - half) | (kk == n_segments)
+        out[todo[certified]] = exact[certified]
+        todo = todo[~certified]
+        k *= 4
+    return out
+
+
+def dist_to_coast(
+    points_gdf: Any,
+    coastline_gdf: Any,
+    *,
+    spacing: float = 25.0,
+    cache_path: str | Path | None = None,
+    tmk_field: str = "tmk",
+    ft_to_m: float = FT_TO_M,
+) -> pd.DataFrame:
+    """Distance from each analysis point to the coastline via a densified segment index.
+
+    Matches ``points.distance(coastline.union_all())`` to floating-point
+    precision (well under 1e-6 m): densifying adds only collinear vertices
+    and every candidate is refined exactly. With ``cache_path`` the index is
+    persisted and reused while the coastline geometries and ``spacing`` are
+    unchanged.
+    """
+    if cache_path is None:
+        index = build_segment_index(coastline_gdf, spacing=spacing)
+    else:
+        index = load_or_build_segment_index(coastline_gdf, cache_path, spacing=spacing)
+
+    x, y = point_coords(points_gdf)
+    dist = segment_index_distance(index, x, y)
+    return pd.DataFrame({
+        tmk_field: points_gdf[tmk_field].to_numpy(),
+        "dist_to_coast_m": dist,
+        "dist_to_coast_ft": dist / ft_to_m,
+    })
@@ -0,0 +1,494 @@
+"""
+src/terrain.py
+NumPy/GDAL terrain derivatives (slope) computed from the prepared DEM.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from raster_sampling import build_overviews, gather_band, gtiff_creation_options, in_bounds_mask, world_to_pixel
+from workers import ensure_importable
+
+try:
+    from osgeo import gdal, osr
+except ImportError:
+    gdal = None
+    osr = None
+
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+# Vertical unit -> metres (DEM x/y are assumed metres or degrees)
+Z_UNIT_FACTORS = {
+    "METER": 1.0,
+    "CENTIMETER": 0.01,
+    "FOOT": 0.3048,
+    "INTL_FOOT": 0.3048,
+    "US_FOOT": 1200 / 3937,
+}
+
+OUTPUT_MEASUREMENTS = ("PERCENT_RISE", "DEGREE")
+SLOPE_METHODS = ("PLANAR", "GEODESIC")
+
+SLOPE_NODATA = -9999.0
+
+# WGS84 ellipsoid
+_WGS84_A = 6378137.0
+_WGS84_E2 = 0.00669437999014
+_MEAN_EARTH_RADIUS = 6371008.8
+
+# Tiled, compressed GeoTIFF layout for derived rasters (the prepared-raster
+# layout from raster_sampling; overviews are added once all tiles are written)
+GTIFF_CREATION_OPTIONS = gtiff_creation_options(floating=True)
+
+
+# ---------------------------------------------------------------------------
+# Slope kernel
+# ---------------------------------------------------------------------------
+
+def _check_slope_args(output_measurement: str, method: str, z_unit: str) -> None:
+    if output_measurement not in OUTPUT_MEASUREMENTS:
+        raise ValueError(f"output_measurement must be one of {OUTPUT_MEASUREMENTS}")
+    if method not in SLOPE_METHODS:
+        raise ValueError(f"method must be one of {SLOPE_METHODS}")
+    if z_unit not in Z_UNIT_FACTORS:
+        raise ValueError(f"z_unit must be one of {tuple(Z_UNIT_FACTORS)}")
+
+
+def horn_slope(
+    a, b, c, d, e, f, g, h, i,
+    *,
+    dx: np.ndarray | float,
+    dy: np.ndarray | float,
+    z_factor: float = 1.0,
+    output_measurement: str = "PERCENT_RISE",
+) -> np.ndarray:
+    """Slope from a 3x3 neighbourhood using Horn's (1981) finite differences.
+
+    Neighbours are laid out as::
+
+        a b c
+        d e f
+        g h i
+
+    This is the same kernel ArcGIS uses for planar slope. Invalid neighbours
+    (NaN) are replaced by the centre value ``e``; NaN where ``e`` is NaN.
+    ``dx``/``dy`` are ground cell sizes in metres (scalars or arrays that
+    broadcast against the neighbour arrays).
+    """
+    a, b, c, d, f, g, h, i = (
+        np.where(np.isnan(n), e, n) for n in (a, b, c, d, f, g, h, i)
+    )
+    dz_dx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * dx)
+    dz_dy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * dy)
+    # A nodata centre has no slope, even when all eight neighbours are valid
+    rise = np.where(np.isnan(e), np.nan, np.hypot(dz_dx, dz_dy) * z_factor)
+
+    if output_measurement == "DEGREE":
+        return np.degrees(np.arctan(rise))
+    return rise * 100.0
+
+
+def slope_from_array(
+    z: np.ndarray,
+    *,
+    dx: np.ndarray | float,
+    dy: np.ndarray | float,
+    z_factor: float = 1.0,
+    output_measurement: str = "PERCENT_RISE",
+) -> np.ndarray:
+    """Slope for the interior of a DEM array that carries a 1-cell halo.
+
+    ``z`` has shape ``(h + 2, w + 2)`` with nodata already set to NaN; the
+    result has shape ``(h, w)``.
+    """
+    return horn_slope(
+        z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:],
+        z[1:-1, :-2], z[1:-1, 1:-1], z[1:-1, 2:],
+        z[2:, :-2], z[2:, 1:-1], z[2:, 2:],
+        dx=dx, dy=dy, z_factor=z_factor, output_measurement=output_measurement,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Cell sizes
+# ---------------------------------------------------------------------------
+
+def _dataset_srs(ds: Any) -> Any:
+    wkt = ds.GetProjection()
+    if not wkt or osr is None:
+        return None
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(wkt)
+    return srs
+
+
+def ground_cell_sizes(
+    ds: Any,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    *,
+    method: str = "PLANAR",
+) -> tuple[np.ndarray | float, np.ndarray | float]:
+    """Ground (metre) cell sizes for the given pixel rows/columns.
+
+    - PLANAR: the geotransform cell size as-is (projected DEMs in metres).
+    - GEODESIC, geographic CRS: degrees -> metres on the WGS84 ellipsoid at
+      each cell's latitude.
+    - GEODESIC, Transverse Mercator (UTM): grid distances divided by the
+      point scale factor at each cell's easting.
+
+    ``rows``/``cols`` must broadcast against each other (e.g. a column vector
+    of rows and a row vector of columns).
+    """
+    gt = ds.GetGeoTransform()
+    dx, dy = abs(gt[1]), abs(gt[5])
+    if method == "PLANAR":
+        return dx, dy
+
+    srs = _dataset_srs(ds)
+    if srs is not None and srs.IsGeographic():
+        lat = np.radians(gt[3] + (np.asarray(rows) + 0.5) * gt[5])
+        w = 1.0 - _WGS84_E2 * np.sin(lat) ** 2
+        n_radius = _WGS84_A / np.sqrt(w)
+        m_radius = _WGS84_A * (1.0 - _WGS84_E2) / w ** 1.5
+        return (
+            np.radians(dx) * n_radius * np.cos(lat),
+            np.radians(dy) * m_radius,
+        )
+
+    if srs is not None and srs.GetAttrValue("PROJECTION") == "Transverse_Mercator":
+        k0 = srs.GetProjParm(osr.SRS_PP_SCALE_FACTOR, 1.0)
+        false_easting = srs.GetProjParm(osr.SRS_PP_FALSE_EASTING, 0.0)
+        easting = gt[0] + (np.asarray(cols) + 0.5) * gt[1] - false_easting
+        k = k0 * (1.0 + easting ** 2 / (2.0 * (k0 * _MEAN_EARTH_RADIUS) ** 2))
+        return dx / k, dy / k
+
+    # Other projections: no correction available, fall back to planar
+    return dx, dy
+
+
+# ---------------------------------------------------------------------------
+# Windowed reads
+# ---------------------------------------------------------------------------
+
+def read_window_with_halo(
+    band: Any,
+    xoff: int,
+    yoff: int,
+    width: int,
+    height: int,
+    *,
+    halo: int = 1,
+) -> np.ndarray:
+    """Read a window plus a halo as float64, NaN for nodata and off-raster cells."""
+    x0, y0 = xoff - halo, yoff - halo
+    x1, y1 = xoff + width + halo, yoff + height + halo
+    rx0, ry0 = max(x0, 0), max(y0, 0)
+    rx1, ry1 = min(x1, band.XSize), min(y1, band.YSize)
+
+    out = np.full((y1 - y0, x1 - x0), np.nan, dtype="float64")
+    block = band.ReadAsArray(rx0, ry0, rx1 - rx0, ry1 - ry0).astype("float64")
+    nodata = band.GetNoDataValue()
+    if nodata is not None:
+        block[block == nodata] = np.nan
+    out[ry0 - y0:ry1 - y0, rx0 - x0:rx1 - x0] = block
+    return out
+
+
+def _slope_kernel(
+    z: np.ndarray,
+    *,
+    dx: np.ndarray | float,
+    dy: np.ndarray | float,
+    output_measurement: str = "PERCENT_RISE",
+    z_unit: str = "METER",
+) -> np.ndarray:
+    _check_slope_args(output_measurement, "PLANAR", z_unit)
+    return slope_from_array(
+        z, dx=dx, dy=dy,
+        z_factor=Z_UNIT_FACTORS[z_unit],
+        output_measurement=output_measurement,
+    )
+
+
+# Derivative name -> (kernel, halo). Kernels take a halo-padded float64 DEM
+# window (NaN = nodata) plus ground cell sizes and return the interior.
+# Register new derivatives (aspect, curvature, ...) here.
+DERIVATIVES: dict[str, tuple[Callable[..., np.ndarray], int]] = {
+    "slope": (_slope_kernel, 1),
+}
+
+
+def derivative_tile(
+    ds: Any,
+    xoff: int,
+    yoff: int,
+    width: int,
+    height: int,
+    *,
+    derivative: str = "slope",
+    method: str = "PLANAR",
+    **params: Any,
+) -> np.ndarray:
+    """Compute a DEM derivative for one output window of an open dataset (NaN = nodata)."""
+    kernel, halo = DERIVATIVES[derivative]
+    z = read_window_with_halo(ds.GetRasterBand(1), xoff, yoff, width, height, halo=halo)
+    rows = np.arange(yoff, yoff + height)[:, None]
+    cols = np.arange(xoff, xoff + width)[None, :]
+    dx, dy = ground_cell_sizes(ds, rows, cols, method=method)
+    return kernel(z, dx=dx, dy=dy, **params)
+
+
+def iter_tiles(xsize: int, ysize: int, tile_size: int):
+    """Yield ``(xoff, yoff, width, height)`` windows covering a raster."""
+    for yoff in range(0, ysize, tile_size):
+        for xoff in range(0, xsize, tile_size):
+            yield xoff, yoff, min(tile_size, xsize - xoff), min(tile_size, ysize - yoff)
+
+
+# ---------------------------------------------------------------------------
+# Tiled, multi-process processing
+# ---------------------------------------------------------------------------
+
+# Rough number of float64 tile-sized arrays alive at once inside a kernel
+# (halo window, 8 NaN-filled neighbours, gradients, output)
+_ARRAYS_PER_TILE = 14
+
+_WORKER_DS = None
+
+
+def tile_size_for_memory(max_worker_mb: float, *, halo: int = 1, block: int = 256) -> int:
+    """Largest square tile (multiple of ``block``) whose working set fits in ``max_worker_mb``."""
+    cells = max_worker_mb * 1024 ** 2 / (8 * _ARRAYS_PER_TILE)
+    edge = int(np.sqrt(cells)) - 2 * halo
+    return max(block, edge // block * block)
+
+
+def _init_tile_worker(in_raster: str) -> None:
+    global _WORKER_DS
+    _WORKER_DS = _open_dem(in_raster)
+
+
+def _run_tile(window: tuple[int, int, int, int], options: dict[str, Any]) -> tuple[int, int, np.ndarray]:
+    xoff, yoff, width, height = window
+    tile = derivative_tile(_WORKER_DS, xoff, yoff, width, height, **options)
+    return xoff, yoff, np.where(np.isnan(tile), SLOPE_NODATA, tile).astype("float32")
+
+
+def write_derivative_raster(
+    in_dem: str,
+    out_raster: str | Path,
+    *,
+    derivative: str = "slope",
+    method: str = "PLANAR",
+    tile_size: int | None = None,
+    max_workers: int | None = 1,
+    max_worker_mb: float = 512,
+    **params: Any,
+) -> str:
+    """Write a DEM derivative raster tile by tile, optionally in a process pool.
+
+    Each tile is read with the derivative's halo, so results are identical
+    to a whole-raster computation regardless of tiling. Workers each hold
+    their own read-only DEM handle and return finished tiles; the parent
+    process is the only writer. At most two tiles per worker are in flight,
+    so memory is bounded by ``max_workers * max_worker_mb`` plus the queue.
+
+    Parameters
+    ----------
+    derivative : str
+        Key in ``DERIVATIVES`` (e.g. "slope").
+    method : str
+        Cell size handling, "PLANAR" or "GEODESIC" (see ``ground_cell_sizes``).
+    tile_size : int | None
+        Tile edge in pixels; derived from ``max_worker_mb`` when None.
+    max_workers : int | None
+        1 processes tiles in this process; None uses all cores.
+    **params
+        Passed to the derivative kernel (e.g. output_measurement, z_unit).
+    """
+    if derivative not in DERIVATIVES:
+        raise ValueError(f"Unknown derivative '{derivative}'; expected one of {tuple(DERIVATIVES)}")
+    if method not in SLOPE_METHODS:
+        raise ValueError(f"method must be one of {SLOPE_METHODS}")
+
+    halo = DERIVATIVES[derivative][1]
+    if tile_size is None:
+        tile_size = tile_size_for_memory(max_worker_mb, halo=halo)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    ds = _open_dem(in_dem)
+    out_ds = create_output_like(ds, out_raster)
+    out_band = out_ds.GetRasterBand(1)
+    windows = list(iter_tiles(ds.RasterXSize, ds.RasterYSize, tile_size))
+    options = {"derivative": derivative, "method": method, **params}
+
+    if max_workers <= 1 or len(windows) <= 1:
+        global _WORKER_DS
+        _WORKER_DS = ds
+        try:
+            for window in windows:
+                xoff, yoff, tile = _run_tile(window, options)
+                out_band.WriteArray(tile, xoff, yoff)
+        finally:
+            _WORKER_DS = None
+    else:
+        ensure_importable()
+        pending = iter(windows)
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_tile_worker,
+            initargs=(str(in_dem),),
+        ) as pool:
+            in_flight = set()
+            for window in pending:
+                in_flight.add(pool.submit(_run_tile, window, options))
+                if len(in_flight) >= 2 * max_workers:
+                    break
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    xoff, yoff, tile = fut.result()
+                    out_band.WriteArray(tile, xoff, yoff)
+                    nxt = next(pending, None)
+                    if nxt is not None:
+                        in_flight.add(pool.submit(_run_tile, nxt, options))
+
+    out_band.FlushCache()
+    out_band = None
+    out_ds = None
+    ds = None
+    build_overviews(out_raster, resampling="AVERAGE")
+    return str(out_raster)
+
+
+# ---------------------------------------------------------------------------
+# Public entry points
+# ---------------------------------------------------------------------------
+
+def _open_dem(in_dem: str) -> Any:
+    if gdal is None:
+        raise ImportError("GDAL (osgeo) is required for the NumPy slope engine.")
+    ds = gdal.Open(str(in_dem))
+    if ds is None:
+        raise FileNotFoundError(f"Could not open DEM raster: {in_dem}")
+    return ds
+
+
+def create_output_like(
+    ds: Any,
+    out_path: str | Path,
+    *,
+    nodata: float = SLOPE_NODATA,
+    creation_options: list[str] | None = None,
+) -> Any:
+    """Create a single-band float32 GeoTIFF on the same grid as ``ds``."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    driver = gdal.GetDriverByName("GTiff")
+    out_ds = driver.Create(
+        str(out_path),
+        ds.RasterXSize,
+        ds.RasterYSize,
+        1,
+        gdal.GDT_Float32,
+        options=creation_options or GTIFF_CREATION_OPTIONS,
+    )
+    out_ds.SetGeoTransform(ds.GetGeoTransform())
+    out_ds.SetProjection(ds.GetProjection())
+    out_ds.GetRasterBand(1).SetNoDataValue(nodata)
+    return out_ds
+
+
+def write_slope_raster(
+    in_dem: str,
+    out_slope: str | Path,
+    *,
+    output_measurement: str = "PERCENT_RISE",
+    method: str = "GEODESIC",
+    z_unit: str = "METER",
+    tile_size: int | None = None,
+    max_workers: int | None = 1,
+    max_worker_mb: float = 512,
+) -> str:
+    """Write a slope raster for a whole DEM, one tile at a time.
+
+    Memory is bounded by a single ``(tile_size + 2)^2`` window per worker
+    regardless of DEM size; with ``tile_size=None`` the tile is sized to
+    fit ``max_worker_mb``. Output is a tiled, compressed float32 GeoTIFF
+    with overviews and nodata set to ``SLOPE_NODATA``. Set ``max_workers``
+    > 1 (or None for all cores) to process tiles in a process pool.
+    """
+    _check_slope_args(output_measurement, method, z_unit)
+    return write_derivative_raster(
+        in_dem,
+        out_slope,
+        derivative="slope",
+        method=method,
+        tile_size=tile_size,
+        max_workers=max_workers,
+        max_worker_mb=max_worker_mb,
+        output_measurement=output_measurement,
+        z_unit=z_unit,
+    )
+
+
+def slope_at_points(
+    in_dem: str,
+    x: np.ndarray,
+    y: np.ndarray,
+    *,
+    output_measurement: str = "PERCENT_RISE",
+    method: str = "GEODESIC",
+    z_unit: str = "METER",
+) -> tuple[np.ndarray, np.ndarray]:
+    """Slope at point locations without materialising a slope raster.
+
+    Gathers the 3x3 DEM neighbourhood around each point's cell in one
+    block-batched read and applies the same Horn kernel as
+    ``write_slope_raster``, so values match the full-raster output.
+
+    Returns
+    -------
+    values : np.ndarray
+        Slope values; NaN for nodata cells and out-of-bounds points.
+    in_bounds : np.ndarray
+        Boolean mask of points that fell inside the DEM.
+    """
+    _check_slope_args(output_measurement, method, z_unit)
+
+    ds = _open_dem(in_dem)
+    band = ds.GetRasterBand(1)
+    px, py = world_to_pixel(x, y, ds.GetGeoTransform())
+    in_bounds = in_bounds_mask(px, py, ds.RasterXSize, ds.RasterYSize)
+
+    values = np.full(px.size, np.nan, dtype="float64")
+    cx, cy = px[in_bounds], py[in_bounds]
+    if cx.size:
+        off_y, off_x = np.mgrid[-1:2, -1:2]
+        win = gather_band(band, cx[:, None] + off_x.ravel(), cy[:, None] + off_y.ravel())
+        nodata = band.GetNoDataValue()
+        if nodata is not None:
+            win[win == nodata] = np.nan
+
+        dx, dy = ground_cell_sizes(ds, cy, cx, method=method)
+        values[in_bounds] = horn_slope(
+            *(win[:, k] for k in range(9)),
+            dx=dx, dy=dy,
+            z_factor=Z_UNIT_FACTORS[z_unit],
+            output_measurement=output_measurement,
+        )
+
+    band = None
+    ds = None
+    return values, in_bounds
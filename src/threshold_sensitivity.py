@@ -0,0 +1,231 @@
+"""
+src/threshold_sensitivity.py
+Threshold sensitivity curves for the logic model (MPAT + rules > pass/exclusion/endpoint counts per threshold value).
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from build_logic_model import OPERATORS, evaluate_criteria, field_values, resolve_endpoints
+
+
+# Which side of a swept threshold t passes, for values below / equal to / above t
+OPERATOR_SEGMENTS = {
+    ">=": (False, True, True),
+    ">": (False, False, True),
+    "<=": (True, True, False),
+    "<": (True, False, False),
+    "==": (False, True, False),
+    "= =": (False, True, False),
+}
+
+
+# ---------------------------------------------------------------------------
+# Pre-sorted criterion fields
+# ---------------------------------------------------------------------------
+
+def prepare_sensitivity(df: pd.DataFrame, compiled: dict[str, Any]) -> dict[str, Any]:
+    """Sort every numeric criterion field once and evaluate the configured rules once.
+
+    Returns a dict reused by every curve query:
+      - ``fields``: per value source (MPAT column or derived expression),
+        ``values`` (float64, NaN where missing), ``order`` (row positions of
+        the valid values in ascending order) and ``sorted`` (those values)
+      - ``source``: criterion id > key into ``fields``
+      - ``passed`` / ``known``: packed criterion masks at the configured thresholds
+    Criteria compared against a literal string (e.g. ``sfha_tf == "T"``)
+    have no numeric field and cannot be swept.
+    """
+    cache: dict[Any, Any] = {}
+    fields = {}
+    source = {}
+    for c in compiled["criteria"]:
+        if isinstance(c["value"], str):
+            continue
+        # Force the numeric path, including for unresolved (VERIFY) thresholds
+        values, valid = field_values(df, {**c, "value": 0.0}, cache)
+        key = ("col", c["field"]) if c["field"] in df.columns else c["derived"]
+        if key not in fields:
+            order = np.flatnonzero(valid)
+            order = order[np.argsort(values[order], kind="stable")]
+            fields[key] = {"values": values, "order": order, "sorted": values[order]}
+        source[c["id"]] = key
+
+    passed, known = evaluate_criteria(df, compiled)
+    return {
+        "compiled": compiled,
+        "n": len(df),
+        "fields": fields,
+        "source": source,
+        "passed": passed,
+        "known": known,
+    }
+
+
+def _sweep_field(prep: dict[str, Any], criterion_id: str) -> dict[str, np.ndarray]:
+    if criterion_id not in prep["source"]:
+        raise ValueError(f"Criterion '{criterion_id}' has no numeric field to sweep")
+    return prep["fields"][prep["source"][criterion_id]]
+
+
+def threshold_criteria(compiled: dict[str, Any], threshold_id: str) -> list[int]:
+    """Positions of the criteria that compare against ``threshold_id``."""
+    idx = [i for i, c in enumerate(compiled["criteria"]) if c["threshold"] == threshold_id]
+    if not idx:
+        raise KeyError(f"No criterion uses threshold '{threshold_id}'")
+    return idx
+
+
+def threshold_grid(prep: dict[str, Any], threshold_id: str, *, num: int = 200) -> np.ndarray:
+    """``num`` evenly spaced values spanning the fields compared against ``threshold_id``.
+
+    The configured value (when numeric) is always included.
+    """
+    compiled = prep["compiled"]
+    idx = threshold_criteria(compiled, threshold_id)
+    spans = [_sweep_field(prep, compiled["criteria"][i]["id"])["sorted"] for i in idx]
+    spans = [s for s in spans if s.size]
+    if not spans:
+        return np.array([], dtype="float64")
+    lo = min(float(s[0]) for s in spans)
+    hi = max(float(s[-1]) for s in spans)
+    grid = np.linspace(lo, hi, num)
+    current = compiled["criteria"][idx[0]]["value"]
+    if isinstance(current, float):
+        grid = np.union1d(grid, [current])
+    return grid
+
+
+# ---------------------------------------------------------------------------
+# Per-criterion pass counts
+# ---------------------------------------------------------------------------
+
+def pass_counts(sorted_values: np.ndarray, op: str, thresholds: Any) -> np.ndarray:
+    """Number of ``sorted_values`` passing ``value <op> t`` for every t, via ``searchsorted``."""
+    t = np.asarray(thresholds, dtype="float64")
+    below = np.searchsorted(sorted_values, t, side="left")
+    not_above = np.searchsorted(sorted_values, t, side="right")
+    n = sorted_values.size
+    if op == ">=":
+        return n - below
+    if op == ">":
+        return n - not_above
+    if op == "<=":
+        return not_above
+    if op == "<":
+        return below
+    if op in ("==", "= ="):
+        return not_above - below
+    raise ValueError(f"Unknown operator '{op}'")
+
+
+def threshold_pass_curves(prep: dict[str, Any], threshold_id: str, values: Any) -> pd.DataFrame:
+    """Parcels passing / failing / unknown for each criterion on ``threshold_id`` at each value.
+
+    ``failed`` is the count a requirement would exclude when used in
+    ``excludes_when`` (known and failing); a condition (``==``) excludes
+    the ``passed`` parcels instead (see ``build_logic_model.compile_rules``).
+    ``unknown`` parcels have no value for the field and are never excluded.
+    Long format: one row per (criterion, threshold value).
+    """
+    compiled = prep["compiled"]
+    values = np.asarray(values, dtype="float64")
+    frames = []
+    for i in threshold_criteria(compiled, threshold_id):
+        c = compiled["criteria"][i]
+        field = _sweep_field(prep, c["id"])
+        passed = pass_counts(field["sorted"], c["op"], values)
+        n_valid = field["sorted"].size
+        frames.append(pd.DataFrame({
+            "criterion": c["id"],
+            "threshold": values,
+            "passed": passed,
+            "failed": n_valid - passed,
+            "unknown": prep["n"] - n_valid,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------------------------------------------------------------------------
+# Joint endpoint availability
+# ---------------------------------------------------------------------------
+
+def _bit_counts(masks: np.ndarray, n_bits: int) -> np.ndarray:
+    return np.array([int(((masks >> e) & 1).sum()) for e in range(n_bits)], dtype="int64")
+
+
+def endpoint_availability_curve(
+    prep: dict[str, Any],
+    threshold_id: str,
+    values: Any,
+    *,
+    kind: str = "shown",
+) -> pd.DataFrame:
+    """Parcels with each endpoint ``kind`` (shown/eligible/flagged/preferred) as ``threshold_id`` varies.
+
+    All other thresholds stay at their configured values. When every
+    criterion on the threshold reads the same field (e.g. ``gw_min_ft`` >
+    ``depth_to_wt_ft``), each parcel's outcome only depends on whether its
+    value is below, equal to or above t. The endpoints are then resolved
+    once per segment over the pre-sorted parcels and every t is answered
+    from cumulative sums at its ``searchsorted`` bounds. Criteria on
+    different fields fall back to resolving the endpoints once per value.
+    Returns one row per value, one column per endpoint id.
+    """
+    compiled = prep["compiled"]
+    endpoint_ids = compiled["endpoint_ids"]
+    n_e = len(endpoint_ids)
+    values = np.asarray(values, dtype="float64")
+    idx = threshold_criteria(compiled, threshold_id)
+    crits = [compiled["criteria"][i] for i in idx]
+    fields = [_sweep_field(prep, c["id"]) for c in crits]
+
+    swept = sum(1 << i for i in idx)
+    base_pass = prep["passed"] & ~swept
+    base_known = prep["known"] & ~swept
+
+    if len({prep["source"][c["id"]] for c in crits}) == 1:
+        field = fields[0]
+        rows = field["order"]
+        n_valid = rows.size
+
+        # Parcels without a value: the swept criteria stay unknown at every t
+        missing = np.ones(prep["n"], dtype=bool)
+        missing[rows] = False
+        const = _bit_counts(
+            resolve_endpoints(base_pass[missing], base_known[missing], compiled)[kind], n_e
+        )
+
+        segment_masks = []
+        for seg in range(3):
+            seg_pass = sum(1 << i for i, c in zip(idx, crits) if OPERATOR_SEGMENTS[c["op"]][seg])
+            segment_masks.append(
+                resolve_endpoints(base_pass[rows] | seg_pass, base_known[rows] | swept, compiled)[kind]
+            )
+
+        lo = np.searchsorted(field["sorted"], values, side="left")
+        hi = np.searchsorted(field["sorted"], values, side="right")
+        counts = np.empty((values.size, n_e), dtype="int64")
+        for e in range(n_e):
+            below, equal, above = (
+                np.concatenate([[0], np.cumsum((m >> e) & 1)]) for m in segment_masks
+            )
+            counts[:, e] = below[lo] + (equal[hi] - equal[lo]) + (above[n_valid] - above[hi]) + const[e]
+    else:
+        counts = np.empty((values.size, n_e), dtype="int64")
+        for j, t in enumerate(values):
+            passed = base_pass.copy()
+            known = base_known.copy()
+            for i, c, field in zip(idx, crits, fields):
+                valid = ~np.isnan(field["values"])
+                with np.errstate(invalid="ignore"):
+                    ok = np.asarray(OPERATORS[c["op"]](field["values"], t), dtype=bool) & valid
+                passed |= ok.astype("int64") << i
+                known |= valid.astype("int64") << i
+            counts[j] = _bit_counts(resolve_endpoints(passed, known, compiled)[kind], n_e)
+
+    return pd.DataFrame(counts, columns=endpoint_ids).assign(threshold=values).set_index("threshold")
@@ -0,0 +1,16 @@
+"""
+src/workers.py
+Shared helpers for the process-pool stages (tiled terrain, partitioned MPAT build, prep job graph, scenario sweep).
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+
+def ensure_importable() -> None:
+    """Put ``src/`` on ``sys.path`` so spawned worker processes can import its modules (Windows, notebooks)."""
+    src_dir = str(Path(__file__).resolve().parent)
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
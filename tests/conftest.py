@@ -0,0 +1,92 @@
+"""
+tests/conftest.py
+Shared fixtures: src/ on sys.path (the notebooks %run the modules the same way) and in-memory GDAL bands/rasters.
+"""
+
+from __future__ import annotations
+
+import sys
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+CONFIG_DIR = Path(__file__).resolve().parents[1] / "config" / "baseline"
+
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+
+class ArrayBand:
+    """The part of ``gdal.Band`` the sampling code uses, backed by a NumPy array.
+
+    Counts ``ReadAsArray`` calls so tests can check that each block is read once.
+    """
+
+    def __init__(self, array: np.ndarray, block_size: tuple[int, int] = (4, 4), nodata: float | None = None):
+        self.array = np.asarray(array, dtype="float64")
+        self.YSize, self.XSize = self.array.shape
+        self.block_size = block_size
+        self.nodata = nodata
+        self.reads = 0
+
+    def GetBlockSize(self) -> list[int]:
+        return list(self.block_size)
+
+    def GetNoDataValue(self) -> float | None:
+        return self.nodata
+
+    def ReadAsArray(self, xoff: int, yoff: int, win_x: int, win_y: int) -> np.ndarray:
+        self.reads += 1
+        assert 0 <= xoff and xoff + win_x <= self.XSize
+        assert 0 <= yoff and yoff + win_y <= self.YSize
+        return self.array[yoff:yoff + win_y, xoff:xoff + win_x].copy()
+
+    def GetOverviewCount(self) -> int:
+        return 0
+
+
+class ArrayDataset:
+    """The part of ``gdal.Dataset`` the sampling code uses: one ``ArrayBand`` on a geotransform.
+
+    Reports the prepared-raster layout (tiled, compressed) so layout checks stay quiet.
+    """
+
+    def __init__(self, band: ArrayBand, geotransform: tuple[float, ...]):
+        self.band = band
+        self.geotransform = geotransform
+        self.RasterXSize = band.XSize
+        self.RasterYSize = band.YSize
+
+    def GetGeoTransform(self) -> tuple[float, ...]:
+        return self.geotransform
+
+    def GetRasterBand(self, index: int) -> ArrayBand:
+        assert index == 1
+        return self.band
+
+    def GetMetadataItem(self, key: str, domain: str = "") -> str | None:
+        return "DEFLATE" if key == "COMPRESSION" else None
+
+    def GetDescription(self) -> str:
+        return "<array>"
+
+
+@pytest.fixture
+def fake_rasters(monkeypatch) -> dict[str, ArrayDataset]:
+    """Path > ``ArrayDataset`` registry served by ``gdal.Open`` in build_mpat and raster_sampling."""
+    import build_mpat
+    import raster_sampling
+
+    rasters: dict[str, ArrayDataset] = {}
+    fake_gdal = types.SimpleNamespace(Open=lambda path, *args: rasters.get(str(path)))
+    monkeypatch.setattr(build_mpat, "gdal", fake_gdal)
+    monkeypatch.setattr(raster_sampling, "gdal", fake_gdal)
+    return rasters
+
+
+@pytest.fixture
+def config_dir() -> Path:
+    return CONFIG_DIR
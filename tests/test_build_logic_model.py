@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import operator
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_logic_model import (
+    compile_expression,
+    compile_rules,
+    decode_bits,
+    evaluate_expression,
+    evaluate_rules,
+    load_rules_config,
+)
+
+REFERENCE_OPS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    "= =": operator.eq,
+}
+
+
+def synthetic_mpat(n: int = 400, seed: int = 0) -> pd.DataFrame:
+    """Baseline MPAT columns with values around the thresholds and ~10% missing."""
+    rng = np.random.default_rng(seed)
+
+    def column(values):
+        values = np.asarray(values, dtype="float64")
+        values[rng.random(n) < 0.1] = np.nan
+        return values
+
+    sfha = rng.choice(np.array(["T", "F"], dtype=object), n, p=[0.2, 0.8])
+    sfha[rng.random(n) < 0.1] = None
+    return pd.DataFrame({
+        "tmk": np.arange(n),
+        "depth_to_wt_ft": column(rng.choice([0.5, 2.9, 3.0, 3.1, 40.0], n)),
+        "slope_pct": column(rng.uniform(0, 25, n)),
+        "dist_to_mun_well_ft": column(rng.uniform(0, 3000, n)),
+        "dist_to_dom_well_ft": column(rng.uniform(0, 3000, n)),
+        "dist_to_coast_ft": column(rng.uniform(0, 400, n)),
+        "dist_to_streams_ft": column(rng.uniform(0, 600, n)),
+        "dist_to_sma_ft": column(rng.choice([0.0, 10.0, 5000.0], n)),
+        "net_parcel_area_sqft": column(rng.choice([5000.0, 10000.0, 15000.0, 25000.0], n)),
+        "ksat_r": column(rng.uniform(1, 1000, n)),
+        "sfha_tf": sfha,
+    })
+
+
+def reference_rules(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+    """Row-by-row restatement of the rules (slow, obviously correct)."""
+    criteria = config["criteria"]
+    thresholds = config["thresholds"]
+    endpoints = config["endpoints"]
+    compiled = compile_rules(config)
+    derived = {c["id"]: c["derived"] for c in compiled["criteria"]}
+    values = {c["id"]: c["value"] for c in compiled["criteria"]}
+
+    rows = []
+    for _, row in df.iterrows():
+        status = {}
+        for cid, c in criteria.items():
+            if values[cid] is None:
+                status[cid] = None
+                continue
+            if c["field"] in df.columns:
+                v = row[c["field"]]
+            else:
+                v = evaluate_expression(row.to_frame().T, derived[cid], {})[0]
+            if v is None or (isinstance(v, float) and np.isnan(v)):
+                status[cid] = None
+            else:
+                status[cid] = bool(REFERENCE_OPS[c["operator"].strip()](v, values[cid]))
+
+        # Equality criteria are conditions (act when true), the rest requirements (act when false)
+        acts = {
+            cid: status[cid] is (criteria[cid]["operator"].strip() in ("==", "= ="))
+            for cid in criteria
+        }
+        out = {}
+        for eid, rules in endpoints.items():
+            excl = rules.get("excludes_when") or []
+            trig = rules.get("triggers_when") or []
+            eligible = not any(acts[c] for c in excl)
+            out[eid] = {
+                "eligible": eligible,
+                "shown": eligible and all(status[c] is True for c in trig),
+                "flagged": any(acts[c] for c in rules.get("flags_when") or []),
+                "preferred": any(status[c] is True for c in rules.get("prefers_when") or []),
+            }
+        last_resort = [e for e, r in endpoints.items() if r.get("pass2_rule") == "last_resort"]
+        if any(out[e]["shown"] for e in endpoints if e not in last_resort):
+            for e in last_resort:
+                out[e]["shown"] = False
+        rows.append(out)
+    assert thresholds  # the reference reads the same config the engine compiles
+    return rows
+
+
+def test_bitmask_engine_matches_row_by_row_reference(config_dir):
+    config = load_rules_config(config_dir)
+    compiled = compile_rules(config)
+    df = synthetic_mpat()
+
+    result = evaluate_rules(df, compiled)
+    expected = reference_rules(df, config)
+
+    for kind in ("eligible", "shown", "flagged", "preferred"):
+        for e, eid in enumerate(compiled["endpoint_ids"]):
+            got = ((result[f"endpoints_{kind}"].to_numpy() >> e) & 1).astype(bool)
+            want = np.array([row[eid][kind] for row in expected])
+            assert np.array_equal(got, want), f"{kind} differs for {eid}"
+
+
+def test_unresolved_thresholds_stay_unknown(config_dir):
+    compiled = compile_rules(load_rules_config(config_dir))
+    result = evaluate_rules(synthetic_mpat(50), compiled)
+    for cid in compiled["unresolved"]:
+        bit = 1 << compiled["criteria_ids"].index(cid)
+        assert not (result["criteria_known"].to_numpy() & bit).any()
+        assert not (result["criteria_pass"].to_numpy() & bit).any()
+
+
+def test_decode_bits():
+    names = ["E01", "E02", "E03"]
+    assert decode_bits([0, 1, 5, 7], names).tolist() == ["", "E01", "E01;E03", "E01;E02;E03"]
+
+
+@pytest.mark.parametrize("a, b", [
+    ("min(a, b)", "df[['a', 'b']].min(axis=1)"),
+    ("423.33 / ksat_r", "423.33/df['ksat_r']"),
+])
+def test_equivalent_spellings_compile_to_one_node(a, b):
+    assert compile_expression(a) == compile_expression(b)
+
+
+def test_expressions_evaluate_columnwise_and_skip_nan_like_pandas():
+    df = pd.DataFrame({"a": [1.0, np.nan, 5.0, np.nan], "b": [2.0, 3.0, np.nan, np.nan]})
+    node = compile_expression("df[['a', 'b']].min(axis=1)")
+    out = evaluate_expression(df, node, {})
+    assert np.array_equal(out, df[["a", "b"]].min(axis=1).to_numpy(), equal_nan=True)
+
+    out = evaluate_expression(df, compile_expression("-a * 2 + sqrt(b) ** 2"), {})
+    assert np.allclose(out, -df["a"] * 2 + df["b"], equal_nan=True)
+
+
+@pytest.mark.parametrize("expr", [
+    "__import__('os').system('true')",
+    "a.__class__",
+    "open('x')",
+    "df.a",
+    "[a for a in b]",
+    "lambda: 1",
+    "a if b else c",
+    "'text'",
+    "min(a, b, key=abs)",
+    "df[['a']].min(axis=0)",
+    "_private",
+    "a +",
+])
+def test_compiler_rejects_anything_outside_the_whitelist(expr):
+    with pytest.raises(ValueError):
+        compile_expression(expr)
+
+
+def test_sfha_flag_rate_matches_the_parcels_in_the_flood_zone(config_dir):
+    compiled = compile_rules(load_rules_config(config_dir))
+    n = 1000
+    sfha = np.full(n, "F", dtype=object)
+    in_sfha = np.random.default_rng(4).choice(np.arange(1, n), 16, replace=False)
+    sfha[in_sfha] = "T"
+    sfha[0] = None  # unknown flood zone: never flagged
+    df = pd.DataFrame({"tmk": np.arange(n), "sfha_tf": sfha})
+    for col in synthetic_mpat(1).columns.drop(["tmk", "sfha_tf"]):
+        df[col] = np.nan
+
+    result = evaluate_rules(df, compiled)
+    e01 = compiled["endpoint_ids"].index("E01")
+    flagged = ((result["endpoints_flagged"].to_numpy() >> e01) & 1).astype(bool)
+
+    assert flagged.sum() == 16 and flagged.mean() == 0.016
+    assert np.array_equal(np.flatnonzero(flagged), np.sort(in_sfha))
+    assert decode_bits(result["endpoints_flagged"], compiled["endpoint_ids"])[in_sfha[0]].startswith("E01")
+
+
+def test_lot_size_flag_fires_for_small_lots_only(config_dir):
+    compiled = compile_rules(load_rules_config(config_dir))
+    df = synthetic_mpat(4).assign(
+        net_parcel_area_sqft=[5000.0, 9999.0, 10000.0, 25000.0],
+        ksat_r=[20.0] * 4,
+        sfha_tf=["F"] * 4,
+    )
+    result = evaluate_rules(df, compiled)
+    e01 = compiled["endpoint_ids"].index("E01")
+    flagged = ((result["endpoints_flagged"].to_numpy() >> e01) & 1).astype(bool)
+    assert flagged.tolist() == [True, True, False, False]
+
+
+def test_condition_criteria_exclude_where_they_hold(config_dir):
+    config = load_rules_config(config_dir)
+    config["endpoints"] = {"E99": {"excludes_when": ["SMA_STD_CONDITIONAL", "GW_MIN"]}}
+    compiled = compile_rules(config)
+    assert compiled["conditions"] == sum(
+        1 << i for i, cid in enumerate(compiled["criteria_ids"]) if config["criteria"][cid]["operator"] == "=="
+    )
+
+    df = synthetic_mpat(4).assign(
+        dist_to_sma_ft=[0.0, 120.0, np.nan, 120.0],
+        depth_to_wt_ft=[10.0, 10.0, 10.0, 1.0],
+    )
+    eligible = evaluate_rules(df, compiled)["endpoints_eligible"].to_numpy() & 1
+    # Inside the SMA (condition holds) or too shallow (requirement fails) excludes; unknown never does
+    assert eligible.tolist() == [0, 1, 1, 0]
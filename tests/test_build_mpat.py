@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+import build_mpat
+from build_mpat import extract_rast_stack, extract_rast_vals, max_setback_ft, read_point_coords, setback_radius_ft
+from conftest import ArrayBand, ArrayDataset
+
+
+def test_setback_radius_is_the_largest_threshold_on_the_field(config_dir):
+    thresholds = config_dir / "thresholds.yaml"
+    assert setback_radius_ft(thresholds, "dist_to_dom_well_ft") == 1000.0
+    assert setback_radius_ft(thresholds, "dist_to_mun_well_ft") == 1000.0
+    assert setback_radius_ft(thresholds, "dist_to_streams_ft") == 300.0
+    assert setback_radius_ft(thresholds, "dist_to_sma_ft") == 0.0
+    assert setback_radius_ft(thresholds, "not_a_field") is None
+    assert max_setback_ft(thresholds) == 1000.0
+
+
+def test_raster_stack_matches_per_raster_extraction_and_keeps_every_point(fake_rasters):
+    # 10 m and 25 m grids with different origins; -9999 is nodata in the water table
+    rain = np.arange(20 * 20, dtype="float64").reshape(20, 20)
+    wt = np.arange(6 * 6, dtype="float64").reshape(6, 6) / 10
+    wt[1, 2] = -9999.0
+    fake_rasters["rain.tif"] = ArrayDataset(ArrayBand(rain, nodata=-9999.0), (1000.0, 10.0, 0.0, 2200.0, 0.0, -10.0))
+    fake_rasters["wt.tif"] = ArrayDataset(ArrayBand(wt, nodata=-9999.0), (1005.0, 25.0, 0.0, 2195.0, 0.0, -25.0))
+
+    # Inside both, wt nodata cell, outside wt only, outside both
+    xs = np.array([1051.0, 1060.0, 1190.0, 900.0])
+    ys = np.array([2151.0, 2160.0, 2010.0, 2100.0])
+    points = (np.array(["A", "B", "C", "D"], dtype=object), xs, ys)
+    conversions = {("m", "ft"): 3.28084}
+
+    stack = extract_rast_stack(
+        {"avg_rainfall_in": ("rain.tif", "in", "in"), "wt_elev_ft": ("wt.tif", "m", "ft")},
+        points,
+        unit_conversions=conversions,
+    )
+
+    assert stack["tmk"].tolist() == ["A", "B", "C", "D"]
+    for col, path, units in (("avg_rainfall_in", "rain.tif", ("in", "in")), ("wt_elev_ft", "wt.tif", ("m", "ft"))):
+        single = extract_rast_vals(
+            path, points, col, source_units=units[0], output_units=units[1], unit_conversions=conversions
+        )
+        expected = stack[["tmk"]].merge(single, on="tmk", how="left")[col]
+        np.testing.assert_array_equal(stack[col].to_numpy(), expected.to_numpy())
+
+    assert stack["avg_rainfall_in"].isna().tolist() == [False, False, False, True]
+    assert stack["wt_elev_ft"].isna().tolist() == [False, True, True, True]
+    assert stack.loc[0, "wt_elev_ft"] == pytest.approx(wt[1, 1] * 3.28084)
+
+
+def test_point_coords_from_a_geodataframe_or_arrays():
+    gpd = pytest.importorskip("geopandas")
+    points = gpd.GeoDataFrame(
+        {"TMK": ["A", "B"]}, geometry=gpd.points_from_xy([1.5, 3.0], [2.0, 4.5]), crs=32604
+    )
+
+    tmks, xs, ys = read_point_coords(points, tmk_field="TMK")
+    assert tmks.dtype == object and tmks.tolist() == ["A", "B"]
+    assert xs.tolist() == [1.5, 3.0] and ys.tolist() == [2.0, 4.5]
+
+    tmks, xs, ys = read_point_coords((["A", "B"], [1, 3], [2, 4]))
+    assert tmks.tolist() == ["A", "B"]
+    assert xs.dtype == "float64" and xs.tolist() == [1.0, 3.0] and ys.tolist() == [2.0, 4.0]
+
+
+def test_point_arrays_must_be_three_equal_length_arrays():
+    with pytest.raises(ValueError, match=r"\(tmk, x, y\)"):
+        read_point_coords((["A"], [1.0]))
+    with pytest.raises(ValueError, match="same length"):
+        read_point_coords((["A", "B"], [1.0, 2.0], [3.0]))
+
+
+def test_feature_class_paths_need_arcpy(monkeypatch):
+    monkeypatch.setattr(build_mpat, "arcpy", None)
+    with pytest.raises(ImportError, match="ArcPy is required"):
+        read_point_coords("analysis_points.gdb/points")
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import types
+
+import pytest
+
+import gdal_backend
+
+
+class FakeSRS:
+    """Stand-in for ``osr.SpatialReference`` with a scripted identity."""
+
+    def __init__(self, authority=None, code=None, matches=(), identify_error=False):
+        self.authority = authority
+        self.code = code
+        self.matches = list(matches)
+        self.identify_error = identify_error
+
+    def Clone(self):
+        return FakeSRS(self.authority, self.code, self.matches, self.identify_error)
+
+    def AutoIdentifyEPSG(self):
+        if self.identify_error:
+            raise RuntimeError("OGR Error: Unsupported SRS")
+
+    def GetAuthorityName(self, key):
+        return self.authority
+
+    def GetAuthorityCode(self, key):
+        return self.code
+
+    def FindMatches(self):
+        return self.matches
+
+    def ImportFromEPSG(self, epsg):
+        self.authority, self.code = "EPSG", str(epsg)
+
+    def IsSame(self, other, options=None):
+        return self.authority is not None and (self.authority, self.code) == (other.authority, other.code)
+
+
+@pytest.fixture
+def fake_osr(monkeypatch):
+    monkeypatch.setattr(gdal_backend, "osr", types.SimpleNamespace(SpatialReference=FakeSRS))
+
+
+def esri_prj(epsg, confidence=100):
+    """An ESRI .prj definition: no authority code, identify fails, FindMatches works."""
+    return FakeSRS(identify_error=True, matches=[(FakeSRS("EPSG", str(epsg)), confidence)])
+
+
+def test_esri_definitions_are_identified_through_find_matches(fake_osr):
+    assert gdal_backend.epsg_of_srs(FakeSRS("EPSG", "32604")) == 32604
+    assert gdal_backend.epsg_of_srs(esri_prj(32604)) == 32604
+    assert gdal_backend.epsg_of_srs(esri_prj(32604, confidence=50)) is None
+    assert gdal_backend.epsg_of_srs(FakeSRS(identify_error=True)) is None
+    assert gdal_backend.epsg_of_srs(None) is None
+
+
+def test_srs_matches_epsg(fake_osr):
+    assert gdal_backend.srs_matches_epsg(FakeSRS("EPSG", "32604"), 32604)
+    assert gdal_backend.srs_matches_epsg(esri_prj(32604), 32604)
+    assert not gdal_backend.srs_matches_epsg(esri_prj(4326), 32604)
+    assert not gdal_backend.srs_matches_epsg(None, 32604)
+
+
+def test_vector_layers_open_inside_gpkg_and_file_gdb_containers(tmp_path, monkeypatch):
+    opened = []
+
+    class FakeDataset:
+        def __init__(self, path):
+            self.path = path
+
+        def GetLayerByName(self, name):
+            return ("by_name", name)
+
+        def GetLayer(self, i):
+            return ("by_index", i)
+
+    def open_ex(path, flags):
+        opened.append(path)
+        return FakeDataset(path)
+
+    monkeypatch.setattr(gdal_backend, "gdal", types.SimpleNamespace(OpenEx=open_ex, OF_VECTOR=4))
+    gdb = tmp_path / "wells.gdb"
+    gdb.mkdir()
+    gpkg = tmp_path / "prepared.gpkg"
+    gpkg.write_bytes(b"")
+    shp = tmp_path / "wells.shp"
+    shp.write_bytes(b"")
+
+    assert gdal_backend._open_vector_layer(str(gdb / "wells_dom"))[1] == ("by_name", "wells_dom")
+    assert gdal_backend._open_vector_layer(str(gpkg / "streams"))[1] == ("by_name", "streams")
+    assert gdal_backend._open_vector_layer(str(shp))[1] == ("by_index", 0)
+    assert opened == [str(gdb), str(gpkg), str(shp)]
+
+
+class FakeGdal:
+    """Stand-in for ``osgeo.gdal`` that records whether exceptions were on for each call."""
+
+    OF_RASTER = 2
+
+    def __init__(self):
+        self.exceptions = False
+        self.calls = []
+
+    def ExceptionMgr(self):
+        fake = self
+
+        class Manager:
+            def __enter__(self):
+                self.previous, fake.exceptions = fake.exceptions, True
+
+            def __exit__(self, *exc):
+                fake.exceptions = self.previous
+
+        return Manager()
+
+    def OpenEx(self, path, flags):
+        self.calls.append(("OpenEx", self.exceptions))
+        return types.SimpleNamespace(GetSpatialRef=lambda: None)
+
+    def Translate(self, dest, src, **kwargs):
+        self.calls.append(("Translate", self.exceptions))
+        return types.SimpleNamespace(Close=lambda: self.calls.append(("Close", self.exceptions)))
+
+
+def test_gdal_exceptions_are_scoped_to_backend_calls(tmp_path, monkeypatch):
+    fake = FakeGdal()
+    monkeypatch.setattr(gdal_backend, "gdal", fake)
+
+    out = gdal_backend.define_projection_if_missing(raster_path="dem.tif", assumed_epsg=32604, temp_dir=tmp_path)
+
+    assert out == str(tmp_path / "dem_defined.vrt")
+    assert fake.calls == [("OpenEx", True), ("Translate", True), ("Close", True)]
+    assert not fake.exceptions
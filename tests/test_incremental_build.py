@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental_build import family_fingerprints, merge_incremental, plan_incremental_build, run_incremental_build
+from point_attributes import compute_point_attributes
+
+pytest.importorskip("pyogrio")
+
+
+# Local coordinates are offset onto Oahu (EPSG:32604), inside the island registry
+ORIGIN = (600000.0, 2360000.0)
+
+
+def _points(xy, tmks=None, origin=ORIGIN) -> gpd.GeoDataFrame:
+    xy = np.asarray(xy, dtype="float64").reshape(-1, 2) + origin
+    tmks = [f"T{i}" for i in range(len(xy))] if tmks is None else tmks
+    return gpd.GeoDataFrame({"tmk": tmks}, geometry=gpd.points_from_xy(xy[:, 0], xy[:, 1]), crs=32604)
+
+
+@pytest.fixture
+def wells_inputs(tmp_path):
+    inputs = {}
+    for key, xy in (("wells_dom", [(2000, 5000), (9500, 500)]), ("wells_mun", [(9000, 9000)])):
+        path = tmp_path / f"{key}.gpkg"
+        _points(xy).to_file(path, layer=key, driver="GPKG")
+        inputs[key] = str(path)
+    return inputs
+
+
+@pytest.fixture
+def ctx(tmp_path, config_dir):
+    return {
+        "thresholds_path": config_dir / "thresholds.yaml",
+        "ft_to_m": 0.3048,
+        "layer_cache_dir": tmp_path / "layer_cache",
+    }
+
+
+CORNERS = [(0, 0), (10000, 0), (0, 10000), (10000, 10000), (5000, 5000)]
+
+
+def test_incremental_build_matches_a_full_build(tmp_path, wells_inputs, ctx):
+    state_dir = tmp_path / "state" / "point_attributes"
+    run_incremental_build(_points(CORNERS), wells_inputs, ctx, state_dir, families=["wells"])
+
+    # A new point 3000 m from a well that lies well outside its own setback bbox
+    points = _points(CORNERS + [(2000, 8000)])
+    attributes, change_log = run_incremental_build(points, wells_inputs, ctx, state_dir, families=["wells"])
+    full = compute_point_attributes(points, wells_inputs, ctx, families=["wells"])
+
+    assert change_log["tmk"].tolist() == ["T5"]
+    assert attributes.loc[5, "dist_to_dom_well_ft"] == pytest.approx(3000 / 0.3048)
+    pd.testing.assert_frame_equal(attributes, full)
+
+
+def test_growing_the_build_extent_recomputes_only_the_new_point(tmp_path, wells_inputs, ctx):
+    state_dir = tmp_path / "state" / "point_attributes"
+    run_incremental_build(_points(CORNERS), wells_inputs, ctx, state_dir, families=["wells"])
+
+    points = _points(CORNERS + [(20000, 20000)])
+    attributes, change_log = run_incremental_build(points, wells_inputs, ctx, state_dir, families=["wells"])
+
+    assert change_log["tmk"].tolist() == ["T5"]
+    pd.testing.assert_frame_equal(attributes, compute_point_attributes(points, wells_inputs, ctx, families=["wells"]))
+
+
+def test_source_hashes_are_memoised_in_the_state_dir(tmp_path, wells_inputs, ctx):
+    state_dir = tmp_path / "state" / "point_attributes"
+    run_incremental_build(_points(CORNERS), wells_inputs, ctx, state_dir, families=["wells"])
+    run_incremental_build(_points(CORNERS), wells_inputs, ctx, state_dir, families=["wells"])
+
+    assert (state_dir / "source_hashes.json").exists()
+    assert not (state_dir.parent / "source_hashes.json").exists()
+
+
+def test_slope_fingerprint_follows_the_slope_raster_and_method(tmp_path, ctx):
+    dem, slope = tmp_path / "dem.tif", tmp_path / "slope.tif"
+    dem.write_bytes(b"dem")
+    slope.write_bytes(b"slope v1")
+    inputs = {"dem": str(dem)}
+
+    def fingerprint(**settings):
+        return family_fingerprints(inputs, {**ctx, **settings}, families=["slope"], hash_dir=tmp_path)["slope"]
+
+    from_dem = fingerprint()
+    v1 = fingerprint(slope_raster=str(slope))
+    assert v1 != from_dem
+    assert fingerprint(slope_method="PLANAR") != from_dem
+    assert fingerprint(slope_measurement="DEGREE") != from_dem
+
+    slope.write_bytes(b"slope v2, rebuilt")
+    assert fingerprint(slope_raster=str(slope)) != v1
+
+
+def test_merge_logs_reasons_and_changed_columns():
+    points = _points([(0, 0), (1, 1), (5, 5)], tmks=["A", "B", "C"], origin=(0, 0))
+    state = {
+        "points": pd.DataFrame({"tmk": ["A", "B", "D"], "x": [0.0, 0.0, 9.0], "y": [0.0, 0.0, 9.0]}),
+        "attributes": pd.DataFrame({"tmk": ["A", "B", "D"], "dist_to_sma_ft": [1.0, 2.0, 3.0]}),
+        "families": {"sma": "fp"},
+    }
+    plan = plan_incremental_build(points, {"sma": "fp"}, state)
+    assert plan["recompute"]["sma"].tolist() == ["B", "C"]
+
+    fresh = pd.DataFrame({"tmk": ["B", "C"], "dist_to_sma_ft": [2.0, 7.0]})
+    attributes, log = merge_incremental(plan, state, {"sma": fresh})
+
+    assert attributes["dist_to_sma_ft"].tolist() == [1.0, 2.0, 7.0]
+    assert log["reason"].tolist() == ["moved_point", "new_point", "removed_point"]
+    assert log["changed_columns"].tolist() == ["", "dist_to_sma_ft", ""]
+
+
+def test_a_family_subset_keeps_the_other_families(tmp_path, wells_inputs, ctx):
+    streams = tmp_path / "streams.gpkg"
+    gpd.GeoDataFrame(
+        {"name": ["S0"]}, geometry=gpd.GeoSeries.from_wkt(["LINESTRING (600000 2363000, 610000 2363000)"]), crs=32604,
+    ).to_file(streams, layer="streams", driver="GPKG")
+    inputs = {**wells_inputs, "streams": str(streams)}
+    state_dir = tmp_path / "state" / "point_attributes"
+    full, _ = run_incremental_build(_points(CORNERS), inputs, ctx, state_dir, families=["streams", "wells"])
+
+    attributes, change_log = run_incremental_build(_points(CORNERS), inputs, ctx, state_dir, families=["wells"])
+    assert change_log.empty
+    pd.testing.assert_frame_equal(attributes, full)
+
+    _, change_log = run_incremental_build(_points(CORNERS), inputs, ctx, state_dir, families=["streams", "wells"])
+    assert change_log.empty
+
+    # A point added by a subset build leaves the other family to recompute
+    points = _points(CORNERS + [(2000, 8000)])
+    attributes, _ = run_incremental_build(points, inputs, ctx, state_dir, families=["wells"])
+    assert list(attributes.columns) == list(full.columns)
+    assert np.isnan(attributes.loc[5, "dist_to_streams_ft"])
+    attributes, change_log = run_incremental_build(points, inputs, ctx, state_dir, families=["streams", "wells"])
+    assert set(change_log.loc[change_log["family"] == "streams", "tmk"]) == set(points["tmk"])
+    pd.testing.assert_frame_equal(
+        attributes, compute_point_attributes(points, inputs, ctx, families=["streams", "wells"])
+    )
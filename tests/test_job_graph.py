@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import types
+
+import pytest
+
+import prepare_input_layers as pil
+from prepare_input_layers import job_dependencies, job_levels, run_jobs
+
+
+def _job(func: str, **extra) -> dict:
+    return {"func": func, "kwargs": {}, "label": func, **extra}
+
+
+def test_job_levels_respect_dependencies():
+    jobs = {
+        "mosaic": _job("a"),
+        "dem": _job("b", input_from={"src_raster": "mosaic"}),
+        "wells": _job("c"),
+        "slope": _job("d", after=["dem"]),
+    }
+    levels = job_levels(jobs)
+    assert levels == [["mosaic", "wells"], ["dem"], ["slope"]]
+    assert job_dependencies(jobs)["dem"] == {"mosaic"}
+
+
+def test_unknown_dependency_and_cycles_are_rejected():
+    with pytest.raises(KeyError):
+        job_levels({"a": _job("a", after=["missing"])})
+    with pytest.raises(ValueError):
+        job_levels({"a": _job("a", after=["b"]), "b": _job("b", after=["a"])})
+
+
+def test_run_jobs_serial_threads_results_and_backend(monkeypatch):
+    calls = []
+
+    def make_mosaic(*, out, arcpy):
+        calls.append(("mosaic", arcpy.__name__))
+        return out
+
+    def prep(*, src_raster, name, arcpy):
+        calls.append(("prep", src_raster))
+        return f"{name}:{src_raster}"
+
+    def gdal_only(*, value):
+        calls.append(("gdal_only", value))
+        return value * 2
+
+    monkeypatch.setattr(pil, "_test_mosaic", make_mosaic, raising=False)
+    monkeypatch.setattr(pil, "_test_prep", prep, raising=False)
+    monkeypatch.setattr(pil, "_test_gdal_only", gdal_only, raising=False)
+    backend = types.ModuleType("fake_backend")
+
+    jobs = {
+        "prep": {"func": "_test_prep", "kwargs": {"name": "dem"}, "input_from": {"src_raster": "mosaic"},
+                 "label": "dem"},
+        "mosaic": {"func": "_test_mosaic", "kwargs": {"out": "dem.tif"}, "label": "mosaic"},
+        "side": {"func": "_test_gdal_only", "kwargs": {"value": 21}, "label": "side", "backend": False},
+    }
+    results = run_jobs(jobs, arcpy=backend, max_workers=1)
+
+    assert results == {"mosaic": "dem.tif", "side": 42, "prep": "dem:dem.tif"}
+    assert calls.index(("mosaic", "fake_backend")) < calls.index(("prep", "dem.tif"))
+
+
+def test_run_jobs_serial_stops_at_the_first_failure(monkeypatch):
+    ran = []
+
+    def boom(*, arcpy):
+        raise RuntimeError("boom")
+
+    def after(*, arcpy):
+        ran.append("after")
+
+    monkeypatch.setattr(pil, "_test_boom", boom, raising=False)
+    monkeypatch.setattr(pil, "_test_after", after, raising=False)
+    jobs = {"a": _job("_test_boom"), "b": _job("_test_after", after=["a"])}
+    with pytest.raises(RuntimeError, match="boom"):
+        run_jobs(jobs, arcpy=types.ModuleType("fake_backend"), max_workers=1)
+    assert ran == []
+
+
+def test_vector_jobs_project_through_their_own_scratch_gdb(tmp_path):
+    created = []
+
+    class Management:
+        def CreateFileGDB(self, folder, name):
+            created.append(name)
+
+        def Project(self, *, in_dataset, out_dataset, out_coor_system):
+            pass
+
+        def CreateSQLiteDatabase(self, path, kind):
+            pass
+
+        def Delete(self, path):
+            pass
+
+    arcpy = types.SimpleNamespace(
+        env=types.SimpleNamespace(),
+        management=Management(),
+        conversion=types.SimpleNamespace(FeatureClassToFeatureClass=lambda **kw: None),
+        Exists=lambda path: False,
+        Describe=lambda path: types.SimpleNamespace(spatialReference=types.SimpleNamespace(factoryCode=4326)),
+        SpatialReference=lambda epsg: epsg,
+    )
+    for layer in ("wells_dom", "wells_mun"):
+        pil.prep_vector_to_gpkg(
+            src_fc=f"{layer}.shp", out_gpkg=str(tmp_path / f"{layer}.gpkg"), out_layer=layer,
+            target_epsg=32604, temp_dir=tmp_path, arcpy=arcpy,
+        )
+    assert created == ["scratch_wells_dom.gdb", "scratch_wells_mun.gdb"]
+
+
+def test_parallel_workers_split_the_cores_between_gdal_jobs(monkeypatch):
+    monkeypatch.delenv("GDAL_NUM_THREADS", raising=False)
+    monkeypatch.setattr(pil.os, "cpu_count", lambda: 8)
+    assert [pil.threads_per_job(n) for n in (1, 2, 3, 16, None)] == [8, 4, 2, 1, 1]
+
+    jobs = {name: {"func": "gdal_num_threads", "kwargs": {}, "label": name, "backend": False} for name in "ab"}
+    results = run_jobs(jobs, arcpy=pil, max_workers=2)
+    assert results == {"a": "4", "b": "4"}
+
+
+def test_cog_options_follow_the_worker_thread_cap(monkeypatch):
+    from raster_sampling import cog_creation_options
+
+    monkeypatch.delenv("GDAL_NUM_THREADS", raising=False)
+    assert "NUM_THREADS=ALL_CPUS" in cog_creation_options()
+    monkeypatch.setenv("GDAL_NUM_THREADS", "3")
+    assert "NUM_THREADS=3" in cog_creation_options()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from layer_cache import read_prepared_layer, source_hash
+
+pytest.importorskip("pyogrio")
+
+
+def _write_layer(path, n: int = 5, offset: float = 0.0) -> None:
+    gpd.GeoDataFrame(
+        {"Name": [f"f{i}" for i in range(n)], "Value": np.arange(n)},
+        geometry=[shapely.box(i * 10 + offset, 0, i * 10 + 5 + offset, 5) for i in range(n)],
+        crs=32604,
+    ).to_file(path, layer="features", driver="GPKG")
+
+
+def _entries(cache_dir):
+    return sorted(p.name for p in cache_dir.iterdir() if p.is_dir())
+
+
+def test_cached_read_matches_a_direct_read(tmp_path):
+    gpkg, cache = tmp_path / "layer.gpkg", tmp_path / "cache"
+    _write_layer(gpkg)
+    kwargs = {"columns": ["name", "geometry"], "lowercase": True, "bbox": (0, 0, 22, 5)}
+    first = read_prepared_layer(gpkg, "features", cache_dir=cache, **kwargs)
+    again = read_prepared_layer(gpkg, "features", cache_dir=cache, **kwargs)
+    direct = read_prepared_layer(gpkg, "features", **kwargs)
+
+    assert first["name"].tolist() == ["f0", "f1", "f2"]
+    for gdf in (first, again):
+        assert list(gdf.columns) == list(direct.columns)
+        assert gdf.geometry.equals(direct.geometry)
+        assert gdf.crs == direct.crs
+
+
+def test_only_entries_for_old_file_contents_are_evicted(tmp_path):
+    gpkg, cache = tmp_path / "layer.gpkg", tmp_path / "cache"
+    _write_layer(gpkg)
+    read_prepared_layer(gpkg, "features", cache_dir=cache)
+    read_prepared_layer(gpkg, "features", columns=["geometry"], cache_dir=cache)
+    read_prepared_layer(gpkg, "features", bbox=(0, 0, 5, 5), cache_dir=cache)
+    assert len(_entries(cache)) == 3
+
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    _write_layer(other_dir / "layer.gpkg", n=2)
+    read_prepared_layer(other_dir / "layer.gpkg", "features", cache_dir=cache)
+    assert len(_entries(cache)) == 4
+
+    before = set(_entries(cache))
+    gpkg.unlink()
+    _write_layer(gpkg, offset=1.0)
+    out = read_prepared_layer(gpkg, "features", cache_dir=cache)
+    after = set(_entries(cache))
+
+    assert out.total_bounds[0] == 1.0
+    assert len(after) == 2 and len(after & before) == 1
+
+
+def test_source_hash_memo_is_written_atomically(tmp_path):
+    gpkg, cache = tmp_path / "layer.gpkg", tmp_path / "cache"
+    _write_layer(gpkg)
+    digest = source_hash(gpkg, cache)
+    memo = json.loads((cache / "source_hashes.json").read_text())
+    assert memo[str(gpkg.resolve())]["sha256"] == digest
+    assert [p.name for p in cache.iterdir()] == ["source_hashes.json"]
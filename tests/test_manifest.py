@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+import os
+
+import prepare_input_layers as pil
+
+
+def _source_raster(tmp_path):
+    src = tmp_path / "rain.tif"
+    src.write_bytes(b"pixels")
+    (tmp_path / "rain.tfw").write_text("1\n0\n0\n-1\n0\n0\n")
+    return src
+
+
+def test_gdal_sidecars_are_not_source_files(tmp_path):
+    src = _source_raster(tmp_path)
+    (tmp_path / "rain.tif.aux.xml").write_text("<PAMDataset/>")
+    (tmp_path / "rain.tif.ovr").write_bytes(b"overviews")
+    assert [p.name for p in pil.source_files(src)] == ["rain.tfw", "rain.tif"]
+
+
+def test_touched_but_unchanged_sources_refresh_the_manifest(tmp_path, monkeypatch):
+    src = _source_raster(tmp_path)
+    output = tmp_path / "rainfall.tif"
+    output.write_bytes(b"prepared")
+    recipe = {"source": str(src), "target_epsg": 32604}
+    pil.write_manifest(output=str(output), recipe=recipe)
+
+    # Opening the source in GIS software writes an .aux.xml next to it
+    (tmp_path / "rain.tif.aux.xml").write_text("<PAMDataset/>")
+    assert pil.prepared_status("rainfall", str(output), recipe) == "fresh"
+
+    st = src.stat()
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    hashed = []
+    monkeypatch.setattr(pil, "_file_sha256", lambda p, _h=pil._file_sha256: hashed.append(p.name) or _h(p))
+
+    assert pil.prepared_status("rainfall", str(output), recipe) == "fresh"
+    assert hashed == ["rain.tif"]
+    recorded = {e["path"]: e for e in json.loads(pil.manifest_path(output).read_text())["sources"]}
+    assert recorded[str(src)]["mtime_ns"] == src.stat().st_mtime_ns
+
+    # The refreshed mtime means the next check is stat-only
+    assert pil.prepared_status("rainfall", str(output), recipe) == "fresh"
+    assert hashed == ["rain.tif"]
+
+    src.write_bytes(b"PIXELS")
+    assert pil.prepared_status("rainfall", str(output), recipe) == "inputs changed"
+
+
+def test_nested_rasters_from_older_runs_are_moved_into_place(tmp_path):
+    output = tmp_path / "rain_32604" / "rain_32604.tif"
+    nested = tmp_path / "rain_32604" / "rain_32604" / "rain_32604.tif"
+    nested.parent.mkdir(parents=True)
+    nested.write_bytes(b"prepared")
+    (nested.parent / "rain_32604.tif.aux.xml").write_text("<PAMDataset/>")
+    recipe = {"source": str(_source_raster(tmp_path)), "target_epsg": 32604}
+
+    assert pil.prepared_status("rainfall", str(output), recipe) == "no manifest"
+    assert output.read_bytes() == b"prepared"
+    assert (output.parent / "rain_32604.tif.aux.xml").exists()
+    assert not nested.parent.exists()
+
+    # Vector outputs are never moved
+    assert not pil.migrate_nested_raster("sma", str(tmp_path / "sma.gpkg"))
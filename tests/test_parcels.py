@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+import parcels
+from parcels import build_analysis_points, iter_layer_chunks, read_parcels
+
+pytest.importorskip("pyogrio")
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def parcel_layer(tmp_path):
+    # T1 and T4 are split across two features; T2 is a self-intersecting bowtie
+    tmks = ["T1", "T2", "T3", "T1", "T4", "T5", "T4"]
+    geoms = [
+        shapely.box(0, 0, 10, 10),
+        shapely.Polygon([(20, 0), (30, 10), (30, 0), (20, 10)]),
+        shapely.box(40, 0, 50, 10),
+        shapely.box(10, 0, 20, 10),
+        shapely.box(60, 0, 70, 10),
+        shapely.box(80, 0, 90, 10),
+        shapely.box(65, 5, 75, 15),
+    ]
+    gdf = gpd.GeoDataFrame({"TMK_TXT": tmks, "zone": range(len(tmks))}, geometry=geoms, crs=32604)
+    path = tmp_path / "parcels.gpkg"
+    gdf.to_file(path, layer="parcels", driver="GPKG")
+    return path, gdf
+
+
+def test_chunks_come_from_one_reader_in_layer_order(parcel_layer, monkeypatch):
+    path, gdf = parcel_layer
+    opened = []
+    open_arrow = parcels.pyogrio.open_arrow
+    monkeypatch.setattr(parcels.pyogrio, "open_arrow", lambda *a, **kw: opened.append(a) or open_arrow(*a, **kw))
+
+    chunks = list(iter_layer_chunks(path, "parcels", columns=["TMK_TXT"], chunk_size=3))
+
+    assert len(opened) == 1
+    assert [len(c) for c in chunks] == [3, 3, 1]
+    assert pd.concat(chunks)["TMK_TXT"].tolist() == gdf["TMK_TXT"].tolist()
+    assert chunks[0].crs == gdf.crs and list(chunks[0].columns) == ["TMK_TXT", "geometry"]
+
+
+def test_read_parcels_dissolves_only_split_tmks(parcel_layer):
+    path, gdf = parcel_layer
+    wanted = ["T1", "T2", "T3", "T4", "missing"]
+
+    got = read_parcels(path, "parcels", wanted, chunk_size=2)
+
+    expected = (
+        gdf.rename(columns={"TMK_TXT": "tmk"})
+        .loc[lambda d: d["tmk"].isin(wanted), ["tmk", "geometry"]]
+        .assign(geometry=lambda d: d.geometry.make_valid())
+        .dissolve(by="tmk", as_index=False)
+    )
+    assert got["tmk"].tolist() == ["T1", "T2", "T3", "T4"]
+    assert np.allclose(got["parcel_area_sqm"], expected.geometry.area)
+    assert np.allclose(got["parcel_area_sqft"], got["parcel_area_sqm"] * parcels.SQM_TO_SQFT)
+    assert got.geometry.geom_equals(expected.geometry.reset_index(drop=True)).all()
+    # Single-part TMKs are passed through, not run through the dissolve
+    assert got.loc[got["tmk"] == "T3", "geometry"].iloc[0].equals(shapely.box(40, 0, 50, 10))
+    assert got.geometry.is_valid.all() and got.crs == gdf.crs
+
+
+def test_read_parcels_applies_the_bbox_before_filtering(parcel_layer):
+    path, _ = parcel_layer
+    got = read_parcels(path, "parcels", ["T1", "T5"], bbox=(75, 0, 95, 10))
+    assert got["tmk"].tolist() == ["T5"]
+
+def test_analysis_points_flag_multi_footprint_parcels_and_leave_others_na():
+    parcels_gdf = gpd.GeoDataFrame(
+        {"tmk": ["A", "B", "C"]},
+        geometry=[shapely.box(0, 0, 10, 10), shapely.box(20, 0, 30, 10), shapely.box(40, 0, 50, 10)],
+        crs=32604,
+    )
+    fps = gpd.GeoDataFrame(
+        {"tmk": ["B", "A", "A", "Z"], "building_fp_area_sqft": [40.0, 10.0, 30.0, 5.0]},
+        geometry=[shapely.box(21, 1, 23, 3), shapely.box(1, 1, 2, 2), shapely.box(5, 5, 8, 8), shapely.box(0, 0, 1, 1)],
+        crs=32604,
+    )
+
+    points = build_analysis_points(parcels_gdf, fps)
+
+    assert points["building_fp_qty"].dtype == "Int64"
+    assert points["building_fp_multi_flag"].dtype == "Int64"
+    assert points["building_fp_qty"].tolist() == [2, 1, pd.NA]
+    assert points["building_fp_multi_flag"].tolist() == [1, 0, pd.NA]
+    assert points["building_fp_total_area_sqft"].tolist()[:2] == [40.0, 40.0]
+    assert np.isnan(points["building_fp_largest_area_sqft"].iloc[2])
+    assert points["analysis_point_source"].tolist() == [
+        parcels.FOOTPRINT_POINT_SOURCE, parcels.FOOTPRINT_POINT_SOURCE, parcels.PARCEL_POINT_SOURCE,
+    ]
+    # Largest footprint's centroid, else the parcel centroid
+    assert [(p.x, p.y) for p in points.geometry] == [(6.5, 6.5), (22.0, 2.0), (45.0, 5.0)]
+
+
+def test_analysis_points_skip_footprints_without_a_tmk():
+    parcels_gdf = gpd.GeoDataFrame(
+        {"tmk": ["A", "B"]},
+        geometry=[shapely.box(0, 0, 10, 10), shapely.box(20, 0, 30, 10)],
+        crs=32604,
+    )
+    fps = gpd.GeoDataFrame(
+        {"tmk": ["B", np.nan, "A", "B"], "building_fp_area_sqft": [40.0, 99.0, 10.0, 20.0]},
+        geometry=[shapely.box(21, 1, 23, 3), shapely.box(50, 50, 60, 60), shapely.box(1, 1, 2, 2), shapely.box(25, 5, 26, 6)],
+        crs=32604,
+    )
+
+    stats = parcels.summarize_footprints(fps["tmk"].to_numpy(), fps["building_fp_area_sqft"].to_numpy())
+    assert stats["tmk"].tolist() == ["A", "B"]
+    assert stats["qty"].tolist() == [1, 2]
+    assert stats["largest_idx"].tolist() == [2, 0]
+
+    points = build_analysis_points(parcels_gdf, fps)
+
+    assert points["building_fp_qty"].tolist() == [1, 2]
+    assert points["building_fp_total_area_sqft"].tolist() == [10.0, 60.0]
+    assert points["building_fp_smallest_area_sqft"].tolist() == [10.0, 20.0]
+    assert [(p.x, p.y) for p in points.geometry] == [(1.5, 1.5), (22.0, 2.0)]
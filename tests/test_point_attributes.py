@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+import point_attributes
+from build_mpat import max_setback_ft
+from extents import island_extent, island_of_points
+from point_attributes import compute_point_attributes, compute_point_attributes_partitioned
+
+pytest.importorskip("pyogrio")
+
+# Points on Oahu and Maui (EPSG:32604); every well is on Oahu
+OAHU = [(600000, 2370000), (610000, 2380000), (620000, 2360000)]
+MAUI = [(760000, 2300000), (790000, 2310000)]
+WELLS = {"wells_dom": [(600100, 2370000)], "wells_mun": [(615000, 2365000)]}
+
+
+def _points(xy) -> gpd.GeoDataFrame:
+    xy = np.asarray(xy, dtype="float64")
+    return gpd.GeoDataFrame(
+        {"tmk": [f"T{i}" for i in range(len(xy))]},
+        geometry=gpd.points_from_xy(xy[:, 0], xy[:, 1]),
+        crs=32604,
+    )
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    out = {}
+    for key, xy in WELLS.items():
+        path = tmp_path / f"{key}.gpkg"
+        _points(xy).to_file(path, layer=key, driver="GPKG")
+        out[key] = str(path)
+    return out
+
+
+def test_island_of_points_uses_the_extent_registry():
+    points = _points(OAHU[:1] + MAUI[:1] + [(745000, 2270000), (0, 0)])
+    assert island_of_points(points).tolist() == ["Oahu", "Maui", "Kahoolawe", None]
+
+
+def test_partitioned_build_reads_each_island_with_exact_distances(tmp_path, inputs, config_dir, monkeypatch):
+    ctx = {
+        "thresholds_path": config_dir / "thresholds.yaml",
+        "ft_to_m": 0.3048,
+        "layer_cache_dir": tmp_path / "layer_cache",
+    }
+    points = _points(OAHU + MAUI)
+    cap = max_setback_ft(ctx["thresholds_path"])
+
+    bboxes = []
+    read_layer = point_attributes.read_prepared_layer
+    monkeypatch.setattr(
+        point_attributes, "read_prepared_layer",
+        lambda *args, **kwargs: bboxes.append(kwargs["bbox"]) or read_layer(*args, **kwargs),
+    )
+    partitioned = compute_point_attributes_partitioned(points, inputs, ctx, families=["wells"], max_workers=1)
+    partition_bboxes = list(bboxes)
+    full = compute_point_attributes(points.iloc[:3], inputs, ctx, families=["wells"])
+
+    pd.testing.assert_frame_equal(partitioned.iloc[:3], full)
+    # Not capped at the largest setback: the last Oahu point is ~7 km from the municipal well
+    far = np.hypot(620000 - 615000, 2360000 - 2365000) / 0.3048
+    assert far > cap
+    assert partitioned.loc[2, "dist_to_mun_well_ft"] == pytest.approx(far)
+    # Maui has no wells and Oahu is outside its read extent
+    assert partitioned.loc[3:, ["dist_to_dom_well_ft", "dist_to_mun_well_ft"]].isna().all(axis=None)
+
+    allowed = [island_extent(name) for name in ("Oahu", "Maui")]
+    assert len(partition_bboxes) == 4
+    for minx, miny, maxx, maxy in partition_bboxes:
+        assert any(
+            minx >= a[0] and miny >= a[1] and maxx <= a[2] and maxy <= a[3] for a in allowed
+        )
+    # One shared layer cache, no per-partition copies
+    assert not [p for p in (tmp_path / "layer_cache").iterdir() if p.name in ("Oahu", "Maui")]
+
+
+def test_partitioned_build_caps_distances_on_request(tmp_path, inputs, config_dir):
+    ctx = {
+        "thresholds_path": config_dir / "thresholds.yaml",
+        "ft_to_m": 0.3048,
+        "layer_cache_dir": tmp_path / "layer_cache",
+    }
+    points = _points(OAHU + MAUI)
+    cap = max_setback_ft(ctx["thresholds_path"])
+    capped = {**ctx, "nearest_max_ft": cap}
+
+    partitioned = compute_point_attributes_partitioned(points, inputs, capped, families=["wells"], max_workers=1)
+    full = compute_point_attributes(points, inputs, capped, families=["wells"])
+
+    pd.testing.assert_frame_equal(partitioned, full)
+    assert partitioned.loc[3:, ["dist_to_dom_well_ft", "dist_to_mun_well_ft"]].eq(cap).all(axis=None)
+    assert partitioned.loc[:2, "dist_to_dom_well_ft"].lt(cap).any()
+
+
+def test_points_outside_every_island_read_statewide(tmp_path, inputs, config_dir):
+    ctx = {
+        "thresholds_path": config_dir / "thresholds.yaml",
+        "ft_to_m": 0.3048,
+        "layer_cache_dir": tmp_path / "layer_cache",
+    }
+    # West of Oahu's box: its nearest wells are ~40 km away on Oahu, far outside its own bbox
+    points = _points(OAHU[:1] + [(560000, 2370000)])
+    assert island_of_points(points).tolist() == ["Oahu", None]
+
+    partitioned = compute_point_attributes_partitioned(points, inputs, ctx, families=["wells"], max_workers=1)
+
+    assert partitioned.loc[1, "dist_to_dom_well_ft"] == pytest.approx((600100 - 560000) / 0.3048)
+    assert partitioned.loc[1, "dist_to_mun_well_ft"] == pytest.approx(
+        np.hypot(615000 - 560000, 2365000 - 2370000) / 0.3048
+    )
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from conftest import ArrayBand, ArrayDataset
+from raster_sampling import (
+    gather_band,
+    group_by_block,
+    in_bounds_mask,
+    overview_factors,
+    read_band_at_pixels,
+    sample_band,
+    sample_rasters,
+    world_to_pixel,
+)
+
+# 10 m cells, origin (1000, 2000), north-up
+GT = (1000.0, 10.0, 0.0, 2000.0, 0.0, -10.0)
+
+
+def _grid(rows: int = 11, cols: int = 13) -> np.ndarray:
+    return np.arange(rows * cols, dtype="float64").reshape(rows, cols)
+
+
+def test_world_to_pixel_truncates_like_the_per_point_lookup():
+    x = np.array([1000.0, 1009.99, 1010.0, 999.0, np.nan])
+    y = np.array([2000.0, 1990.01, 1990.0, 2000.0, 1995.0])
+    px, py = world_to_pixel(x, y, GT)
+    assert px.tolist() == [int((v - GT[0]) / GT[1]) for v in x[:4]] + [-1]
+    assert py.tolist() == [int((v - GT[3]) / GT[5]) for v in y[:4]] + [-1]
+
+
+def test_group_by_block_covers_every_point_once_in_storage_order():
+    rng = np.random.default_rng(0)
+    px = rng.integers(0, 13, 200)
+    py = rng.integers(0, 11, 200)
+    groups = group_by_block(px, py, (4, 3), 13)
+
+    seen = np.concatenate([idx for _, _, idx in groups])
+    assert np.array_equal(np.sort(seen), np.arange(200))
+    block_ids = [row * 4 + col for col, row, _ in groups]
+    assert block_ids == sorted(block_ids)
+    for col, row, idx in groups:
+        assert np.all(px[idx] // 4 == col) and np.all(py[idx] // 3 == row)
+
+
+@pytest.mark.parametrize("block_size", [(4, 4), (13, 1), (5, 11), (16, 16)])
+def test_block_reads_match_direct_indexing_and_read_each_block_once(block_size):
+    arr = _grid()
+    band = ArrayBand(arr, block_size)
+    rng = np.random.default_rng(1)
+    px = rng.integers(0, arr.shape[1], 500)
+    py = rng.integers(0, arr.shape[0], 500)
+
+    out = read_band_at_pixels(band, px, py)
+
+    assert np.array_equal(out, arr[py, px])
+    assert band.reads == len(group_by_block(px, py, block_size, arr.shape[1]))
+
+
+def test_gather_band_returns_nan_outside_the_raster():
+    arr = _grid()
+    band = ArrayBand(arr)
+    px = np.array([[0, -1], [12, 13]])
+    py = np.array([[0, 0], [10, 3]])
+    out = gather_band(band, px, py)
+    assert out.shape == (2, 2)
+    assert out[0, 0] == arr[0, 0] and out[1, 0] == arr[10, 12]
+    assert np.isnan(out[0, 1]) and np.isnan(out[1, 1])
+
+
+def test_nearest_sampling_flags_out_of_bounds_points():
+    arr = _grid()
+    band = ArrayBand(arr)
+    x = np.array([1005.0, 1125.0, 990.0])
+    y = np.array([1995.0, 1895.0, 1995.0])
+    values, in_bounds = sample_band(band, GT, x, y)
+    assert in_bounds.tolist() == [True, True, False]
+    assert values[0] == arr[0, 0] and values[1] == arr[10, 12]
+    assert np.isnan(values[2])
+    assert in_bounds_mask(np.array([13]), np.array([0]), 13, 11).tolist() == [False]
+
+
+def test_sample_rasters_matches_sample_band_on_each_grid(fake_rasters):
+    arr = _grid()
+    coarse_gt = (995.0, 20.0, 0.0, 2005.0, 0.0, -20.0)
+    fake_rasters["a.tif"] = ArrayDataset(ArrayBand(arr, nodata=-1.0), GT)
+    fake_rasters["b.tif"] = ArrayDataset(ArrayBand(arr * 2), GT)
+    fake_rasters["c.tif"] = ArrayDataset(ArrayBand(arr[:5, :6]), coarse_gt)
+    x = np.array([1005.0, 1125.0, 990.0, 1100.0])
+    y = np.array([1995.0, 1895.0, 1995.0, 1960.0])
+
+    out = sample_rasters({"a": "a.tif", "b": "b.tif", "c": "c.tif"}, x, y, methods={"b": "bilinear"})
+
+    assert out["a"][2] == -1.0 and out["b"][2] is None
+    for name, gt, method in (("a", GT, "nearest"), ("b", GT, "bilinear"), ("c", coarse_gt, "nearest")):
+        band = fake_rasters[f"{name}.tif"].band
+        values, in_bounds = sample_band(band, gt, x, y, method=method)
+        np.testing.assert_array_equal(out[name][0], values)
+        assert out[name][1].tolist() == in_bounds.tolist()
+    assert out["c"][1].tolist() == [True, False, True, True]
+
+
+def test_bilinear_is_exact_at_cell_centres_and_linear_between_them():
+    arr = _grid()
+    band = ArrayBand(arr)
+    # Centre of cell (row 2, col 3) and the midpoint between cells (2, 3) and (3, 4)
+    x = np.array([1035.0, 1040.0])
+    y = np.array([1975.0, 1970.0])
+    values, _ = sample_band(band, GT, x, y, method="bilinear")
+    assert values[0] == pytest.approx(arr[2, 3])
+    assert values[1] == pytest.approx(arr[2:4, 3:5].mean())
+
+
+def test_bilinear_drops_nodata_neighbours_and_renormalises():
+    arr = np.ones((4, 4))
+    arr[1, 2] = -9999.0
+    band = ArrayBand(arr, nodata=-9999.0)
+    values, _ = sample_band(band, GT, np.array([1020.0]), np.array([1980.0]), method="bilinear")
+    assert values[0] == pytest.approx(1.0)
+
+
+def test_window_statistics_ignore_nodata_and_edges():
+    arr = _grid(5, 5)
+    arr[2, 3] = -9999.0
+    band = ArrayBand(arr, nodata=-9999.0)
+    # Centre cell (2, 2) and corner cell (0, 0)
+    x = np.array([1025.0, 1005.0])
+    y = np.array([1975.0, 1995.0])
+    mx, _ = sample_band(band, GT, x, y, method="max", window=3)
+    mn, _ = sample_band(band, GT, x, y, method="min", window=3)
+    mean, _ = sample_band(band, GT, x, y, method="mean", window=3)
+
+    window = arr[1:4, 1:4][arr[1:4, 1:4] != -9999.0]
+    assert mx[0] == window.max() and mn[0] == window.min()
+    assert mean[0] == pytest.approx(window.mean())
+    assert mx[1] == arr[:2, :2].max()
+
+    with pytest.raises(ValueError):
+        sample_band(band, GT, x, y, method="max", window=2)
+
+
+def test_overview_factors_stop_at_about_one_block():
+    assert overview_factors(256, 100) == []
+    assert overview_factors(1000, 600) == [2, 4]
+    factors = overview_factors(20000, 30000)
+    assert 30000 / factors[-1] <= 256 < 30000 / (factors[-1] // 2)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import shutil
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+import scenario_sweep
+from build_logic_model import compile_rules, evaluate_rules, load_rules_config
+from scenario_sweep import attach_columns, find_scenarios, run_scenario_sweep, share_columns
+from test_build_logic_model import synthetic_mpat
+
+
+def _edit_yaml(path, edit):
+    doc = yaml.safe_load(path.read_text(encoding="utf-8"))
+    edit(doc)
+    path.write_text(yaml.safe_dump(doc, allow_unicode=True), encoding="utf-8")
+
+
+@pytest.fixture
+def config_root(tmp_path, config_dir):
+    shutil.copytree(config_dir, tmp_path / "baseline")
+    scenario = tmp_path / "scenarios" / "well_setback_750ft"
+    shutil.copytree(config_dir, scenario)
+    _edit_yaml(scenario / "thresholds.yaml", lambda d: d["thresholds"]["well_public_lf_ft"].update(value=750))
+    return tmp_path
+
+
+def _shown(result, compiled, eid):
+    return (result["endpoints_shown"].to_numpy() >> compiled["endpoint_ids"].index(eid)) & 1 == 1
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_sweep_counts_match_direct_rule_evaluation(config_root, max_workers):
+    scenarios = find_scenarios(config_root)
+    assert list(scenarios) == ["baseline", "well_setback_750ft"]
+    mpat = synthetic_mpat(500, seed=3)
+
+    summary = run_scenario_sweep(mpat, scenarios, max_workers=max_workers)
+
+    compiled = {name: compile_rules(load_rules_config(d)) for name, d in scenarios.items()}
+    results = {name: evaluate_rules(mpat, c) for name, c in compiled.items()}
+    assert summary["scenario"].tolist() == list(scenarios)
+    for _, row in summary.iterrows():
+        name = row["scenario"]
+        changed = np.zeros(len(mpat), dtype=bool)
+        for eid in compiled[name]["endpoint_ids"]:
+            now = _shown(results[name], compiled[name], eid)
+            before = _shown(results["baseline"], compiled["baseline"], eid)
+            changed |= now != before
+            assert row[f"shown_{eid}"] == now.sum()
+            assert row[f"gained_{eid}"] == (now & ~before).sum()
+            assert row[f"lost_{eid}"] == (before & ~now).sum()
+        assert row["parcels_changed"] == changed.sum()
+        assert row["parcels_no_endpoint"] == (results[name]["endpoints_shown"] == 0).sum()
+
+    baseline, relaxed = summary.iloc[0], summary.iloc[1]
+    assert baseline["parcels_changed"] == 0
+    # A shorter well setback only ever makes the leach-field endpoints available
+    assert relaxed["gained_E01"] > 0 and relaxed["lost_E01"] == 0
+
+
+def test_shared_columns_round_trip():
+    df = pd.DataFrame({
+        "x": np.arange(5, dtype="float64"),
+        "n": pd.array([1, None, 3, 4, None], dtype="Int64"),
+        "flag": np.array([True, False, True, True, False]),
+        "sfha_tf": np.array(["T", "F", None, "T", "F"], dtype=object),
+    })
+    handles, spec = share_columns(df, list(df.columns))
+    try:
+        assert [col for col, _, _ in spec["shared"]] == ["x", "n", "flag"]
+        attached, views = attach_columns(spec)
+        assert np.array_equal(attached["x"], df["x"])
+        assert np.array_equal(attached["n"], [1.0, np.nan, 3.0, 4.0, np.nan], equal_nan=True)
+        assert attached["flag"].tolist() == df["flag"].tolist()
+        assert attached["sfha_tf"].tolist() == df["sfha_tf"].tolist()
+        del attached
+        for shm in views:
+            shm.close()
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+
+def test_shared_blocks_are_unlinked_even_when_a_scenario_fails(config_root, monkeypatch):
+    broken = config_root / "scenarios" / "broken"
+    shutil.copytree(config_root / "baseline", broken)
+    _edit_yaml(broken / "criteria.yaml", lambda d: d["criteria"]["GW_MIN"].update(field="not_an_mpat_column"))
+
+    created = []
+
+    def recording_share(df, columns):
+        handles, spec = share_columns(df, columns)
+        created.extend(shm.name for shm in handles)
+        return handles, spec
+
+    monkeypatch.setattr(scenario_sweep, "share_columns", recording_share)
+    with pytest.raises(KeyError, match="not_an_mpat_column"):
+        run_scenario_sweep(synthetic_mpat(50), find_scenarios(config_root), max_workers=2)
+
+    assert created
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from spatial_index import (
+    BEYOND_RADIUS,
+    build_segment_index,
+    dist_to_coast,
+    dist_to_nearest,
+    load_or_build_segment_index,
+    nearest_feature,
+    segment_index_distance,
+)
+
+pytest.importorskip("scipy")
+
+
+def _points(n: int = 300, seed: int = 0) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 10_000, (n, 2))
+    return gpd.GeoDataFrame({"tmk": np.arange(n)}, geometry=gpd.points_from_xy(xy[:, 0], xy[:, 1]))
+
+
+def _brute_force(points: gpd.GeoDataFrame, geoms) -> np.ndarray:
+    return np.array([min(p.distance(g) for g in geoms) for p in points.geometry])
+
+
+def _wells(seed: int = 1) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 10_000, (40, 2))
+    return gpd.GeoDataFrame({"well_id": [f"W{i}" for i in range(40)]},
+                            geometry=gpd.points_from_xy(xy[:, 0], xy[:, 1]))
+
+
+def _streams(seed: int = 2) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    lines = [shapely.LineString(rng.uniform(0, 10_000, (5, 2))) for _ in range(12)]
+    return gpd.GeoDataFrame({"id": np.arange(12)}, geometry=lines)
+
+
+def test_point_layer_nearest_matches_brute_force():
+    points, wells = _points(), _wells()
+    dist, pos = nearest_feature(points, wells)
+    assert np.allclose(dist, _brute_force(points, wells.geometry))
+    assert np.allclose(dist, points.distance(wells.geometry.iloc[pos], align=False))
+
+
+def test_line_and_polygon_layers_match_union_distance():
+    points = _points()
+    features = _streams()
+    features.loc[len(features)] = [99, shapely.box(4000, 4000, 6000, 6000)]
+    dist, _ = nearest_feature(points, features)
+    assert np.allclose(dist, points.distance(features.union_all()))
+    inside = points.within(shapely.box(4000, 4000, 6000, 6000))
+    assert inside.any() and np.all(dist[inside.to_numpy()] == 0)
+
+
+@pytest.mark.parametrize("features", [_wells(), _streams()], ids=["points", "lines"])
+def test_bounded_search_is_exact_inside_the_radius_and_inf_beyond(features):
+    points = _points()
+    exact, _ = nearest_feature(points, features)
+    radius = float(np.median(exact))
+    bounded, pos = nearest_feature(points, features, max_distance=radius)
+
+    near = exact <= radius
+    assert np.allclose(bounded[near], exact[near])
+    assert np.all(bounded[~near] == BEYOND_RADIUS) and np.all(pos[~near] == -1)
+
+
+def test_dist_to_nearest_columns_and_ids():
+    points, wells = _points(20), _wells()
+    out = dist_to_nearest(points, wells, "well", id_field="well_id")
+    dist, pos = nearest_feature(points, wells)
+    assert list(out.columns) == ["tmk", "dist_to_well_m", "dist_to_well_ft", "nearest_well_id"]
+    assert np.allclose(out["dist_to_well_ft"], dist / 0.3048)
+    assert out["nearest_well_id"].tolist() == wells["well_id"].iloc[pos].tolist()
+
+
+def test_empty_feature_layer_gives_nan():
+    points = _points(5)
+    empty = gpd.GeoDataFrame({"well_id": []}, geometry=gpd.GeoSeries([], dtype="geometry"))
+    dist, pos = nearest_feature(points, empty)
+    assert np.all(np.isnan(dist)) and np.all(pos == -1)
+
+
+@pytest.mark.parametrize("spacing, k", [(25.0, 8), (500.0, 1), (5000.0, 2)])
+def test_segment_index_distance_is_certified_exact(spacing, k):
+    points, coast = _points(), _streams()
+    coast.loc[len(coast)] = [99, shapely.box(2000, 2000, 3000, 7000)]
+    index = build_segment_index(coast, spacing=spacing)
+    x, y = points.geometry.x.to_numpy(), points.geometry.y.to_numpy()
+    dist = segment_index_distance(index, x, y, k=k)
+    # Polygons are indexed by their boundary, so points inside one still get a distance
+    lines = coast.geometry.where(coast.geom_type != "Polygon", coast.boundary)
+    assert np.allclose(dist, points.distance(lines.union_all()), rtol=0, atol=1e-6)
+
+
+def test_segment_index_cache_is_reused_and_invalidated(tmp_path):
+    coast = _streams()
+    cache = tmp_path / "coast_index.npz"
+    first = load_or_build_segment_index(coast, cache, spacing=50.0)
+    mtime = cache.stat().st_mtime_ns
+    again = load_or_build_segment_index(coast, cache, spacing=50.0)
+    assert cache.stat().st_mtime_ns == mtime
+    assert np.array_equal(first["start"], again["start"])
+
+    moved = coast.translate(xoff=10.0)
+    rebuilt = load_or_build_segment_index(moved, cache, spacing=50.0)
+    assert rebuilt["fingerprint"] != first["fingerprint"]
+
+    points = _points(50)
+    out = dist_to_coast(points, moved, spacing=50.0, cache_path=cache)
+    assert np.allclose(out["dist_to_coast_m"], points.distance(moved.union_all()), atol=1e-6)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import types
+
+import numpy as np
+import pytest
+
+import terrain
+from terrain import ground_cell_sizes, horn_slope, slope_from_array, tile_size_for_memory
+
+
+def _plane(rows: int, cols: int, sx: float, sy: float, cell: float = 10.0) -> np.ndarray:
+    yy, xx = np.mgrid[0:rows, 0:cols] * cell
+    return sx * xx + sy * yy
+
+
+def test_horn_slope_of_a_plane_is_its_gradient():
+    z = _plane(7, 9, 0.03, -0.04)
+    pct = slope_from_array(z, dx=10.0, dy=10.0)
+    deg = slope_from_array(z, dx=10.0, dy=10.0, output_measurement="DEGREE")
+    assert pct.shape == (5, 7)
+    assert np.allclose(pct, 5.0)
+    assert np.allclose(deg, np.degrees(np.arctan(0.05)))
+
+
+def test_horn_slope_matches_the_textbook_kernel():
+    rng = np.random.default_rng(0)
+    z = rng.uniform(0, 50, (3, 3))
+    (a, b, c), (d, e, f), (g, h, i) = z
+    dz_dx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * 5.0)
+    dz_dy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * 7.0)
+    expected = np.hypot(dz_dx, dz_dy) * 100.0
+    assert slope_from_array(z, dx=5.0, dy=7.0)[0, 0] == pytest.approx(expected)
+
+
+def test_nodata_neighbours_take_the_centre_value():
+    z = _plane(3, 3, 0.0, 0.0)
+    z[0, 0] = np.nan
+    assert slope_from_array(z, dx=10.0, dy=10.0)[0, 0] == 0.0
+
+
+def test_nodata_centre_has_no_slope_even_with_valid_neighbours():
+    z = _plane(5, 5, 0.03, 0.04)
+    z[2, 2] = np.nan
+    pct = slope_from_array(z, dx=10.0, dy=10.0)
+    assert np.isnan(pct[1, 1])
+    assert np.isfinite(np.delete(pct.ravel(), 4)).all()
+    assert np.isnan(horn_slope(*[np.array([1.0])] * 4, np.array([np.nan]), *[np.array([1.0])] * 4,
+                               dx=1.0, dy=1.0, output_measurement="DEGREE"))
+
+
+class _FakeSRS:
+    def __init__(self, geographic: bool = False, projection: str | None = None, parms: dict | None = None):
+        self.geographic = geographic
+        self.projection = projection
+        self.parms = parms or {}
+
+    def IsGeographic(self) -> bool:
+        return self.geographic
+
+    def GetAttrValue(self, name: str) -> str | None:
+        return self.projection if name == "PROJECTION" else None
+
+    def GetProjParm(self, name: str, default: float = 0.0) -> float:
+        return self.parms.get(name, default)
+
+
+class _FakeDataset:
+    def __init__(self, geotransform):
+        self.geotransform = geotransform
+
+    def GetGeoTransform(self):
+        return self.geotransform
+
+
+def test_ground_cell_sizes_convert_degrees_on_the_ellipsoid(monkeypatch):
+    monkeypatch.setattr(terrain, "_dataset_srs", lambda ds: _FakeSRS(geographic=True))
+    # 1 degree cells; row 0 is centred on 60 N, row 60 on the equator
+    ds = _FakeDataset((-157.0, 1.0, 0.0, 60.5, 0.0, -1.0))
+    rows = np.array([0, 60])
+
+    assert ground_cell_sizes(ds, rows, np.array([0]), method="PLANAR") == (1.0, 1.0)
+    dx, dy = ground_cell_sizes(ds, rows, np.array([0]), method="GEODESIC")
+    # Published lengths of a degree of longitude / latitude on WGS84
+    assert dx == pytest.approx([55_800, 111_320], rel=1e-3)
+    assert dy == pytest.approx([111_412, 110_574], rel=1e-3)
+
+
+def test_ground_cell_sizes_divide_out_the_utm_scale_factor(monkeypatch):
+    osr = types.SimpleNamespace(SRS_PP_SCALE_FACTOR="scale_factor", SRS_PP_FALSE_EASTING="false_easting")
+    srs = _FakeSRS(projection="Transverse_Mercator", parms={"scale_factor": 0.9996, "false_easting": 500000.0})
+    monkeypatch.setattr(terrain, "osr", osr)
+    monkeypatch.setattr(terrain, "_dataset_srs", lambda ds: srs)
+    # 10 m cells; column 0 is centred on the central meridian, column 10000 is 100 km east of it
+    ds = _FakeDataset((499995.0, 10.0, 0.0, 2400000.0, 0.0, -10.0))
+
+    dx, dy = ground_cell_sizes(ds, np.array([0]), np.array([0, 10000]), method="GEODESIC")
+    assert 10.0 / dx == pytest.approx([0.9996, 0.99972], abs=1e-5)
+    assert np.array_equal(dx, dy)
+
+
+def test_tile_size_for_memory_is_block_aligned_and_grows_with_budget():
+    small, large = tile_size_for_memory(64), tile_size_for_memory(1024)
+    assert small % 256 == 0 and large % 256 == 0
+    assert 256 <= small < large
+
+
+def test_slope_tiles_are_sized_from_the_worker_memory_budget(monkeypatch, tmp_path):
+    import build_mpat
+    import terrain
+
+    seen = {}
+
+    def fake_write(in_dem, out_raster, **kwargs):
+        seen.update(kwargs)
+        return str(out_raster)
+
+    monkeypatch.setattr(terrain, "write_derivative_raster", fake_write)
+    dem = tmp_path / "dem.tif"
+    dem.write_bytes(b"")
+
+    build_mpat.calculate_slope_percentages(
+        in_dem_raster=str(dem), out_slope_raster=tmp_path / "slope.tif", max_worker_mb=64,
+    )
+    assert seen["tile_size"] is None and seen["max_worker_mb"] == 64
+
+
+def test_arcpy_slope_uses_the_prepared_raster_environment(monkeypatch, tmp_path):
+    import sys
+    import types
+
+    import build_mpat
+    from prepare_input_layers import arcpy_raster_env
+
+    envs = []
+
+    class EnvManager:
+        def __init__(self, **kwargs):
+            envs.append(kwargs)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    saved = []
+    sa = types.SimpleNamespace(Slope=lambda **kw: types.SimpleNamespace(save=saved.append))
+    arcpy = types.SimpleNamespace(
+        CheckOutExtension=lambda name: None, env=types.SimpleNamespace(), EnvManager=EnvManager,
+        Exists=lambda path: False, sa=sa,
+    )
+    monkeypatch.setitem(sys.modules, "arcpy", arcpy)
+    monkeypatch.setitem(sys.modules, "arcpy.sa", sa)
+    monkeypatch.setattr(build_mpat, "arcpy", arcpy)
+    monkeypatch.setattr(build_mpat, "gdal", None)
+    dem = tmp_path / "dem.tif"
+    dem.write_bytes(b"")
+
+    out = build_mpat.calculate_slope_percentages(
+        in_dem_raster=str(dem), out_slope_raster=tmp_path / "slope.tif", engine="arcpy",
+    )
+    assert envs == [arcpy_raster_env("BILINEAR")] and saved == [out]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from build_logic_model import compile_rules, evaluate_rules, load_rules_config
+from test_build_logic_model import synthetic_mpat
+from threshold_sensitivity import (
+    OPERATOR_SEGMENTS,
+    endpoint_availability_curve,
+    pass_counts,
+    prepare_sensitivity,
+    threshold_grid,
+    threshold_pass_curves,
+)
+
+
+@pytest.mark.parametrize("op", sorted(OPERATOR_SEGMENTS))
+def test_pass_counts_match_brute_force(op):
+    values = np.sort(np.array([0.0, 1.0, 1.0, 2.5, 3.0, 3.0, 3.0, 10.0]))
+    grid = np.array([-1.0, 0.0, 1.0, 2.0, 3.0, 9.99, 10.0, 11.0])
+    below, equal, above = OPERATOR_SEGMENTS[op]
+    expected = [
+        int(np.sum(np.where(values < t, below, np.where(values == t, equal, above))))
+        for t in grid
+    ]
+    assert pass_counts(values, op, grid).tolist() == expected
+
+
+def _with_threshold(config: dict, threshold_id: str, value: float) -> dict:
+    thresholds = {**config["thresholds"], threshold_id: {**config["thresholds"][threshold_id], "value": value}}
+    return {**config, "thresholds": thresholds}
+
+
+@pytest.mark.parametrize("threshold_id", ["gw_min_ft", "slope_max_lf_pct", "lot_flag_sqft", "perc_slow_flag"])
+def test_curves_match_re_running_the_rules_at_every_value(config_dir, threshold_id):
+    config = load_rules_config(config_dir)
+    compiled = compile_rules(config)
+    df = synthetic_mpat(300, seed=3)
+    prep = prepare_sensitivity(df, compiled)
+    grid = threshold_grid(prep, threshold_id, num=15)
+
+    shown = endpoint_availability_curve(prep, threshold_id, grid, kind="shown")
+    flagged = endpoint_availability_curve(prep, threshold_id, grid, kind="flagged")
+    passes = threshold_pass_curves(prep, threshold_id, grid)
+
+    for i, t in enumerate(grid):
+        rerun = compile_rules(_with_threshold(config, threshold_id, float(t)))
+        result = {k: v.to_numpy() for k, v in evaluate_rules(df, rerun).items()}
+        for e, eid in enumerate(rerun["endpoint_ids"]):
+            assert shown[eid].iloc[i] == ((result["endpoints_shown"] >> e) & 1).sum()
+            assert flagged[eid].iloc[i] == ((result["endpoints_flagged"] >> e) & 1).sum()
+        for cid, row in passes[passes["threshold"] == t].set_index("criterion").iterrows():
+            bit = 1 << rerun["criteria_ids"].index(cid)
+            assert row["passed"] == ((result["criteria_pass"] & bit) != 0).sum()
+            assert row["unknown"] == ((result["criteria_known"] & bit) == 0).sum()